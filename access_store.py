@@ -0,0 +1,294 @@
+import os
+import json
+import threading
+import logging
+from types import MappingProxyType
+from typing import Dict, FrozenSet, List, Mapping, NamedTuple, Optional, Tuple
+
+# Max per-card overrides layered on a snapshot before the base sets are rebuilt
+OVERLAY_LIMIT = 256
+
+
+def card_str_to_int(card_str: str) -> Optional[int]:
+    try:
+        return int(card_str)
+    except Exception:
+        return None
+
+
+def apply_mutation(users: Dict[str, dict], blocked: Dict[str, bool], rec: dict) -> None:
+    """Apply one journal record to plain users/blocked dicts (idempotent)."""
+    op = rec.get("op")
+    card = rec.get("card")
+    if op == "add_user":
+        users[card] = rec.get("user") or {}
+    elif op == "delete_user":
+        users.pop(card, None)
+    elif op == "block":
+        blocked[card] = True
+    elif op == "unblock":
+        blocked.pop(card, None)
+
+
+class AccessSnapshot(NamedTuple):
+    """
+    Immutable access state. Never mutated once published.
+    `overrides` maps card -> (name or None if not allowed, blocked) and takes
+    precedence over the base sets; it holds recent single-card mutations.
+    """
+    version: int
+    allowed: FrozenSet[int]
+    blocked: FrozenSet[int]
+    names: Mapping[int, str]
+    overrides: Mapping[int, Tuple[Optional[str], bool]]
+    allowed_count: int
+    blocked_count: int
+
+    def decide(self, card_int: int) -> Tuple[str, str]:
+        """Return (status, name) for a card using only this snapshot."""
+        override = self.overrides.get(card_int)
+        if override is not None:
+            name, is_blocked = override
+            if is_blocked:
+                return "Blocked", "Blocked User"
+            if name is not None:
+                return "Access Granted", name
+            return "Access Denied", "Unknown"
+        if card_int in self.blocked:
+            return "Blocked", "Blocked User"
+        if card_int in self.allowed:
+            return "Access Granted", self.names.get(card_int, "Unknown")
+        return "Access Denied", "Unknown"
+
+
+EMPTY_SNAPSHOT = AccessSnapshot(0, frozenset(), frozenset(), MappingProxyType({}), MappingProxyType({}), 0, 0)
+
+
+class AccessStore:
+    """
+    Holds users/blocked dicts for writers and publishes an AccessSnapshot for readers.
+    Writers build the next snapshot off to the side and swap it in with a single
+    reference assignment, so readers (the scan path) never take a lock.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self._write_lock = threading.Lock()
+        self._users: Dict[str, dict] = {}
+        self._blocked: Dict[str, bool] = {}
+        self._snapshot = EMPTY_SNAPSHOT
+
+    @property
+    def snapshot(self) -> AccessSnapshot:
+        """Current snapshot (one attribute read, safe without locks)."""
+        return self._snapshot
+
+    def users(self) -> Dict[str, dict]:
+        with self._write_lock:
+            return dict(self._users)
+
+    def blocked(self) -> Dict[str, bool]:
+        with self._write_lock:
+            return dict(self._blocked)
+
+    def get_user(self, card: str) -> Optional[dict]:
+        with self._write_lock:
+            return self._users.get(card)
+
+    def has_blocked_entry(self, card: str) -> bool:
+        with self._write_lock:
+            return card in self._blocked
+
+    def replace_all(self, users: Dict[str, dict], blocked: Dict[str, bool]) -> AccessSnapshot:
+        """Replace users and blocked flags together and publish one snapshot."""
+        with self._write_lock:
+            self._users = dict(users)
+            self._blocked = dict(blocked)
+            return self._rebuild(True, True)
+
+    def apply(self, rec: dict) -> AccessSnapshot:
+        """Apply one mutation record in O(1) by layering a per-card override."""
+        with self._write_lock:
+            card = rec.get("card")
+            before = self._effective(card)
+            apply_mutation(self._users, self._blocked, rec)
+            after = self._effective(card)
+            prev = self._snapshot
+            ci = card_str_to_int(card)
+            if ci is None or before == after:
+                return prev
+            if len(prev.overrides) >= OVERLAY_LIMIT:
+                return self._rebuild(True, True)
+            overrides = dict(prev.overrides)
+            overrides[ci] = after
+            allowed_count = prev.allowed_count + (after[0] is not None) - (before[0] is not None)
+            blocked_count = prev.blocked_count + after[1] - before[1]
+            return self._publish(prev.allowed, prev.blocked, prev.names,
+                                 MappingProxyType(overrides), allowed_count, blocked_count)
+
+    def apply_batch(self, recs: List[dict]) -> AccessSnapshot:
+        """
+        Apply several mutation records and publish once. Small batches are layered
+        as overrides like apply(); a batch that would overflow OVERLAY_LIMIT is
+        folded into the dicts and rebuilt in a single O(n) pass.
+        """
+        with self._write_lock:
+            if len(self._snapshot.overrides) + len(recs) < OVERLAY_LIMIT:
+                prev = self._snapshot
+                overrides = dict(prev.overrides)
+                allowed_count, blocked_count = prev.allowed_count, prev.blocked_count
+                changed = False
+                for rec in recs:
+                    card = rec.get("card")
+                    before = self._effective(card)
+                    apply_mutation(self._users, self._blocked, rec)
+                    after = self._effective(card)
+                    ci = card_str_to_int(card)
+                    if ci is None or before == after:
+                        continue
+                    overrides[ci] = after
+                    allowed_count += (after[0] is not None) - (before[0] is not None)
+                    blocked_count += after[1] - before[1]
+                    changed = True
+                if not changed:
+                    return prev
+                return self._publish(prev.allowed, prev.blocked, prev.names,
+                                     MappingProxyType(overrides), allowed_count, blocked_count)
+            for rec in recs:
+                apply_mutation(self._users, self._blocked, rec)
+            return self._rebuild(True, True)
+
+    def _effective(self, card: str) -> Tuple[Optional[str], bool]:
+        u = self._users.get(card)
+        name = (u or {}).get("name", "Unknown") if card in self._users else None
+        return name, bool(self._blocked.get(card))
+
+    def _rebuild(self, users_changed: bool, blocked_changed: bool) -> AccessSnapshot:
+        prev = self._snapshot
+        if prev.overrides:
+            # Overrides may cover either side, so fold everything back into the base sets
+            users_changed = blocked_changed = True
+        if users_changed:
+            allowed, names = self._build_allowed(self._users)
+        else:
+            allowed, names = prev.allowed, prev.names
+        blocked = self._build_blocked(self._blocked) if blocked_changed else prev.blocked
+        return self._publish(allowed, blocked, names, MappingProxyType({}), len(allowed), len(blocked))
+
+    @staticmethod
+    def _build_allowed(users: Dict[str, dict]):
+        names = {}
+        for k, u in users.items():
+            ci = card_str_to_int(k)
+            if ci is not None:
+                names[ci] = (u or {}).get("name", "Unknown")
+        return frozenset(names), MappingProxyType(names)
+
+    @staticmethod
+    def _build_blocked(blocked: Dict[str, bool]) -> FrozenSet[int]:
+        out = set()
+        for k, v in blocked.items():
+            if v:
+                ci = card_str_to_int(k)
+                if ci is not None:
+                    out.add(ci)
+        return frozenset(out)
+
+    def _publish(self, allowed, blocked, names, overrides, allowed_count, blocked_count) -> AccessSnapshot:
+        # Caller holds _write_lock; the assignment below is the only publication point.
+        snap = AccessSnapshot(self._snapshot.version + 1, allowed, blocked, names,
+                              overrides, allowed_count, blocked_count)
+        self._snapshot = snap
+        return snap
+
+
+class MutationJournal:
+    """
+    Append-only JSONL journal of user/blocklist mutations.
+    Compaction rotates the live journal aside, the caller writes full snapshots,
+    then finish_compaction() drops the rotated file. Startup replays both.
+    """
+
+    def __init__(self, path: str):
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self.rotated_path = path + ".compacting"
+        self.count = 0
+        self._fh = None
+        self._lock = threading.Lock()
+
+    def append(self, rec: dict) -> None:
+        line = json.dumps(rec, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._fh is None:
+                self._fh = open(self.path, "a")
+            self._fh.write(line)
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+            self.count += 1
+
+    def extend(self, recs: List[dict]) -> None:
+        """Append several records with a single write and fsync."""
+        if not recs:
+            return
+        data = "".join(json.dumps(rec, separators=(",", ":")) + "\n" for rec in recs)
+        with self._lock:
+            if self._fh is None:
+                self._fh = open(self.path, "a")
+            self._fh.write(data)
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+            self.count += len(recs)
+
+    def replay(self) -> List[dict]:
+        """Return records from the rotated and live journals, oldest first."""
+        records = []
+        live = 0
+        for path in (self.rotated_path, self.path):
+            try:
+                with open(path, "r") as f:
+                    for line in f:
+                        line = line.strip()
+                        if not line:
+                            continue
+                        try:
+                            records.append(json.loads(line))
+                        except ValueError:
+                            # Torn tail write from a crash; everything before it is intact
+                            self.logger.warning(f"Skipping corrupt journal line in {path}")
+                            continue
+                        if path == self.path:
+                            live += 1
+            except FileNotFoundError:
+                continue
+        with self._lock:
+            self.count = live
+        return records
+
+    def rotate(self) -> None:
+        """Move the live journal aside so new mutations start a fresh file."""
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+            if os.path.exists(self.path):
+                if os.path.exists(self.rotated_path):
+                    # A previous compaction did not finish; keep its records too
+                    with open(self.path, "r") as src, open(self.rotated_path, "a") as dst:
+                        dst.write(src.read())
+                    os.remove(self.path)
+                else:
+                    os.replace(self.path, self.rotated_path)
+            self.count = 0
+
+    def finish_compaction(self) -> None:
+        try:
+            os.remove(self.rotated_path)
+        except FileNotFoundError:
+            pass
+
+    def close(self) -> None:
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
@@ -6,12 +6,14 @@ import threading
 import logging
 import requests
 from typing import Optional
-from config import RTSP_CAMERAS, MAX_RETRIES, RETRY_DELAY
+from config import RTSP_CAMERAS, MAX_RETRIES, RETRY_DELAY, ENCODE_PROFILES
 from uploader import ImageUploader
+from image_encoder import EncodeProfile, ImageEncoder
 
 class CameraService:
     def __init__(self):
         self.uploader = ImageUploader()
+        self.encoder = ImageEncoder({key: EncodeProfile(**p) for key, p in ENCODE_PROFILES.items()})
         self.logger = logging.getLogger(__name__)
         
         # Ensure images directory exists
@@ -52,7 +54,8 @@ class CameraService:
                     filename = f"{timestamp}_{camera_key}.jpg"
                     filepath = os.path.join("images", filename)
                     
-                    if cv2.imwrite(filepath, frame):
+                    data = self.encoder.encode(camera_key, frame)
+                    if data and self._write(filepath, data):
                         self.logger.info(f"{camera_key}: Image captured -> {filename}")
                         
                         # Always return the local file path for now
@@ -79,6 +82,15 @@ class CameraService:
         self.logger.error(f"{camera_key}: Max retries reached. Skipping.")
         return None
 
+    def _write(self, filepath: str, data: bytes) -> bool:
+        try:
+            with open(filepath, "wb") as f:
+                f.write(data)
+            return True
+        except OSError as e:
+            self.logger.error(f"Failed to write {filepath}: {e}")
+            return False
+
     def capture_camera_1(self) -> Optional[str]:
         """Capture image from camera 1."""
         return self._capture_image("camera_1")
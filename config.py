@@ -12,9 +12,55 @@ RTSP_CAMERAS = {
     "camera_2": f"rtsp://{CAMERA_USERNAME}:{CAMERA_PASSWORD}@{CAMERA_2_IP}:554/avstream/channel=1/stream=0.sdp"
 }
 
+# Persistent RTSP grabbers (one long-lived stream per camera)
+GRABBER_RECONNECT_MAX = float(os.getenv("GRABBER_RECONNECT_MAX", "30"))  # max reconnect backoff (seconds)
+FRAME_MAX_AGE = float(os.getenv("FRAME_MAX_AGE", "2.0"))  # oldest buffered frame usable for a capture (seconds)
+FRAME_RING_SECONDS = float(os.getenv("FRAME_RING_SECONDS", "3"))  # pre-event ring length per camera (0 disables)
+FRAME_RING_FPS = float(os.getenv("FRAME_RING_FPS", "10"))  # frames/s encoded into the ring
+# Ring frames are what a capture saves and uploads, so they override the capture profile: no
+# progressive/optimize, and quality min(CAMERA_N_ENCODE_QUALITY, FRAME_RING_QUALITY) (0 = profile quality).
+# The capture profile applies as-is only when the ring is off or has no frame near the scan.
+FRAME_RING_QUALITY = int(os.getenv("FRAME_RING_QUALITY", "0"))
+FRAME_RING_FRAME_BYTES = int(os.getenv("FRAME_RING_FRAME_BYTES", str(300 * 1024)))  # expected size of one ring frame
+# JPEG bytes kept per camera; by default enough for the whole ring window at the expected frame size
+FRAME_RING_MAX_BYTES = int(os.getenv("FRAME_RING_MAX_BYTES", "0")) or \
+    int(max(FRAME_RING_SECONDS, 0) * max(FRAME_RING_FPS, 1) * FRAME_RING_FRAME_BYTES)
+CAPTURE_FRAMES_BEFORE = int(os.getenv("CAPTURE_FRAMES_BEFORE", "0"))  # extra frames saved before the scan
+CAPTURE_FRAMES_AFTER = int(os.getenv("CAPTURE_FRAMES_AFTER", "0"))  # extra frames saved after the scan
+
+# Per-camera JPEG encode profiles (applied in memory before the image is written)
+def _encode_profile(prefix: str) -> Dict:
+    return {
+        "max_width": int(os.getenv(f"{prefix}_ENCODE_WIDTH", "0")),    # 0 = native resolution
+        "max_height": int(os.getenv(f"{prefix}_ENCODE_HEIGHT", "0")),
+        "quality": int(os.getenv(f"{prefix}_ENCODE_QUALITY", "85")),
+        "progressive": os.getenv(f"{prefix}_ENCODE_PROGRESSIVE", "false").lower() == "true",
+        "optimize": os.getenv(f"{prefix}_ENCODE_OPTIMIZE", "true").lower() == "true",
+    }
+
+ENCODE_PROFILES = {
+    "camera_1": _encode_profile("CAMERA_1"),
+    "camera_2": _encode_profile("CAMERA_2")
+}
+ENCODED_CACHE_MAX_BYTES = int(os.getenv("ENCODED_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))  # bytes kept for the uploader
+
 # API Configuration
 S3_API_URL = os.getenv("S3_API_URL", "https://api.easyparkai.com/api/Common/Upload?modulename=anpr")
 
+# Image upload workers (share one keep-alive HTTP session)
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "2"))
+UPLOAD_MAX_PER_HOST = int(os.getenv("UPLOAD_MAX_PER_HOST", "4"))  # concurrent requests per upload host
+UPLOAD_POOL_SIZE = int(os.getenv("UPLOAD_POOL_SIZE", "8"))  # keep-alive connections kept per host
+# Failed uploads wait on a delay queue: UPLOAD_RETRY_BASE_DELAY * 2^n (jittered, capped
+# at UPLOAD_RETRY_MAX_DELAY); after UPLOAD_RETRY_BUDGET failures they are dead-lettered
+UPLOAD_RETRY_BASE_DELAY = float(os.getenv("UPLOAD_RETRY_BASE_DELAY", "5"))
+UPLOAD_RETRY_MAX_DELAY = float(os.getenv("UPLOAD_RETRY_MAX_DELAY", "600"))
+UPLOAD_RETRY_BUDGET = int(os.getenv("UPLOAD_RETRY_BUDGET", "8"))
+# Backlog order within each priority class ("newest" or "oldest" first); live captures always go first
+UPLOAD_BACKLOG_ORDER = os.getenv("UPLOAD_BACKLOG_ORDER", "newest").lower()
+# Upload bandwidth cap in kilobits/s (0 = unlimited); adjustable at runtime via /update_config
+UPLOAD_BANDWIDTH_KBPS = float(os.getenv("UPLOAD_BANDWIDTH_KBPS", "0"))
+
 # Retry Configuration
 MAX_RETRIES = int(os.getenv("MAX_RETRIES", "5"))
 RETRY_DELAY = int(os.getenv("RETRY_DELAY", "5"))
@@ -0,0 +1,137 @@
+import time
+import random
+import threading
+import logging
+import requests
+from typing import Callable, List, Optional
+
+DEFAULT_PROBE_URLS = [
+    "http://clients3.google.com/generate_204",   # HTTP avoids cert/time issues at boot
+    "https://www.gstatic.com/generate_204",
+    "https://www.google.com/generate_204",
+    "https://cloudflare.com/cdn-cgi/trace",
+]
+
+
+class ConnectivityMonitor:
+    """
+    Background internet probe that publishes a cached online/offline state.
+    Callers read is_online() in O(1); workers can block on wait_until_online().
+    Going offline takes `failures_to_offline` consecutive failed probe passes, so a
+    single blip doesn't pause every worker; until then failed passes are retried at
+    offline_min_interval. While offline, probes back off exponentially (with jitter)
+    up to max_backoff.
+    """
+
+    def __init__(self, urls: Optional[List[str]] = None, timeout: float = 5,
+                 online_interval: float = 30, offline_min_interval: float = 5, max_backoff: float = 120,
+                 failures_to_offline: int = 3):
+        self.logger = logging.getLogger(__name__)
+        self.urls = urls or list(DEFAULT_PROBE_URLS)
+        self.timeout = timeout
+        self.online_interval = online_interval
+        self.offline_min_interval = offline_min_interval
+        self.max_backoff = max_backoff
+        self.failures_to_offline = max(1, failures_to_offline)
+
+        self._online = False
+        self._online_event = threading.Event()
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._subscribers: List[Callable[[bool], None]] = []
+
+        self.checked = False
+        self.last_probe_at = None
+        self.last_change_at = None
+        self.consecutive_failures = 0
+        self.probes = 0
+        self.transitions = 0
+        self.next_delay = 0.0
+
+    # ---------- readers ----------
+    def is_online(self) -> bool:
+        return self._online
+
+    def wait_until_online(self, timeout: Optional[float] = None) -> bool:
+        """Block until the monitor reports online (or timeout); returns the state."""
+        return self._online_event.wait(timeout)
+
+    def subscribe(self, callback: Callable[[bool], None]) -> None:
+        """Register callback(online) to run on every online/offline transition."""
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def probe_soon(self) -> None:
+        """Ask the monitor to re-probe now (e.g. after a network error in a worker)."""
+        self._wakeup.set()
+
+    def status(self) -> dict:
+        return {
+            "online": self._online,
+            "checked": self.checked,
+            "last_probe_at": self.last_probe_at,
+            "last_change_at": self.last_change_at,
+            "consecutive_failures": self.consecutive_failures,
+            "next_probe_in": round(self.next_delay, 1),
+            "probes": self.probes,
+            "transitions": self.transitions
+        }
+
+    # ---------- probing ----------
+    def _probe(self) -> bool:
+        for u in self.urls:
+            try:
+                r = requests.get(u, timeout=self.timeout)
+                if r.status_code in (200, 204):
+                    return True
+            except requests.RequestException:
+                continue
+        return False
+
+    def _publish(self, online: bool) -> None:
+        changed = online != self._online or not self.checked
+        self._online = online
+        self.checked = True
+        if online:
+            self._online_event.set()
+        else:
+            self._online_event.clear()
+        if not changed:
+            return
+        self.last_change_at = int(time.time())
+        self.transitions += 1
+        self.logger.info(f"Connectivity changed: {'online' if online else 'offline'}")
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for cb in subscribers:
+            try:
+                cb(online)
+            except Exception as e:
+                self.logger.error(f"Connectivity subscriber error: {e}")
+
+    def run(self) -> None:
+        """Monitor loop; run on a daemon thread."""
+        while True:
+            try:
+                online = self._probe()
+                self.probes += 1
+                self.last_probe_at = int(time.time())
+                if online:
+                    self.consecutive_failures = 0
+                    delay = self.online_interval
+                    self._publish(True)
+                else:
+                    self.consecutive_failures += 1
+                    if self._online and self.consecutive_failures < self.failures_to_offline:
+                        # Not confirmed yet: stay online and re-check soon
+                        delay = self.offline_min_interval
+                    else:
+                        backoff = self.offline_min_interval * (2 ** min(self.consecutive_failures - 1, 10))
+                        delay = min(self.max_backoff, backoff) * random.uniform(0.8, 1.0)
+                        self._publish(False)
+            except Exception as e:
+                self.logger.error(f"Connectivity monitor error: {e}")
+                delay = self.offline_min_interval
+            self.next_delay = delay
+            self._wakeup.wait(delay)
+            self._wakeup.clear()
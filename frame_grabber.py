@@ -0,0 +1,229 @@
+import os
+import time
+import random
+import bisect
+import threading
+import logging
+import cv2
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class RtspFrameGrabber:
+    """
+    Long-lived reader for one RTSP camera. Keeps the stream open, reconnects with
+    exponential backoff, and always holds the most recent decoded frame so callers
+    get a frame without an RTSP handshake.
+
+    It also keeps a short ring of recent frames as JPEG bytes with their capture
+    times, bounded by age and total bytes, so a capture can pick the frame closest
+    to the moment the card was read. `encode(frame) -> bytes` produces the ring
+    bytes (e.g. the camera's ring encode profile); plain imencode is used otherwise.
+    Logs a warning once if the byte cap keeps less than ring_seconds of frames.
+    """
+
+    def __init__(self, camera_key: str, rtsp_url: str, reconnect_min: float = 1.0, reconnect_max: float = 30.0,
+                 ring_seconds: float = 3.0, ring_max_bytes: int = 4 * 1024 * 1024,
+                 ring_fps: float = 10.0, encode: Optional[Callable[[object], Optional[bytes]]] = None):
+        self.logger = logging.getLogger(__name__)
+        self.camera_key = camera_key
+        self.rtsp_url = rtsp_url
+        self.reconnect_min = reconnect_min
+        self.reconnect_max = reconnect_max
+        self.ring_seconds = ring_seconds
+        self.ring_max_bytes = ring_max_bytes
+        self.ring_interval = 1.0 / ring_fps if ring_fps > 0 else 0.0
+        self.encode = encode
+
+        self._lock = threading.Lock()
+        self._ring_cond = threading.Condition(self._lock)
+        self._frame = None
+        self._frame_at = None    # wall-clock time the frame was read
+        self._ring = deque()     # (captured_at, jpeg_bytes), oldest first
+        self._ring_bytes = 0
+        self._ring_last_at = 0.0
+        self._ring_truncated = False
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.connected = False
+        self.reconnects = 0
+        self.frames = 0
+        self.fps = 0.0
+        self.last_error = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name=f"grabber-{self.camera_key}", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        with self._ring_cond:
+            self._ring_cond.notify_all()
+
+    def latest(self, max_age: Optional[float] = None) -> Tuple[Optional[object], Optional[float]]:
+        """Return (frame, captured_at) or (None, None) if no frame newer than max_age seconds."""
+        with self._lock:
+            frame, frame_at = self._frame, self._frame_at
+        if frame is None:
+            return None, None
+        if max_age is not None and time.time() - frame_at > max_age:
+            return None, None
+        return frame, frame_at
+
+    def frames_around(self, ts: float, before: int = 0, after: int = 0,
+                      timeout: float = 1.0) -> List[Tuple[float, bytes]]:
+        """
+        Return ring frames (captured_at, jpeg_bytes) centred on the one nearest `ts`,
+        plus up to `before`/`after` neighbours. Waits up to `timeout` for frames
+        captured after `ts` to arrive. Returns [] if the ring is empty.
+        """
+        deadline = time.time() + timeout
+        with self._ring_cond:
+            while True:
+                newer = 0
+                if self._ring:
+                    times = [t for t, _ in self._ring]
+                    newer = len(times) - bisect.bisect_left(times, ts)
+                if newer > after or self._stop.is_set():
+                    break
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._ring_cond.wait(remaining)
+            ring = list(self._ring)
+        if not ring:
+            return []
+        times = [t for t, _ in ring]
+        i = bisect.bisect_left(times, ts)
+        if i == len(times) or (i > 0 and ts - times[i - 1] <= times[i] - ts):
+            i -= 1
+        return ring[max(0, i - before):i + after + 1]
+
+    def stats(self) -> dict:
+        with self._lock:
+            frame_at = self._frame_at
+            ring_frames, ring_bytes = len(self._ring), self._ring_bytes
+        return {
+            "connected": self.connected,
+            "fps": round(self.fps, 1),
+            "frames": self.frames,
+            "reconnects": self.reconnects,
+            "frame_age_ms": round((time.time() - frame_at) * 1000) if frame_at else None,
+            "ring_frames": ring_frames,
+            "ring_bytes": ring_bytes,
+            "ring_max_bytes": self.ring_max_bytes,
+            "ring_truncated": self._ring_truncated,
+            "last_error": self.last_error
+        }
+
+    def _push_ring(self, frame, now: float) -> None:
+        if self.ring_seconds <= 0 or now - self._ring_last_at < self.ring_interval:
+            return
+        if self.encode is not None:
+            data = self.encode(frame)
+        else:
+            ok, buf = cv2.imencode(".jpg", frame)
+            data = buf.tobytes() if ok else None
+        if not data:
+            return
+        self._ring_last_at = now
+        with self._ring_cond:
+            self._ring.append((now, data))
+            self._ring_bytes += len(data)
+            truncated = False
+            while self._ring and (now - self._ring[0][0] > self.ring_seconds
+                                  or self._ring_bytes > self.ring_max_bytes):
+                if now - self._ring[0][0] <= self.ring_seconds:
+                    truncated = True
+                _, old = self._ring.popleft()
+                self._ring_bytes -= len(old)
+            kept = now - self._ring[0][0] if self._ring else 0.0
+            self._ring_cond.notify_all()
+        if truncated and not self._ring_truncated:
+            self._ring_truncated = True
+            self.logger.warning(f"{self.camera_key}: frame ring capped at {self.ring_max_bytes} bytes holds only "
+                                f"{kept:.1f}s of the {self.ring_seconds:.1f}s window ({len(data)} bytes/frame); "
+                                f"raise FRAME_RING_MAX_BYTES or lower FRAME_RING_QUALITY/FRAME_RING_FPS")
+
+    def _open(self):
+        cap = cv2.VideoCapture(self.rtsp_url)
+        try:
+            # Keep the decoder queue short so "latest" really is the latest
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        except Exception:
+            pass
+        return cap
+
+    def _run(self) -> None:
+        failures = 0
+        while not self._stop.is_set():
+            cap = None
+            try:
+                cap = self._open()
+                if not cap.isOpened():
+                    raise RuntimeError("RTSP stream not open")
+                self.connected = True
+                failures = 0
+                self.logger.info(f"{self.camera_key}: RTSP stream connected")
+                window_start = time.time()
+                window_frames = 0
+                while not self._stop.is_set():
+                    ret, frame = cap.read()
+                    if not ret or frame is None:
+                        raise RuntimeError("Failed to read frame")
+                    now = time.time()
+                    with self._lock:
+                        self._frame = frame
+                        self._frame_at = now
+                    self._push_ring(frame, now)
+                    self.frames += 1
+                    window_frames += 1
+                    if now - window_start >= 5.0:
+                        self.fps = window_frames / (now - window_start)
+                        window_start = now
+                        window_frames = 0
+            except Exception as e:
+                self.last_error = str(e)
+                if self.connected:
+                    self.logger.warning(f"{self.camera_key}: stream lost ({e}), reconnecting")
+            finally:
+                if cap is not None:
+                    cap.release()
+            self.connected = False
+            self.fps = 0.0
+            if self._stop.is_set():
+                break
+            failures += 1
+            self.reconnects += 1
+            delay = min(self.reconnect_max, self.reconnect_min * (2 ** min(failures - 1, 10)))
+            self._stop.wait(delay * random.uniform(0.8, 1.0))
+
+
+class FrameGrabberPool:
+    """One RtspFrameGrabber per configured camera."""
+
+    def __init__(self, cameras: Dict[str, str], reconnect_max: float = 30.0, encoder=None, **ring_options):
+        self.grabbers: Dict[str, RtspFrameGrabber] = {}
+        for camera_key, url in cameras.items():
+            if os.getenv(f"{camera_key.upper()}_ENABLED", "true").lower() != "true":
+                continue
+            encode = (lambda frame, key=camera_key: encoder.encode_ring(key, frame)) if encoder is not None else None
+            self.grabbers[camera_key] = RtspFrameGrabber(camera_key, url, reconnect_max=reconnect_max,
+                                                         encode=encode, **ring_options)
+
+    def start_all(self) -> None:
+        for grabber in self.grabbers.values():
+            grabber.start()
+
+    def stop_all(self) -> None:
+        for grabber in self.grabbers.values():
+            grabber.stop()
+
+    def get(self, camera_key: str) -> Optional[RtspFrameGrabber]:
+        return self.grabbers.get(camera_key)
+
+    def stats(self) -> dict:
+        return {key: g.stats() for key, g in self.grabbers.items()}
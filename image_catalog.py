@@ -0,0 +1,297 @@
+import os
+import json
+import base64
+import sqlite3
+import threading
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    filename    TEXT PRIMARY KEY,
+    path        TEXT NOT NULL,
+    card        TEXT NOT NULL,
+    reader      INTEGER NOT NULL,
+    timestamp   INTEGER NOT NULL,
+    size        INTEGER NOT NULL,
+    uploaded    INTEGER NOT NULL DEFAULT 0,
+    uploaded_at INTEGER,
+    s3_location TEXT,
+    dead_at     INTEGER,
+    last_error  TEXT,
+    status      TEXT
+);
+CREATE INDEX IF NOT EXISTS images_ts ON images (timestamp);
+CREATE INDEX IF NOT EXISTS images_uploaded_ts ON images (uploaded, timestamp);
+CREATE INDEX IF NOT EXISTS images_ts_name ON images (timestamp, filename);
+CREATE INDEX IF NOT EXISTS images_card_ts ON images (card, timestamp);
+"""
+
+# Columns added after the first release; (name, declaration) for ALTER TABLE on older catalogs
+MIGRATIONS = [("dead_at", "INTEGER"), ("last_error", "TEXT"), ("status", "TEXT")]
+
+# Indexes over migrated columns, created once the columns exist
+POST_MIGRATION_INDEXES = """
+CREATE INDEX IF NOT EXISTS images_pending_status ON images (uploaded, status, timestamp);
+"""
+
+INSERT = ("INSERT OR REPLACE INTO images (filename, path, card, reader, timestamp, size, uploaded, "
+          "uploaded_at, s3_location, status) VALUES (?,?,?,?,?,?,?,?,?,?)")
+
+# Re-index from disk without losing catalog-only fields (scan outcome, dead-letter marks)
+UPSERT = ("INSERT INTO images (filename, path, card, reader, timestamp, size, uploaded, uploaded_at, "
+          "s3_location) VALUES (?,?,?,?,?,?,?,?,?) ON CONFLICT(filename) DO UPDATE SET "
+          "path=excluded.path, card=excluded.card, reader=excluded.reader, timestamp=excluded.timestamp, "
+          "size=excluded.size, uploaded=excluded.uploaded, uploaded_at=excluded.uploaded_at, "
+          "s3_location=excluded.s3_location, "
+          "dead_at=CASE WHEN excluded.uploaded=1 THEN NULL ELSE dead_at END")
+
+# Backlog upload order by scan outcome; NULL covers images indexed from disk without one
+PENDING_STATUS_ORDER = ("granted", "denied", "blocked", None)
+
+# Page cursor: position after the last row served, as (timestamp, filename)
+Cursor = Tuple[int, str]
+
+
+def encode_cursor(cursor: Cursor) -> str:
+    return base64.urlsafe_b64encode(f"{cursor[0]}:{cursor[1]}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> Cursor:
+    """Inverse of encode_cursor; raises ValueError on a malformed token."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+        ts, filename = raw.split(":", 1)
+        return int(ts), filename
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def parse_image_name(filename: str, fallback_ts: int = 0) -> Tuple[str, int, int]:
+    """
+    (card, reader, timestamp) from CARD_rN_TS[_tag].jpg or legacy CARD_TS.jpg.
+    Unparseable names get card "unknown", reader 1 and `fallback_ts`.
+    """
+    parts = os.path.splitext(filename)[0].split('_')
+    try:
+        if len(parts) >= 3:
+            reader = int(parts[1][1:]) if parts[1].startswith('r') else 1
+            return parts[0], reader, int(parts[2])
+        if len(parts) == 2:
+            return parts[0], 1, int(parts[1])
+    except ValueError:
+        pass
+    return "unknown", 1, fallback_ts
+
+
+class ImageCatalog:
+    """
+    SQLite (WAL) index of captured images keyed by filename, so listing, upload
+    state and storage totals are queries instead of directory scans and sidecar
+    reads. Kept current at capture/upload/delete time; rebuild() re-derives it
+    from disk.
+    """
+
+    def __init__(self, db_path: str):
+        self.logger = logging.getLogger(__name__)
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        existing = {r[1] for r in self._conn.execute("PRAGMA table_info(images)")}
+        for name, decl in MIGRATIONS:
+            if name not in existing:
+                self._conn.execute(f"ALTER TABLE images ADD COLUMN {name} {decl}")
+        self._conn.executescript(POST_MIGRATION_INDEXES)
+
+    # ---------- writers ----------
+    def add(self, filename: str, path: str, size: int, uploaded: bool = False,
+            uploaded_at: Optional[int] = None, s3_location: Optional[str] = None,
+            fallback_ts: int = 0, status: Optional[str] = None) -> None:
+        """`status` is the scan outcome (granted/denied/blocked) used to order the upload backlog."""
+        card, reader, ts = parse_image_name(filename, fallback_ts)
+        with self._lock:
+            self._conn.execute(
+                INSERT,
+                (filename, path, card, reader, ts, size, int(uploaded), uploaded_at, s3_location, status))
+
+    def mark_uploaded(self, filename: str, s3_location: str, uploaded_at: int) -> None:
+        with self._lock:
+            self._conn.execute("UPDATE images SET uploaded=1, uploaded_at=?, s3_location=?, dead_at=NULL, "
+                               "last_error=NULL WHERE filename=?", (uploaded_at, s3_location, filename))
+
+    def mark_dead(self, filename: str, error: Optional[str], dead_at: int) -> None:
+        """Dead-letter an image: pending() skips it until requeue_dead()."""
+        with self._lock:
+            self._conn.execute("UPDATE images SET dead_at=?, last_error=? WHERE filename=?",
+                               (dead_at, error, filename))
+
+    def requeue_dead(self, filenames: Optional[List[str]] = None) -> List[Dict]:
+        """Clear the dead-letter mark on `filenames` (all if None); returns the cleared rows."""
+        with self._lock:
+            if filenames is None:
+                rows = self._conn.execute("SELECT * FROM images WHERE dead_at IS NOT NULL").fetchall()
+            else:
+                marks = ",".join("?" * len(filenames))
+                rows = self._conn.execute(f"SELECT * FROM images WHERE dead_at IS NOT NULL AND filename IN ({marks})",
+                                          tuple(filenames)).fetchall() if filenames else []
+            self._conn.executemany("UPDATE images SET dead_at=NULL, last_error=NULL WHERE filename=?",
+                                   [(r["filename"],) for r in rows])
+        return [dict(r) for r in rows]
+
+    def remove(self, filename: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM images WHERE filename=?", (filename,))
+
+    def remove_under(self, prefix: str) -> List[Tuple[str, int]]:
+        """Drop every row whose path is under `prefix` (e.g. a day directory); returns their (filename, size)."""
+        pattern = prefix.rstrip(os.sep) + os.sep + "%"
+        with self._lock:
+            rows = [(r[0], r[1]) for r in
+                    self._conn.execute("SELECT filename, size FROM images WHERE path LIKE ?", (pattern,))]
+            self._conn.execute("DELETE FROM images WHERE path LIKE ?", (pattern,))
+        return rows
+
+    def rebuild(self, images_dir: str, skip_dirs: Iterable[str] = ()) -> int:
+        """
+        Re-index every image under images_dir (reading upload sidecars once). Walked
+        files are upserted and only rows whose file is gone are deleted, so captures
+        added while the walk runs are kept. Returns the count.
+        """
+        skip = {os.path.realpath(d) for d in skip_dirs}
+        rows = []
+        for root, dirs, files in os.walk(images_dir):
+            dirs[:] = [d for d in dirs if not d.startswith('.') and os.path.realpath(os.path.join(root, d)) not in skip]
+            for name in files:
+                if not name.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                uploaded, uploaded_at, location = 0, None, None
+                try:
+                    with open(path + ".uploaded.json", "r") as f:
+                        meta = json.load(f)
+                    uploaded, uploaded_at, location = 1, meta.get("uploaded_at"), meta.get("s3_location", "")
+                except FileNotFoundError:
+                    pass
+                except Exception as e:
+                    self.logger.error(f"Error reading upload sidecar for {name}: {e}")
+                card, reader, ts = parse_image_name(name, int(st.st_mtime))
+                rows.append((name, os.path.relpath(path, images_dir), card, reader, ts, st.st_size,
+                             uploaded, uploaded_at, location))
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(UPSERT, rows)
+                walked = {r[0] for r in rows}
+                gone = [(filename,) for filename, path in self._conn.execute("SELECT filename, path FROM images")
+                        if filename not in walked and not os.path.exists(os.path.join(images_dir, path))]
+                self._conn.executemany("DELETE FROM images WHERE filename=?", gone)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        self.logger.info(f"Image catalog rebuilt: {len(rows)} images")
+        return len(rows)
+
+    # ---------- readers ----------
+    def _query(self, sql: str, args: tuple = ()) -> List[Dict]:
+        with self._lock:
+            return [dict(r) for r in self._conn.execute(sql, args).fetchall()]
+
+    def get(self, filename: str) -> Optional[Dict]:
+        rows = self._query("SELECT * FROM images WHERE filename=?", (filename,))
+        return rows[0] if rows else None
+
+    def older_than(self, cutoff_ts: int) -> List[Dict]:
+        return self._query("SELECT * FROM images WHERE timestamp < ? ORDER BY timestamp", (cutoff_ts,))
+
+    def page(self, limit: int, cursor: Optional[Cursor] = None, newest_first: bool = True,
+             card: Optional[str] = None, reader: Optional[int] = None, since: Optional[int] = None,
+             until: Optional[int] = None, uploaded: Optional[bool] = None) -> Tuple[List[Dict], Optional[Cursor]]:
+        """
+        One page of images in stable (timestamp, filename) order using keyset pagination,
+        so each page costs O(limit) however large the archive is. Returns (rows, next_cursor).
+        """
+        where, args = [], []
+        if card:
+            # Prefix match as a range so the (card, timestamp) index is used; LIKE never is
+            where.append("card >= ? AND card < ?")
+            args += [card, card[:-1] + chr(ord(card[-1]) + 1)]
+        if reader is not None:
+            where.append("reader = ?")
+            args.append(reader)
+        if since is not None:
+            where.append("timestamp >= ?")
+            args.append(since)
+        if until is not None:
+            where.append("timestamp < ?")
+            args.append(until)
+        if uploaded is not None:
+            where.append("uploaded = ?")
+            args.append(int(uploaded))
+        if cursor is not None:
+            op = "<" if newest_first else ">"
+            where.append(f"(timestamp {op} ? OR (timestamp = ? AND filename {op} ?))")
+            args += [cursor[0], cursor[0], cursor[1]]
+        direction = "DESC" if newest_first else "ASC"
+        sql = "SELECT * FROM images"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY timestamp {direction}, filename {direction} LIMIT ?"
+        rows = self._query(sql, tuple(args) + (limit + 1,))
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            return rows, (last["timestamp"], last["filename"])
+        return rows, None
+
+    def reader_counts(self) -> Dict[int, int]:
+        with self._lock:
+            return {r[0]: r[1] for r in self._conn.execute("SELECT reader, COUNT(*) FROM images GROUP BY reader")}
+
+    def eviction_candidates(self, uploaded: bool, limit: int) -> List[Dict]:
+        """Oldest images in one upload tier; served by the (uploaded, timestamp) index, so O(limit)."""
+        return self._query("SELECT * FROM images WHERE uploaded=? ORDER BY timestamp LIMIT ?",
+                           (int(uploaded), limit))
+
+    def pending(self, limit: int, newest_first: bool = False) -> List[Dict]:
+        """
+        Up to `limit` images awaiting upload (not dead-lettered), in PENDING_STATUS_ORDER
+        and by capture time within each status; one indexed query per status.
+        """
+        direction = "DESC" if newest_first else "ASC"
+        rows = []
+        for status in PENDING_STATUS_ORDER:
+            if len(rows) >= limit:
+                break
+            rows += self._query("SELECT * FROM images WHERE uploaded=0 AND status IS ? AND dead_at IS NULL "
+                                f"ORDER BY timestamp {direction} LIMIT ?", (status, limit - len(rows)))
+        return rows
+
+    def dead_letters(self, limit: int) -> List[Dict]:
+        return self._query("SELECT * FROM images WHERE dead_at IS NOT NULL ORDER BY dead_at DESC LIMIT ?", (limit,))
+
+    def all_paths(self) -> List[str]:
+        with self._lock:
+            return [r[0] for r in self._conn.execute("SELECT path FROM images").fetchall()]
+
+    def totals(self) -> Dict[str, int]:
+        with self._lock:
+            count, size, uploaded, dead, pending_bytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(uploaded), 0), COUNT(dead_at), "
+                "COALESCE(SUM(CASE WHEN uploaded=0 AND dead_at IS NULL THEN size END), 0) FROM images").fetchone()
+        return {"count": count, "bytes": size, "uploaded": uploaded, "pending": count - uploaded, "dead": dead,
+                "pending_bytes": pending_bytes}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,146 @@
+import time
+import threading
+import logging
+import cv2
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional
+
+# Stats/profile key suffix for the cheaper pre-event ring encodes
+RING_SUFFIX = ":ring"
+
+
+class EncodeProfile(NamedTuple):
+    """JPEG settings for one camera. max_width/max_height of 0 keep the native size."""
+    max_width: int = 0
+    max_height: int = 0
+    quality: int = 85
+    progressive: bool = False
+    optimize: bool = True
+
+
+class ImageEncoder:
+    """
+    Encodes frames to JPEG bytes in memory with a per-camera EncodeProfile,
+    so an image is compressed once and the same bytes are written and uploaded.
+    Frame-ring encodes run many times a second, so encode_ring() uses the same
+    profile without progressive/optimize, capped at `ring_quality` (0 = no cap).
+    Captures saved from the ring keep these ring settings.
+    Keeps encode time and output size per profile.
+    """
+
+    def __init__(self, profiles: Dict[str, EncodeProfile], ring_quality: int = 0):
+        self.logger = logging.getLogger(__name__)
+        self.profiles = dict(profiles)
+        self.ring_quality = ring_quality
+        self._lock = threading.Lock()
+        self._stats: Dict[str, list] = {}  # profile -> [count, total_ms, max_ms, total_bytes, last_bytes]
+
+    def profile(self, camera_key: str) -> EncodeProfile:
+        if camera_key.endswith(RING_SUFFIX):
+            p = self.profile(camera_key[:-len(RING_SUFFIX)])
+            quality = min(p.quality, self.ring_quality) if self.ring_quality else p.quality
+            return p._replace(quality=quality, progressive=False, optimize=False)
+        return self.profiles.get(camera_key) or EncodeProfile()
+
+    def encode_ring(self, camera_key: str, frame) -> Optional[bytes]:
+        """Encode a frame for the pre-event ring with the camera's cheaper ring profile."""
+        return self.encode(camera_key + RING_SUFFIX, frame)
+
+    def encode(self, camera_key: str, frame) -> Optional[bytes]:
+        """Resize (if the profile asks for it) and JPEG-encode a frame; None on failure."""
+        p = self.profile(camera_key)
+        started = time.perf_counter()
+        h, w = frame.shape[:2]
+        scale = 1.0
+        if p.max_width and w > p.max_width:
+            scale = p.max_width / w
+        if p.max_height and h * scale > p.max_height:
+            scale = p.max_height / h
+        if scale < 1.0:
+            frame = cv2.resize(frame, (max(1, int(w * scale)), max(1, int(h * scale))),
+                               interpolation=cv2.INTER_AREA)
+        params = [cv2.IMWRITE_JPEG_QUALITY, int(p.quality)]
+        if p.progressive:
+            params += [cv2.IMWRITE_JPEG_PROGRESSIVE, 1]
+        if p.optimize:
+            params += [cv2.IMWRITE_JPEG_OPTIMIZE, 1]
+        ok, buf = cv2.imencode(".jpg", frame, params)
+        if not ok:
+            self.logger.error(f"{camera_key}: JPEG encode failed")
+            return None
+        data = buf.tobytes()
+        self._record(camera_key, (time.perf_counter() - started) * 1000, len(data))
+        return data
+
+    def _record(self, name: str, elapsed_ms: float, size: int) -> None:
+        with self._lock:
+            s = self._stats.get(name)
+            if s is None:
+                s = self._stats[name] = [0, 0.0, 0.0, 0, 0]
+            s[0] += 1
+            s[1] += elapsed_ms
+            s[2] = max(s[2], elapsed_ms)
+            s[3] += size
+            s[4] = size
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = {}
+            for name, (count, total_ms, max_ms, total_bytes, last_bytes) in self._stats.items():
+                out[name] = {
+                    "profile": self.profile(name)._asdict(),
+                    "encodes": count,
+                    "avg_ms": round(total_ms / count, 2),
+                    "max_ms": round(max_ms, 2),
+                    "avg_bytes": total_bytes // count,
+                    "last_bytes": last_bytes
+                }
+            return out
+
+
+class EncodedImageCache:
+    """
+    Bounded LRU of recently written JPEG bytes keyed by file path, so the
+    uploader can send them without reading the file back from the SD card.
+    """
+
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[str, bytes]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def put(self, filepath: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(filepath, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._items[filepath] = data
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def pop(self, filepath: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._items.pop(filepath, None)
+            if data is None:
+                self.misses += 1
+                return None
+            self._bytes -= len(data)
+            self.hits += 1
+            return data
+
+    def discard(self, filepath: str) -> None:
+        with self._lock:
+            data = self._items.pop(filepath, None)
+            if data is not None:
+                self._bytes -= len(data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._items), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
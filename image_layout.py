@@ -0,0 +1,89 @@
+import os
+import time
+import shutil
+import logging
+from datetime import date
+from typing import Iterator, Optional, Tuple
+
+from image_catalog import IMAGE_EXTENSIONS, parse_image_name
+
+logger = logging.getLogger(__name__)
+
+
+def image_relpath(filename: str, by_reader: bool = False, fallback_ts: Optional[int] = None) -> str:
+    """YYYY/MM/DD[/rN]/filename for a capture, using the timestamp in its name (local date)."""
+    _, reader, ts = parse_image_name(filename, fallback_ts if fallback_ts is not None else int(time.time()))
+    parts = time.strftime("%Y/%m/%d", time.localtime(ts)).split("/")
+    if by_reader:
+        parts.append(f"r{reader}")
+    return os.path.join(*parts, filename)
+
+
+def resolve_image(images_dir: str, filename: str, by_reader: bool = False) -> Optional[str]:
+    """
+    Locate an image by name without scanning: the sharded path implied by its
+    name (either reader layout), then the legacy flat path. None if not found.
+    """
+    candidates = [image_relpath(filename, by_reader, fallback_ts=-1),
+                  image_relpath(filename, not by_reader, fallback_ts=-1),
+                  filename]
+    for rel in candidates:
+        path = os.path.join(images_dir, rel)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def iter_day_dirs(images_dir: str) -> Iterator[Tuple[date, str]]:
+    """Yield (date, path) for every YYYY/MM/DD directory, oldest first. Costs O(days), not O(files)."""
+    def numeric(path):
+        try:
+            return sorted(d for d in os.listdir(path) if d.isdigit() and os.path.isdir(os.path.join(path, d)))
+        except FileNotFoundError:
+            return []
+
+    for y in numeric(images_dir):
+        for m in numeric(os.path.join(images_dir, y)):
+            for d in numeric(os.path.join(images_dir, y, m)):
+                try:
+                    day = date(int(y), int(m), int(d))
+                except ValueError:
+                    continue
+                yield day, os.path.join(images_dir, y, m, d)
+
+
+def remove_day_dir(path: str) -> None:
+    """Delete one day directory in a single step and prune empty month/year parents."""
+    shutil.rmtree(path, ignore_errors=True)
+    for parent in (os.path.dirname(path), os.path.dirname(os.path.dirname(path))):
+        try:
+            os.rmdir(parent)
+        except OSError:
+            break
+
+
+def migrate_flat_images(images_dir: str, by_reader: bool = False, dry_run: bool = False) -> int:
+    """Move CARD_rN_TS.jpg files (and their upload sidecars) from the top of images_dir into day shards."""
+    moved = 0
+    for name in os.listdir(images_dir):
+        if not name.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        src = os.path.join(images_dir, name)
+        if not os.path.isfile(src):
+            continue
+        rel = image_relpath(name, by_reader, fallback_ts=int(os.path.getmtime(src)))
+        dst = os.path.join(images_dir, rel)
+        if dry_run:
+            logger.info(f"Would move {name} -> {rel}")
+            moved += 1
+            continue
+        try:
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            # Sidecar first: an image without one is just re-uploaded, never the reverse
+            if os.path.exists(src + ".uploaded.json"):
+                os.replace(src + ".uploaded.json", dst + ".uploaded.json")
+            os.replace(src, dst)
+            moved += 1
+        except OSError as e:
+            logger.error(f"Error moving {name}: {e}")
+    return moved
@@ -6,25 +6,44 @@ import sys
 import RPi.GPIO as GPIO
 import firebase_admin
 from firebase_admin import credentials, firestore
-from flask import Flask, request, render_template, jsonify, session, redirect, url_for
+from flask import Flask, request, render_template, jsonify, session, redirect, url_for, Response
 import requests
 import logging
 import os
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import google.api_core.exceptions
-from queue import Queue
+from queue import Queue, Empty
+from collections import deque
 from dotenv import load_dotenv
 import hashlib
+import calendar
 import secrets
+import random
 
 # NEW/UPDATED imports for camera capture & upload
 import cv2
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 
 # Use your config/uploader modules (RTSP cameras, retry configs, S3 API)
 # (These come from your uploaded files.)
 from config import RTSP_CAMERAS, MAX_RETRIES, RETRY_DELAY  # :contentReference[oaicite:3]{index=3}
+from config import GRABBER_RECONNECT_MAX, FRAME_MAX_AGE
+from config import (FRAME_RING_SECONDS, FRAME_RING_MAX_BYTES, FRAME_RING_FPS, FRAME_RING_QUALITY,
+                    FRAME_RING_FRAME_BYTES, CAPTURE_FRAMES_BEFORE, CAPTURE_FRAMES_AFTER)
+from config import ENCODE_PROFILES, ENCODED_CACHE_MAX_BYTES
+from config import UPLOAD_WORKERS, UPLOAD_RETRY_BASE_DELAY, UPLOAD_RETRY_MAX_DELAY, UPLOAD_RETRY_BUDGET
+from config import UPLOAD_BACKLOG_ORDER, UPLOAD_BANDWIDTH_KBPS
 from uploader import ImageUploader  # :contentReference[oaicite:4]{index=4}
+from access_store import AccessStore, MutationJournal, apply_mutation
+from txn_log import SegmentedTxnLog
+from connectivity import ConnectivityMonitor
+from relay_actuator import RelayActuator
+from upload_queue import RetryScheduler, UploadQueue, TokenBucket, PRIORITY_LIVE, backlog_priority
+from frame_grabber import FrameGrabberPool
+from image_encoder import EncodeProfile, ImageEncoder, EncodedImageCache
+from thumbnails import ThumbnailCache
+from image_catalog import ImageCatalog, encode_cursor, decode_cursor
+from image_layout import image_relpath, resolve_image, iter_day_dirs, remove_day_dir
 
 # =========================
 # Environment / Constants
@@ -32,9 +51,20 @@ from uploader import ImageUploader  # :contentReference[oaicite:4]{index=4}
 load_dotenv()
 
 transaction_queue = Queue()
-image_queue = Queue()  # for background S3 uploads (non-blocking)
+# for background S3 uploads (non-blocking); each path queued at most once, live captures first
+image_queue = UploadQueue(newest_first=UPLOAD_BACKLOG_ORDER != "oldest")
 IMAGES_DIR = os.environ.get("IMAGES_DIR", "images")
 os.makedirs(IMAGES_DIR, exist_ok=True)
+# Captures are stored as IMAGES_DIR/YYYY/MM/DD[/rN]/CARD_rN_TS.jpg (see migrate_images.py for old flat trees)
+IMAGE_SHARD_BY_READER = os.environ.get("IMAGE_SHARD_BY_READER", "false").lower() == "true"
+
+# Dashboard gallery thumbnails (on-disk cache, built at capture time or on first request)
+THUMBNAIL_DIR = os.environ.get("THUMBNAIL_DIR", os.path.join(IMAGES_DIR, ".thumbnails"))
+THUMBNAIL_SIZE = int(os.environ.get("THUMBNAIL_SIZE", "320"))  # longest side in pixels
+THUMBNAIL_QUALITY = int(os.environ.get("THUMBNAIL_QUALITY", "70"))
+THUMBNAIL_WORKERS = int(os.environ.get("THUMBNAIL_WORKERS", "1"))
+THUMBNAIL_ON_CAPTURE = os.environ.get("THUMBNAIL_ON_CAPTURE", "true").lower() == "true"
+IMAGE_CACHE_MAX_AGE = int(os.environ.get("IMAGE_CACHE_MAX_AGE", str(7 * 24 * 3600)))  # browser cache (seconds)
 
 # Storage Management Configuration (Dynamic - based on available free space)
 # Fallback values for when dynamic calculation fails
@@ -51,13 +81,20 @@ D1_PIN_2 = int(os.environ.get('D1_PIN_2', 24))  # Wiegand Data 1 (Reader 2 - Whi
 # GPIO Pins for Two Relays
 RELAY_1 = int(os.environ.get('RELAY_1', 25))  # Relay for Reader 1
 RELAY_2 = int(os.environ.get('RELAY_2', 26))  # Relay for Reader 2
+RELAY_1_PULSE_SECONDS = float(os.environ.get('RELAY_1_PULSE_SECONDS', 1.0))  # open time per grant
+RELAY_2_PULSE_SECONDS = float(os.environ.get('RELAY_2_PULSE_SECONDS', 1.0))
 
 # File Paths
 BASE_DIR = os.environ.get('BASE_DIR', '/home/maxpark')
 USER_DATA_FILE = os.path.join(BASE_DIR, "users.json")
 BLOCKED_USERS_FILE = os.path.join(BASE_DIR, "blocked_users.json")
-TRANSACTION_CACHE_FILE = os.path.join(BASE_DIR, "transactions_cache.json")
+TRANSACTION_CACHE_FILE = os.path.join(BASE_DIR, "transactions_cache.json")  # legacy, imported into the log at boot
+TRANSACTION_LOG_DIR = os.path.join(BASE_DIR, "transactions_log")
 DAILY_STATS_FILE = os.path.join(BASE_DIR, "daily_stats.json")
+ACCESS_JOURNAL_FILE = os.path.join(BASE_DIR, "access_journal.jsonl")
+USER_SYNC_STATE_FILE = os.path.join(BASE_DIR, "user_sync_state.json")  # Firestore users watermark
+CONTROL_STATE_FILE = os.path.join(BASE_DIR, "control_state.json")  # last applied remote relay pulse
+IMAGE_CATALOG_FILE = os.path.join(BASE_DIR, "image_catalog.db")
 FIREBASE_CRED_FILE = os.environ.get('FIREBASE_CRED_FILE', "service.json")
 
 # Ensure base directory exists
@@ -105,15 +142,16 @@ def session_cleanup_worker():
             logging.error(f"Session cleanup error: {e}")
             time.sleep(60)  # Retry in 1 minute on error
 
-def daily_stats_cleanup_worker():
-    """Background worker to clean up old daily statistics"""
+def daily_stats_flush_worker():
+    """Background worker to persist in-memory daily statistics"""
     while True:
         try:
-            cleanup_old_daily_stats()
-            time.sleep(86400)  # Check every 24 hours
+            time.sleep(DAILY_STATS_FLUSH_INTERVAL)
+            daily_stats.roll_if_needed()
+            daily_stats.flush()
         except Exception as e:
-            logging.error(f"Daily stats cleanup error: {e}")
-            time.sleep(3600)  # Retry in 1 hour on error
+            logging.error(f"Daily stats flush error: {e}")
+            time.sleep(60)  # Retry in 1 minute on error
 
 def hash_password(password):
     """Hash password using SHA-256"""
@@ -180,7 +218,17 @@ except Exception as e:
     logging.error(f"Error initializing GPIO relays: {str(e)}")
     # Continue without relay functionality
 
-relay_status = 0
+def _write_relay(pin, is_open):
+    """Relays are active-low: LOW opens, HIGH (the idle state) closes."""
+    if not hasattr(GPIO, 'output'):
+        logging.warning("GPIO not available. Relay operation skipped.")
+        return
+    GPIO.output(pin, GPIO.LOW if is_open else GPIO.HIGH)
+
+# Single actuator thread owns both relays: per-relay state (normal/pulsing/open-hold/close-hold)
+# and pulse timers, so a hold on one door never affects the other.
+relay_actuator = RelayActuator({RELAY_1: RELAY_1_PULSE_SECONDS, RELAY_2: RELAY_2_PULSE_SECONDS}, _write_relay)
+relay_actuator.start()
 
 # pigpio
 pi = None
@@ -199,26 +247,17 @@ except Exception as e:
 # =========================
 # Utilities
 # =========================
+# Shared connectivity state; probing happens on one background thread with backoff
+connectivity = ConnectivityMonitor(
+    timeout=int(os.environ.get('INTERNET_CHECK_TIMEOUT', 5)),
+    online_interval=int(os.environ.get('INTERNET_CHECK_INTERVAL', 30)),
+    max_backoff=int(os.environ.get('INTERNET_CHECK_MAX_BACKOFF', 120)),
+    failures_to_offline=int(os.environ.get('INTERNET_CHECK_RETRIES', 3))
+)
+
 def is_internet_available():
-    """Fast and reliable internet check using 204 endpoints."""
-    retries = int(os.environ.get('INTERNET_CHECK_RETRIES', 3))
-    timeout = int(os.environ.get('INTERNET_CHECK_TIMEOUT', 5))
-    urls = [
-        "http://clients3.google.com/generate_204",   # HTTP avoids cert/time issues at boot
-        "https://www.gstatic.com/generate_204",
-        "https://www.google.com/generate_204",
-        "https://cloudflare.com/cdn-cgi/trace",
-    ]
-    for _ in range(retries):
-        for u in urls:
-            try:
-                r = requests.get(u, timeout=timeout)
-                if r.status_code in (200, 204):
-                    return True
-            except requests.RequestException:
-                continue
-        time.sleep(2)
-    return False
+    """Cached connectivity state from the background monitor (O(1), never blocks)."""
+    return connectivity.is_online()
 
 def atomic_write_json(path, data):
     """Write JSON atomically to avoid corruption."""
@@ -249,203 +288,455 @@ def _ts_to_epoch(ts):
     return time.time()
 
 # =========================
-# Thread-safe stores + O(1) sets for fast lookups
+# Thread-safe stores + lock-free access snapshot for fast lookups
 # =========================
-USERS_LOCK = threading.RLock()
-BLOCKED_LOCK = threading.RLock()
-ALLOWED_SET_LOCK = threading.RLock()
-BLOCKED_SET_LOCK = threading.RLock()
+ACCESS_LOCK = threading.RLock()             # orders journal appends with full replaces
+ACCESS_COMPACTION_LOCK = threading.Lock()   # one compaction at a time
+ACCESS_JOURNAL_MAX_ENTRIES = int(os.environ.get("ACCESS_JOURNAL_MAX_ENTRIES", "500"))
+ACCESS_JOURNAL_COMPACT_INTERVAL = int(os.environ.get("ACCESS_JOURNAL_COMPACT_INTERVAL", "300"))
+ACCESS_PERSIST_DEBOUNCE = float(os.environ.get("ACCESS_PERSIST_DEBOUNCE", "2"))
+
+# Writers publish immutable AccessSnapshot objects; handle_access reads one pointer.
+access_store = AccessStore()
+# Snapshot versions restart at 0 each boot; (epoch, version) identifies a snapshot across restarts
+ACCESS_EPOCH = int(time.time())
+# users.json/blocked_users.json are snapshots; single-card changes go to this journal.
+access_journal = MutationJournal(ACCESS_JOURNAL_FILE)
+_access_compaction_wakeup = threading.Event()
+_access_unsaved = threading.Event()  # in-memory changes not yet in the journal or snapshot files
+_user_watermark_pending = None  # Firestore users watermark (value, kind) applied in memory, saved once durable
 
-users = read_json_or_default(USER_DATA_FILE, {})              # dict[str_card] -> user dict
-blocked_users = read_json_or_default(BLOCKED_USERS_FILE, {})  # dict[str_card] -> bool
+def load_local_users():
+    """Return a copy of the in-memory users (snapshot + journal, already loaded at boot)."""
+    return access_store.users()
 
-ALLOWED_SET = set()  # set[int]
-BLOCKED_SET = set()  # set[int]
+def load_blocked_users():
+    """Return a copy of the in-memory blocked flags."""
+    return access_store.blocked()
+
+def mutate_access(op, card_number, user=None):
+    """Journal one user/blocklist change and apply it to the access snapshot in O(1)."""
+    rec = {"op": op, "card": card_number, "ts": int(time.time())}
+    if user is not None:
+        rec["user"] = user
+    with ACCESS_LOCK:
+        access_journal.append(rec)
+        access_store.apply(rec)
+    if access_journal.count >= ACCESS_JOURNAL_MAX_ENTRIES:
+        _access_compaction_wakeup.set()
+
+def mutate_access_batch(records):
+    """
+    Apply many changes with one snapshot publish. Small batches are journaled with a
+    single fsync; large ones (e.g. a listener resync) skip the journal and are
+    persisted by the next (debounced) compaction instead.
+    """
+    if not records:
+        return
+    with ACCESS_LOCK:
+        if len(records) <= ACCESS_JOURNAL_MAX_ENTRIES:
+            access_journal.extend(records)
+        else:
+            _access_unsaved.set()
+        access_store.apply_batch(records)
+    if _access_unsaved.is_set() or access_journal.count >= ACCESS_JOURNAL_MAX_ENTRIES:
+        _access_compaction_wakeup.set()
+
+def compact_access_journal():
+    """Fold the mutation journal into users.json/blocked_users.json."""
+    with ACCESS_COMPACTION_LOCK:
+        with ACCESS_LOCK:
+            access_journal.rotate()
+            _access_unsaved.clear()
+            users_copy = access_store.users()
+            blocked_copy = access_store.blocked()
+            watermark = _user_watermark_pending  # covers only changes already in the copies
+        # Mutations after rotate() land in the fresh journal and replay on top of these files
+        atomic_write_json(USER_DATA_FILE, users_copy)
+        atomic_write_json(BLOCKED_USERS_FILE, blocked_copy)
+        access_journal.finish_compaction()
+        if watermark is not None:
+            _save_user_sync_state(watermark)
+
+def load_access_store():
+    """Boot: read users/blocked snapshots, replay the journal and publish one snapshot."""
+    users_data = read_json_or_default(USER_DATA_FILE, {})
+    blocked_data = read_json_or_default(BLOCKED_USERS_FILE, {})
+    records = access_journal.replay()
+    for rec in records:
+        apply_mutation(users_data, blocked_data, rec)
+    access_store.replace_all(users_data, blocked_data)
+    if records:
+        logging.info(f"Replayed {len(records)} access journal entries")
+        compact_access_journal()
+
+def access_journal_compactor():
+    """Background worker to compact the access journal when it grows or periodically."""
+    while True:
+        try:
+            if _access_compaction_wakeup.wait(ACCESS_JOURNAL_COMPACT_INTERVAL):
+                # Let a burst of changes settle so it costs one snapshot write
+                time.sleep(ACCESS_PERSIST_DEBOUNCE)
+            _access_compaction_wakeup.clear()
+            if access_journal.count > 0 or _access_unsaved.is_set():
+                compact_access_journal()
+                logging.info("Access journal compacted")
+        except Exception as e:
+            logging.error(f"Access journal compaction error: {e}")
+            time.sleep(60)
 
-def _card_str_to_int(card_str: str):
-    try:
-        return int(card_str)
-    except Exception:
-        return None
+# Initialize in-memory stores + snapshot at boot
+try:
+    load_access_store()
+except Exception as e:
+    logging.error(f"Error loading access store: {e}")
 
-def _rebuild_allowed_set_from_users_dict(u: dict):
-    global ALLOWED_SET
-    with ALLOWED_SET_LOCK:
-        ALLOWED_SET = set()
-        for k in u.keys():
-            ci = _card_str_to_int(k)
-            if ci is not None:
-                ALLOWED_SET.add(ci)
-
-def _rebuild_blocked_set_from_dict(b: dict):
-    global BLOCKED_SET
-    with BLOCKED_SET_LOCK:
-        BLOCKED_SET = set()
-        for k, v in b.items():
-            if v:
-                ci = _card_str_to_int(k)
-                if ci is not None:
-                    BLOCKED_SET.add(ci)
+# Offline transaction cache: append-only segmented log with group-commit fsync
+transaction_log = SegmentedTxnLog(
+    TRANSACTION_LOG_DIR,
+    segment_max_bytes=int(os.environ.get("TRANSACTION_LOG_SEGMENT_BYTES", str(1024 * 1024))),
+    commit_interval=float(os.environ.get("TRANSACTION_LOG_COMMIT_INTERVAL", "1.0"))
+)
 
-def load_local_users():
-    """Load users from disk into memory and refresh the ALLOWED_SET."""
-    global users
-    with USERS_LOCK:
-        users = read_json_or_default(USER_DATA_FILE, {})
-        _rebuild_allowed_set_from_users_dict(users)
-        return dict(users)
-
-def save_local_users(new_users):
-    """Persist users and refresh the ALLOWED_SET."""
-    global users
-    with USERS_LOCK:
-        users = dict(new_users)
-        atomic_write_json(USER_DATA_FILE, users)
-        _rebuild_allowed_set_from_users_dict(users)
+def import_legacy_transaction_cache():
+    """Move a pre-log transactions_cache.json backlog into the segmented log once."""
+    if not os.path.exists(TRANSACTION_CACHE_FILE):
+        return
+    txns = read_json_or_default(TRANSACTION_CACHE_FILE, [])
+    if txns:
+        transaction_log.append_many(txns, sync=True)
+        logging.info(f"Imported {len(txns)} cached transactions into the transaction log")
+    os.remove(TRANSACTION_CACHE_FILE)
 
-def load_blocked_users():
-    """Load blocked users from disk into memory and refresh the BLOCKED_SET."""
-    global blocked_users
-    with BLOCKED_LOCK:
-        blocked_users = read_json_or_default(BLOCKED_USERS_FILE, {})
-        _rebuild_blocked_set_from_dict(blocked_users)
-        return dict(blocked_users)
-
-def save_blocked_users(new_blocked):
-    """Persist blocked users and refresh the BLOCKED_SET."""
-    global blocked_users
-    with BLOCKED_LOCK:
-        blocked_users = dict(new_blocked)
-        atomic_write_json(BLOCKED_USERS_FILE, blocked_users)
-        _rebuild_blocked_set_from_dict(blocked_users)
+try:
+    import_legacy_transaction_cache()
+except Exception as e:
+    logging.error(f"Error importing legacy transaction cache: {e}")
 
 def cache_transaction(transaction):
-    """Stores transactions locally when internet is unavailable."""
-    txns = read_json_or_default(TRANSACTION_CACHE_FILE, [])
-    txns.append(transaction)
-    atomic_write_json(TRANSACTION_CACHE_FILE, txns)
+    """Stores transactions locally when internet is unavailable (O(1) append)."""
+    transaction_log.append(transaction)
 
-def update_daily_stats(status):
-    """Update daily statistics for access attempts."""
-    try:
-        today = datetime.now().strftime('%Y-%m-%d')
-        stats = read_json_or_default(DAILY_STATS_FILE, {})
-        
-        if today not in stats:
-            stats[today] = {
-                'date': today,
-                'valid_entries': 0,
-                'invalid_entries': 0,
-                'blocked_entries': 0
+def cache_transactions(transactions):
+    """Stores a group of transactions locally with a single fsync."""
+    transaction_log.append_many(transactions, sync=True)
+
+class BatchCommitStats:
+    """Commit size and latency counters for Firestore batch writes."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.commits = 0
+        self.failures = 0
+        self.documents = 0
+        self.last_size = 0
+        self.last_latency_ms = 0.0
+        self.max_latency_ms = 0.0
+        self._latency_total_ms = 0.0
+
+    def record(self, size, latency_ms, ok=True):
+        with self._lock:
+            self.last_size = size
+            self.last_latency_ms = latency_ms
+            if not ok:
+                self.failures += 1
+                return
+            self.commits += 1
+            self.documents += size
+            self._latency_total_ms += latency_ms
+            self.max_latency_ms = max(self.max_latency_ms, latency_ms)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "commits": self.commits,
+                "failures": self.failures,
+                "documents": self.documents,
+                "avg_commit_size": round(self.documents / self.commits, 1) if self.commits else 0,
+                "last_commit_size": self.last_size,
+                "last_latency_ms": round(self.last_latency_ms, 1),
+                "avg_latency_ms": round(self._latency_total_ms / self.commits, 1) if self.commits else 0,
+                "max_latency_ms": round(self.max_latency_ms, 1)
             }
-        
-        if status == 'Access Granted':
-            stats[today]['valid_entries'] += 1
-        elif status == 'Access Denied':
-            stats[today]['invalid_entries'] += 1
-        elif status == 'Blocked':
-            stats[today]['blocked_entries'] += 1
-        
-        atomic_write_json(DAILY_STATS_FILE, stats)
-        
-        # Clean up old stats (keep only 20 days)
-        cleanup_old_daily_stats()
-        
-    except Exception as e:
-        logging.error(f"Error updating daily stats: {e}")
 
-def cleanup_old_daily_stats():
-    """Remove daily statistics older than 20 days."""
+# Firestore WriteBatch holds at most 500 writes
+TXN_BATCH_MAX = min(int(os.environ.get("TXN_BATCH_MAX", "100")), 500)
+TXN_BATCH_LINGER_MS = int(os.environ.get("TXN_BATCH_LINGER_MS", "200"))
+transaction_batch_stats = BatchCommitStats()
+
+def transaction_doc_id(txn):
+    """Deterministic document id so a re-sent transaction overwrites instead of duplicating."""
+    return hashlib.sha1(json.dumps(txn, sort_keys=True, default=str).encode()).hexdigest()[:20]
+
+def commit_transaction_batch(txns, stats):
+    """Write txns with one Firestore WriteBatch commit; raises on failure."""
+    batch = db.batch()
+    collection = db.collection("transactions")
+    for txn in txns:
+        batch.set(collection.document(transaction_doc_id(txn)), txn)
+    started = time.monotonic()
     try:
-        stats = read_json_or_default(DAILY_STATS_FILE, {})
-        cutoff_date = datetime.now() - timedelta(days=20)
-        cutoff_str = cutoff_date.strftime('%Y-%m-%d')
-        
-        old_dates = [date for date in stats.keys() if date < cutoff_str]
-        for date in old_dates:
-            del stats[date]
-        
+        batch.commit()
+    except Exception:
+        stats.record(len(txns), (time.monotonic() - started) * 1000, ok=False)
+        raise
+    stats.record(len(txns), (time.monotonic() - started) * 1000)
+
+DAILY_STATS_RETENTION_DAYS = 20
+DAILY_STATS_FLUSH_INTERVAL = int(os.environ.get("DAILY_STATS_FLUSH_INTERVAL", "30"))
+
+class DailyStatsCounters:
+    """In-memory per-day access counters; flushed to DAILY_STATS_FILE on a timer and at shutdown."""
+    _FIELDS = {
+        'Access Granted': 'valid_entries',
+        'Access Denied': 'invalid_entries',
+        'Blocked': 'blocked_entries'
+    }
+
+    def __init__(self, path, retention_days=DAILY_STATS_RETENTION_DAYS):
+        self.path = path
+        self.retention_days = retention_days
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # orders file writes with clear()
+        self._stats = read_json_or_default(path, {})
+        self._today = None
+        self._dirty = False
+        self.flushes = 0
+        self.last_flush_at = None
+        with self._lock:
+            self._roll_locked(datetime.now().strftime('%Y-%m-%d'))
+
+    @staticmethod
+    def _empty(day):
+        return {'date': day, 'valid_entries': 0, 'invalid_entries': 0, 'blocked_entries': 0}
+
+    def _roll_locked(self, today):
+        """Day changed: prune entries past retention (only runs on rollover)."""
+        self._today = today
+        cutoff_str = (datetime.now() - timedelta(days=self.retention_days)).strftime('%Y-%m-%d')
+        old_dates = [d for d in self._stats if d < cutoff_str]
+        for d in old_dates:
+            del self._stats[d]
         if old_dates:
-            atomic_write_json(DAILY_STATS_FILE, stats)
+            self._dirty = True
             logging.info(f"Cleaned up {len(old_dates)} old daily statistics")
-            
+        return len(old_dates)
+
+    def record(self, status):
+        field = self._FIELDS.get(status)
+        if field is None:
+            return
+        today = datetime.now().strftime('%Y-%m-%d')
+        with self._lock:
+            if today != self._today:
+                self._roll_locked(today)
+            day = self._stats.get(today)
+            if day is None:
+                day = self._stats[today] = self._empty(today)
+            day[field] += 1
+            self._dirty = True
+
+    def roll_if_needed(self):
+        today = datetime.now().strftime('%Y-%m-%d')
+        with self._lock:
+            if today != self._today:
+                self._roll_locked(today)
+
+    def prune(self):
+        """Drop entries past retention now; returns how many were removed."""
+        with self._lock:
+            return self._roll_locked(datetime.now().strftime('%Y-%m-%d'))
+
+    def clear(self):
+        with self._flush_lock, self._lock:
+            self._stats = {}
+            self._dirty = False
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def last_days(self, days):
+        today = datetime.now()
+        with self._lock:
+            out = []
+            for i in range(days):
+                date_str = (today - timedelta(days=i)).strftime('%Y-%m-%d')
+                entry = self._stats.get(date_str)
+                out.append(dict(entry) if entry else self._empty(date_str))
+        # Sort by date (oldest first)
+        out.sort(key=lambda x: x['date'])
+        return out
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                if not self._dirty:
+                    return False
+                data = {d: dict(v) for d, v in self._stats.items()}
+                self._dirty = False
+            try:
+                atomic_write_json(self.path, data)
+            except Exception:
+                with self._lock:
+                    self._dirty = True
+                raise
+        self.flushes += 1
+        self.last_flush_at = int(time.time())
+        return True
+
+daily_stats = DailyStatsCounters(DAILY_STATS_FILE)
+
+def update_daily_stats(status):
+    """Update daily statistics for access attempts (in-memory counter bump)."""
+    try:
+        daily_stats.record(status)
     except Exception as e:
-        logging.error(f"Error cleaning up daily stats: {e}")
+        logging.error(f"Error updating daily stats: {e}")
 
 def get_daily_stats():
-    """Get daily statistics for the last 20 days."""
+    """Get daily statistics for the last 20 days from the live counters."""
     try:
-        stats = read_json_or_default(DAILY_STATS_FILE, {})
-        
-        # Generate last 20 days
-        today = datetime.now()
-        last_20_days = []
-        
-        for i in range(20):
-            date = today - timedelta(days=i)
-            date_str = date.strftime('%Y-%m-%d')
-            
-            if date_str in stats:
-                last_20_days.append(stats[date_str])
-            else:
-                last_20_days.append({
-                    'date': date_str,
-                    'valid_entries': 0,
-                    'invalid_entries': 0,
-                    'blocked_entries': 0
-                })
-        
-        # Sort by date (oldest first)
-        last_20_days.sort(key=lambda x: x['date'])
-        
-        return last_20_days
-        
+        return daily_stats.last_days(DAILY_STATS_RETENTION_DAYS)
     except Exception as e:
         logging.error(f"Error getting daily stats: {e}")
         return []
 
+# Offline backlog replay
+REPLAY_BATCH_SIZE = min(int(os.environ.get("REPLAY_BATCH_SIZE", "200")), 500)
+REPLAY_CONCURRENCY = max(int(os.environ.get("REPLAY_CONCURRENCY", "2")), 1)
+REPLAY_MAX_BACKOFF = float(os.environ.get("REPLAY_MAX_BACKOFF", "60"))
+REPLAY_MIN_BATCH_SIZE = 10
+REPLAY_MAX_TIMEOUTS = max(int(os.environ.get("REPLAY_MAX_TIMEOUTS", "3")), 1)  # consecutive, per pass
+
+class TransactionReplayer:
+    """
+    Drains the offline transaction log with up to `concurrency` WriteBatch commits in
+    flight. The log checkpoint advances after each committed batch (in log order).
+    DeadlineExceeded shrinks the batch and backs off exponentially with jitter;
+    successes grow the batch back and clear the backoff. A pass gives up after
+    REPLAY_MAX_TIMEOUTS consecutive timeouts or when connectivity drops; the
+    shrunken batch size and backoff carry over to the next pass.
+    """
+    def __init__(self, log, batch_size, concurrency, max_backoff):
+        self.log = log
+        self.max_batch_size = batch_size
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_backoff = max_backoff
+        self.backoff = 0.0
+        self.stats = BatchCommitStats()
+        self.running = False
+        self.last_run_at = None
+        self.last_rate = 0.0
+        self.replayed_total = 0
+        self.last_error = None
+        self._run_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    def _on_deadline(self):
+        self.batch_size = max(REPLAY_MIN_BATCH_SIZE, self.batch_size // 2)
+        base = min(self.max_backoff, max(1.0, self.backoff * 2))
+        self.backoff = base * random.uniform(0.5, 1.0)
+        logging.warning(f"Replay deadline exceeded; batch size {self.batch_size}, backing off {self.backoff:.1f}s")
+
+    def _on_success(self):
+        self.batch_size = min(self.max_batch_size, self.batch_size + max(REPLAY_MIN_BATCH_SIZE, self.batch_size // 4))
+        self.backoff = 0.0
+
+    def run(self):
+        """
+        Replay until the log is empty, a non-timeout error stops the pass, too many
+        consecutive timeouts occur, or the link goes down. Returns records replayed.
+        """
+        if not self._run_lock.acquire(blocking=False):
+            return 0  # another pass (sync loop or manual sync) is already running
+        self.running = True
+        replayed = 0
+        timeouts = 0
+        started = time.monotonic()
+        try:
+            while self.log.pending_count() > 0 and db is not None:
+                if not connectivity.is_online():
+                    logging.info("Replay paused: offline")
+                    break
+                if self.backoff:
+                    time.sleep(self.backoff)
+
+                wave = []
+                cursor = None
+                for _ in range(self.concurrency):
+                    recs, cursor = self.log.read_batch(self.batch_size, start=cursor)
+                    if not recs:
+                        break
+                    wave.append((recs, cursor))
+                if not wave:
+                    break
+
+                futures = [self._executor.submit(commit_transaction_batch, recs, self.stats) for recs, _ in wave]
+                committed = None
+                timed_out = failed = False
+                for (recs, batch_cursor), fut in zip(wave, futures):
+                    try:
+                        fut.result()
+                        if not failed:
+                            committed = batch_cursor
+                            replayed += len(recs)
+                    except google.api_core.exceptions.DeadlineExceeded:
+                        timed_out = failed = True
+                    except Exception as e:
+                        failed = True
+                        self.last_error = str(e)
+                        logging.error(f"Error replaying transaction batch: {e}")
+
+                # Only the in-order committed prefix advances the checkpoint; later batches
+                # that did succeed are re-sent next pass and overwrite the same documents.
+                if committed is not None:
+                    self.log.commit(committed)
+                if timed_out:
+                    self._on_deadline()
+                    timeouts += 1
+                    if timeouts >= REPLAY_MAX_TIMEOUTS:
+                        logging.warning(f"Replay pass stopped after {timeouts} consecutive timeouts; "
+                                        f"resuming next sync with batch size {self.batch_size}")
+                        break
+                elif failed:
+                    break
+                else:
+                    timeouts = 0
+                    self._on_success()
+        finally:
+            elapsed = time.monotonic() - started
+            self.replayed_total += replayed
+            self.last_rate = round(replayed / elapsed, 1) if elapsed > 0 else 0.0
+            self.last_run_at = int(time.time())
+            self.running = False
+            self._run_lock.release()
+        if replayed:
+            logging.info(f"Replayed {replayed} offline transactions ({self.last_rate}/s), "
+                         f"{self.log.pending_count()} remaining")
+        return replayed
+
+    def status(self):
+        return {
+            "running": self.running,
+            "batch_size": self.batch_size,
+            "concurrency": self.concurrency,
+            "backoff_seconds": round(self.backoff, 1),
+            "replayed_total": self.replayed_total,
+            "last_rate_per_second": self.last_rate,
+            "last_run_at": self.last_run_at,
+            "last_error": self.last_error,
+            "commits": self.stats.snapshot()
+        }
+
+transaction_replayer = TransactionReplayer(transaction_log, REPLAY_BATCH_SIZE, REPLAY_CONCURRENCY, REPLAY_MAX_BACKOFF)
+
 def sync_transactions():
     """Syncs offline transactions with Firebase when internet is restored."""
-    if not os.path.exists(TRANSACTION_CACHE_FILE):
+    if transaction_log.pending_count() == 0:
         return
     if not (is_internet_available() and db is not None):
         return
     try:
-        txns = read_json_or_default(TRANSACTION_CACHE_FILE, [])
-        if not txns:
-            return
-
-        batch_size = 10
-        idx = 0
-        synced = 0
-        failed_txns = []
-        
-        while idx < len(txns):
-            batch = txns[idx:idx + batch_size]
-            for txn in batch:
-                try:
-                    db.collection("transactions").add(txn)
-                    synced += 1
-                    logging.info(f"Successfully synced transaction: {txn.get('card_number', 'unknown')}")
-                except google.api_core.exceptions.DeadlineExceeded:
-                    logging.warning(f"Firestore transaction timeout during sync for card: {txn.get('card_number', 'unknown')}")
-                    failed_txns.append(txn)
-                except Exception as e:
-                    logging.error(f"Error syncing transaction {txn.get('card_number', 'unknown')}: {str(e)}")
-                    failed_txns.append(txn)
-            idx += batch_size
-            time.sleep(1)
-        
-        # Only remove the cache file if ALL transactions were synced successfully
-        if failed_txns:
-            # Update cache file with only failed transactions
-            atomic_write_json(TRANSACTION_CACHE_FILE, failed_txns)
-            logging.warning(f"Synced {synced} transactions, {len(failed_txns)} failed and kept in cache")
-        else:
-            # All transactions synced successfully, remove cache file
-            os.remove(TRANSACTION_CACHE_FILE)
-            logging.info(f"All {synced} offline transactions synced successfully")
-            
+        transaction_replayer.run()
     except Exception as e:
         logging.error(f"Error syncing transactions: {str(e)}")
 
@@ -493,17 +784,121 @@ def get_disk_usage():
         logging.error(f"Error getting disk usage: {e}")
         return None
 
+class StorageCounters:
+    """
+    Running byte/file totals for images and thumbnails, updated on capture,
+    thumbnail build and delete, so storage checks are O(1) instead of a disk walk.
+    reconcile_storage_counters() periodically corrects any drift.
+    """
+    CATEGORIES = ("images", "thumbnails")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bytes = {c: 0 for c in self.CATEGORIES}
+        self._files = {c: 0 for c in self.CATEGORIES}
+        self.last_reconcile_at = None
+        self.last_drift_bytes = 0
+
+    def add(self, category, nbytes, nfiles=1):
+        with self._lock:
+            self._bytes[category] += nbytes
+            self._files[category] += nfiles
+
+    def raw(self):
+        with self._lock:
+            return dict(self._bytes), dict(self._files)
+
+    def set(self, category, nbytes, nfiles):
+        with self._lock:
+            self._bytes[category] = nbytes
+            self._files[category] = nfiles
+
+    def reconcile(self, before, measured):
+        """
+        Replace counters with a disk measurement. `before` is raw() taken when the
+        walk started; changes counted during the walk are carried over.
+        """
+        bytes_before, files_before = before
+        drift = 0
+        with self._lock:
+            for c in self.CATEGORIES:
+                m_bytes, m_files = measured[c]
+                during_bytes = self._bytes[c] - bytes_before[c]
+                during_files = self._files[c] - files_before[c]
+                drift += m_bytes - bytes_before[c]
+                self._bytes[c] = m_bytes + during_bytes
+                self._files[c] = m_files + during_files
+            self.last_reconcile_at = int(time.time())
+            self.last_drift_bytes = drift
+        return drift
+
+    def total_bytes(self):
+        with self._lock:
+            return sum(self._bytes.values())
+
+    def snapshot(self):
+        with self._lock:
+            out = {c: {"bytes": self._bytes[c], "files": self._files[c]} for c in self.CATEGORIES}
+            out["total_bytes"] = sum(self._bytes.values())
+            out["last_reconcile_at"] = self.last_reconcile_at
+            out["last_drift_bytes"] = self.last_drift_bytes
+            return out
+
+storage_counters = StorageCounters()
+STORAGE_RECONCILE_INTERVAL = int(os.environ.get("STORAGE_RECONCILE_INTERVAL", "21600"))  # full disk walk (seconds)
+
 def get_storage_usage():
-    """Get current storage usage in bytes."""
-    if not os.path.exists(IMAGES_DIR):
-        return 0
-    
-    total_size = 0
-    for filename in os.listdir(IMAGES_DIR):
-        filepath = os.path.join(IMAGES_DIR, filename)
-        if os.path.isfile(filepath):
-            total_size += os.path.getsize(filepath)
-    return total_size
+    """Get current storage usage in bytes (images + thumbnails)."""
+    return storage_counters.total_bytes()
+
+def _measure_storage():
+    """Walk IMAGES_DIR and THUMBNAIL_DIR gently and return {category: (bytes, files)}."""
+    measured = {}
+    # Compare resolved paths: THUMBNAIL_DIR may be relative, symlinked or end in a slash
+    thumbs_real = os.path.realpath(THUMBNAIL_DIR)
+    for category, root_dir, skip in (("images", IMAGES_DIR, thumbs_real), ("thumbnails", THUMBNAIL_DIR, None)):
+        total_bytes = total_files = seen = 0
+        for root, dirs, files in os.walk(root_dir):
+            dirs[:] = [d for d in dirs if os.path.realpath(os.path.join(root, d)) != skip]
+            for name in files:
+                if not name.lower().endswith(('.jpg', '.jpeg')):
+                    continue
+                try:
+                    total_bytes += os.path.getsize(os.path.join(root, name))
+                    total_files += 1
+                except OSError:
+                    continue
+                seen += 1
+                if seen % 500 == 0:
+                    time.sleep(0.05)  # yield the SD card to captures
+        measured[category] = (total_bytes, total_files)
+    return measured
+
+def reconcile_storage_counters():
+    before = storage_counters.raw()
+    drift = storage_counters.reconcile(before, _measure_storage())
+    if drift:
+        logging.info(f"Storage counters reconciled (drift {drift} bytes)")
+    return drift
+
+def storage_reconcile_worker():
+    """Seed the counters from the catalog, then correct them with a slow disk walk periodically."""
+    try:
+        totals = image_catalog.totals()
+        storage_counters.set("images", totals["bytes"], totals["count"])
+    except Exception as e:
+        logging.error(f"Error seeding storage counters: {e}")
+    while True:
+        try:
+            reconcile_storage_counters()
+        except Exception as e:
+            logging.error(f"Error reconciling storage counters: {e}")
+        time.sleep(STORAGE_RECONCILE_INTERVAL)
+
+def _start_storage_workers():
+    """Index the image archive, then keep the storage counters reconciled (catalog first: counters seed from it)."""
+    load_image_catalog()
+    storage_reconcile_worker()
 
 def get_dynamic_storage_limits():
     """Calculate dynamic storage limits based on available free space."""
@@ -526,92 +921,92 @@ def get_dynamic_storage_limits():
     
     return max_storage_gb, cleanup_threshold_gb
 
-def cleanup_old_images():
-    """Automatically clean up old images when storage limit is reached."""
-    try:
-        current_usage = get_storage_usage()
-        
-        # Get dynamic storage limits based on available free space
-        max_storage_gb, cleanup_threshold_gb = get_dynamic_storage_limits()
-        max_bytes = max_storage_gb * 1024 * 1024 * 1024  # Convert GB to bytes
-        cleanup_bytes = cleanup_threshold_gb * 1024 * 1024 * 1024  # Convert GB to bytes
-        
-        if current_usage < max_bytes:
-            return
-        
-        logging.info(f"Storage limit reached ({current_usage / (1024**3):.2f}GB). Starting cleanup...")
-        
-        # Get all image files with their timestamps
-        image_files = []
-        for filename in os.listdir(IMAGES_DIR):
-            if filename.lower().endswith(('.jpg', '.jpeg')):
-                filepath = os.path.join(IMAGES_DIR, filename)
-                if os.path.isfile(filepath):
-                    # Extract timestamp from filename
-                    name_without_ext = os.path.splitext(filename)[0]
-                    parts = name_without_ext.split('_')
-                    
-                    if len(parts) >= 3:
-                        # New format: card_reader_timestamp
-                        try:
-                            timestamp = int(parts[2])
-                        except ValueError:
-                            timestamp = int(os.path.getmtime(filepath))
-                    elif len(parts) >= 2:
-                        # Old format: card_timestamp
-                        try:
-                            timestamp = int(parts[-1])
-                        except ValueError:
-                            timestamp = int(os.path.getmtime(filepath))
-                    else:
-                        timestamp = int(os.path.getmtime(filepath))
-                    
-                    file_size = os.path.getsize(filepath)
-                    image_files.append((filepath, filename, timestamp, file_size))
-        
-        # Sort by timestamp (oldest first)
-        image_files.sort(key=lambda x: x[2])
-        
-        # Delete oldest images until we've freed up enough space
-        deleted_size = 0
-        deleted_count = 0
-        
-        for filepath, filename, timestamp, file_size in image_files:
-            if deleted_size >= cleanup_bytes:
+# Eviction: start at the high watermark (the storage limit), stop at the low watermark
+# (limit minus the cleanup amount). Uploaded images go first; images still waiting
+# for upload are only evicted while usage stays above the high watermark.
+EVICT_PENDING_IMAGES = os.environ.get("EVICT_PENDING_IMAGES", "true").lower() == "true"
+EVICTION_BATCH = int(os.environ.get("EVICTION_BATCH", "100"))
+storage_wakeup = threading.Event()
+storage_high_watermark = None  # bytes; refreshed by enforce_storage_limits()
+eviction_stats = {"runs": 0, "last_run_at": None, "last_evicted_uploaded": 0, "last_evicted_pending": 0,
+                  "last_freed_bytes": 0, "total_evicted": 0}
+
+def get_storage_watermarks():
+    """(high, low) in bytes from the dynamic storage limits."""
+    max_storage_gb, cleanup_threshold_gb = get_dynamic_storage_limits()
+    high = int(max_storage_gb * 1024 ** 3)
+    low = max(0, high - int(cleanup_threshold_gb * 1024 ** 3))
+    return high, low
+
+def _evict_tier(uploaded, target_bytes):
+    """Delete the oldest images of one tier until usage <= target_bytes. Returns (count, bytes)."""
+    count = freed = 0
+    while get_storage_usage() > target_bytes:
+        batch = image_catalog.eviction_candidates(uploaded, EVICTION_BATCH)
+        if not batch:
+            break
+        for row in batch:
+            if get_storage_usage() <= target_bytes:
                 break
-                
+            filename = row["filename"]
             try:
-                os.remove(filepath)
-                # Also remove upload sidecar if exists
-                sidecar_path = filepath + ".uploaded.json"
-                if os.path.exists(sidecar_path):
-                    os.remove(sidecar_path)
-                
-                deleted_size += file_size
-                deleted_count += 1
-                logging.info(f"Deleted old image: {filename}")
-                
+                _remove_image(_catalog_path(row))
+                count += 1
+                freed += row["size"]
             except Exception as e:
                 logging.error(f"Error deleting {filename}: {e}")
-        
-        new_usage = get_storage_usage()
-        logging.info(f"Cleanup completed. Deleted {deleted_count} images ({deleted_size / (1024**3):.2f}GB). "
-                    f"New usage: {new_usage / (1024**3):.2f}GB")
+                image_catalog.remove(filename)
+    return count, freed
+
+def enforce_storage_limits():
+    """Evict images when usage crosses the high watermark; deletes only the k files needed."""
+    global storage_high_watermark
+    try:
+        high, low = get_storage_watermarks()
+        storage_high_watermark = high
+        current_usage = get_storage_usage()
+        if current_usage < high:
+            return None
+        
+        logging.info(f"Storage limit reached ({current_usage / (1024**3):.2f}GB). Evicting down to "
+                     f"{low / (1024**3):.2f}GB...")
+        
+        evicted_uploaded, freed_uploaded = _evict_tier(True, low)
+        evicted_pending, freed_pending = 0, 0
+        if EVICT_PENDING_IMAGES and get_storage_usage() >= high:
+            # Same hysteresis as the uploaded tier, or every new capture would trigger another eviction
+            logging.warning("Uploaded images exhausted; evicting oldest images not yet uploaded")
+            evicted_pending, freed_pending = _evict_tier(False, low)
+        
+        freed = freed_uploaded + freed_pending
+        eviction_stats.update({
+            "runs": eviction_stats["runs"] + 1,
+            "last_run_at": int(time.time()),
+            "last_evicted_uploaded": evicted_uploaded,
+            "last_evicted_pending": evicted_pending,
+            "last_freed_bytes": freed,
+            "total_evicted": eviction_stats["total_evicted"] + evicted_uploaded + evicted_pending
+        })
+        logging.info(f"Eviction completed. Deleted {evicted_uploaded} uploaded + {evicted_pending} pending images "
+                     f"({freed / (1024**3):.2f}GB). New usage: {get_storage_usage() / (1024**3):.2f}GB")
+        return dict(eviction_stats)
         
     except Exception as e:
         logging.error(f"Error during storage cleanup: {e}")
+        return None
 
 def storage_monitor_worker():
-    """Background worker to monitor storage usage."""
+    """Background worker to monitor storage usage (woken early when a capture crosses the high watermark)."""
     while True:
         try:
-            cleanup_old_images()
-            time.sleep(STORAGE_CHECK_INTERVAL)
+            enforce_storage_limits()
+            storage_wakeup.wait(STORAGE_CHECK_INTERVAL)
+            storage_wakeup.clear()
         except Exception as e:
             logging.error(f"Error in storage monitor worker: {e}")
             time.sleep(60)  # Wait 1 minute before retrying
 
-def _rtsp_capture_single(rtsp_url: str, filepath: str) -> bool:
+def _rtsp_capture_single(rtsp_url: str, filepath: str, camera_key: str, status: str = None) -> bool:
     """Open RTSP, grab one frame, save JPEG. Retries using MAX_RETRIES/RETRY_DELAY."""
     retries = 0
     while retries < MAX_RETRIES:
@@ -629,10 +1024,9 @@ def _rtsp_capture_single(rtsp_url: str, filepath: str) -> bool:
                 retries += 1
                 time.sleep(RETRY_DELAY)
                 continue
-            ok = cv2.imwrite(filepath, frame)
-            if ok:
+            data = image_encoder.encode(camera_key, frame)
+            if data and _save_encoded_image(filepath, data, status):
                 return True
-            logging.error(f"Failed to save image to {filepath}")
             retries += 1
             time.sleep(RETRY_DELAY)
         except Exception as e:
@@ -654,6 +1048,7 @@ def _mark_uploaded(filepath: str, location: str):
             json.dump(meta, f, indent=2)
     except Exception as e:
         logging.error(f"Failed to write upload sidecar for {filepath}: {e}")
+    image_catalog.mark_uploaded(os.path.basename(filepath), location, meta["uploaded_at"])
 
 def _has_uploaded_sidecar(filepath: str) -> bool:
     return os.path.exists(filepath + ".uploaded.json")
@@ -662,14 +1057,149 @@ def _has_uploaded_sidecar(filepath: str) -> bool:
 CAMERA_WORKERS = int(os.environ.get("CAMERA_WORKERS", "2"))
 camera_executor = ThreadPoolExecutor(max_workers=CAMERA_WORKERS)
 
-def capture_for_reader_async(reader_id: int, card_int: int):
+# Per-camera JPEG profiles; images are encoded once and the same bytes are written and uploaded
+image_encoder = ImageEncoder({key: EncodeProfile(**p) for key, p in ENCODE_PROFILES.items()},
+                             ring_quality=FRAME_RING_QUALITY)
+encoded_images = EncodedImageCache(ENCODED_CACHE_MAX_BYTES)
+thumbnails = ThumbnailCache(THUMBNAIL_DIR, max_size=THUMBNAIL_SIZE, quality=THUMBNAIL_QUALITY,
+                            workers=THUMBNAIL_WORKERS,
+                            on_change=lambda nbytes, nfiles: storage_counters.add("thumbnails", nbytes, nfiles))
+image_catalog = ImageCatalog(IMAGE_CATALOG_FILE)
+
+# Long-lived RTSP streams; captures take the latest decoded frame instead of reconnecting
+frame_grabbers = FrameGrabberPool(RTSP_CAMERAS, reconnect_max=GRABBER_RECONNECT_MAX, encoder=image_encoder,
+                                  ring_seconds=FRAME_RING_SECONDS, ring_max_bytes=FRAME_RING_MAX_BYTES,
+                                  ring_fps=FRAME_RING_FPS)
+if FRAME_RING_SECONDS > 0 and FRAME_RING_MAX_BYTES < FRAME_RING_SECONDS * FRAME_RING_FPS * FRAME_RING_FRAME_BYTES:
+    logging.warning(f"FRAME_RING_MAX_BYTES={FRAME_RING_MAX_BYTES} holds about "
+                    f"{FRAME_RING_MAX_BYTES / (FRAME_RING_FPS * FRAME_RING_FRAME_BYTES):.1f}s of frames at "
+                    f"{FRAME_RING_FRAME_BYTES} bytes each, less than FRAME_RING_SECONDS={FRAME_RING_SECONDS}")
+
+def _save_encoded_image(filepath: str, data: bytes, status: str = None) -> bool:
+    """Write encoded JPEG bytes once and keep them for the uploader. `status` is the CAPTURE_STATUS of the scan."""
+    try:
+        with open(filepath, "wb") as f:
+            f.write(data)
+    except Exception as e:
+        logging.error(f"Failed to save image to {filepath}: {e}")
+        return False
+    encoded_images.put(filepath, data)
+    storage_counters.add("images", len(data))
+    if storage_high_watermark is not None and storage_counters.total_bytes() >= storage_high_watermark:
+        storage_wakeup.set()
+    image_catalog.add(os.path.basename(filepath), os.path.relpath(filepath, IMAGES_DIR), len(data),
+                      fallback_ts=int(time.time()), status=status)
+    if THUMBNAIL_ON_CAPTURE:
+        thumbnails.submit(os.path.basename(filepath), filepath, data)
+    return True
+
+def _remove_image(filepath: str) -> bool:
+    """Delete an image with its upload sidecar, thumbnail, cached bytes and retry state. Returns True if the image existed."""
+    removed = False
+    if os.path.exists(filepath):
+        size = os.path.getsize(filepath)
+        os.remove(filepath)
+        storage_counters.add("images", -size, -1)
+        removed = True
+    sidecar_path = filepath + ".uploaded.json"
+    if os.path.exists(sidecar_path):
+        os.remove(sidecar_path)
+    thumbnails.invalidate(os.path.basename(filepath))
+    encoded_images.discard(filepath)
+    upload_retries.discard(filepath)
+    image_catalog.remove(os.path.basename(filepath))
+    _prune_empty_dirs(os.path.dirname(filepath))
+    return removed
+
+def _prune_empty_dirs(path):
+    """
+    Remove now-empty day/month/year directories above a deleted image. Today's (and,
+    around midnight, yesterday's) day directory is kept: a capture may have just
+    created it in _new_image_path and not written its file yet.
+    """
+    images_root = os.path.abspath(IMAGES_DIR)
+    path = os.path.abspath(path)
+    now = time.time()
+    live_days = {os.path.join(images_root, time.strftime("%Y/%m/%d", time.localtime(ts))) for ts in (now, now - 86400)}
+    while path.startswith(images_root + os.sep):
+        if any(path == day or path.startswith(day + os.sep) for day in live_days):
+            break
+        try:
+            os.rmdir(path)
+        except OSError:
+            break
+        path = os.path.dirname(path)
+
+def _catalog_path(row) -> str:
+    return os.path.join(IMAGES_DIR, row["path"])
+
+def _new_image_path(filename: str) -> str:
+    """Day-sharded location for a new capture (directory created on demand)."""
+    filepath = os.path.join(IMAGES_DIR, image_relpath(filename, IMAGE_SHARD_BY_READER))
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    return filepath
+
+def _resolve_image_path(filename: str):
+    """Full path of an image by name: catalog lookup first, then the layout rules. None if missing."""
+    row = image_catalog.get(filename)
+    if row is not None:
+        filepath = _catalog_path(row)
+        if os.path.isfile(filepath):
+            return filepath
+    return resolve_image(IMAGES_DIR, filename, IMAGE_SHARD_BY_READER)
+
+def rebuild_image_catalog():
+    """Re-index IMAGES_DIR from disk (image files plus upload sidecars)."""
+    return image_catalog.rebuild(IMAGES_DIR, skip_dirs=[THUMBNAIL_DIR])
+
+def load_image_catalog():
+    """First start with an empty catalog: index whatever is already on disk."""
+    try:
+        if image_catalog.totals()["count"] == 0:
+            rebuild_image_catalog()
+    except Exception as e:
+        logging.error(f"Error loading image catalog: {e}")
+
+def _save_ring_frames(grabber, scan_at: float, safe: str, reader_id: int, ts: int, filepath: str,
+                      status: str = None) -> bool:
+    """
+    Save the ring frame nearest the scan as `filepath`, plus CAPTURE_FRAMES_BEFORE/AFTER
+    neighbours as CARD_rN_TS_bK / _aK. Returns False if no frame is close enough.
+    """
+    frames = grabber.frames_around(scan_at, CAPTURE_FRAMES_BEFORE, CAPTURE_FRAMES_AFTER,
+                                   timeout=max(FRAME_MAX_AGE, grabber.ring_interval * (CAPTURE_FRAMES_AFTER + 2)))
+    if not frames:
+        return False
+    nearest = min(range(len(frames)), key=lambda i: abs(frames[i][0] - scan_at))
+    captured_at, data = frames[nearest]
+    if abs(captured_at - scan_at) > FRAME_MAX_AGE:
+        return False
+    if not _save_encoded_image(filepath, data, status):
+        return False
+    logging.info(f"[CAPTURE] r{reader_id}: frame offset {(captured_at - scan_at) * 1000:+.0f} ms from scan")
+    for i, (_, extra) in enumerate(frames):
+        if i == nearest:
+            continue
+        tag = f"b{nearest - i}" if i < nearest else f"a{i - nearest}"
+        extra_path = _new_image_path(f"{safe}_r{reader_id}_{ts}_{tag}.jpg")
+        if _save_encoded_image(extra_path, extra, status):
+            # Neighbour frames are supplementary: upload them with the backlog, not as live
+            image_queue.put(extra_path, backlog_priority(status), ts)
+    return True
+
+# Scan outcome -> catalog status, which orders the upload backlog
+CAPTURE_STATUS = {"Access Granted": "granted", "Access Denied": "denied", "Blocked": "blocked"}
+
+def capture_for_reader_async(reader_id: int, card_int: int, scan_at: float = None, status: str = None):
     """
     Non-blocking: pick camera based on reader, save image as CARD_TIMESTAMP.jpg
     Later upload happens from a background worker that scans the images directory.
+    `scan_at` is the wall-clock time of the card read; the buffered frame nearest it is saved.
+    `status` is the scan's CAPTURE_STATUS value.
     """
     try:
         # Check if camera is enabled for this reader
-        camera_enabled_key = "camera_1_enabled" if reader_id == 1 else "camera_2_enabled"
+        camera_enabled_key = "CAMERA_1_ENABLED" if reader_id == 1 else "CAMERA_2_ENABLED"
         camera_enabled = os.getenv(camera_enabled_key, "true").lower() == "true"
         
         if not camera_enabled:
@@ -678,9 +1208,11 @@ def capture_for_reader_async(reader_id: int, card_int: int):
 
         card_str = str(card_int)
         safe = _sanitize_card_number(card_str)
-        ts = int(time.time())
+        if scan_at is None:
+            scan_at = time.time()
+        ts = int(scan_at)
         filename = f"{safe}_r{reader_id}_{ts}.jpg"  # format: card_reader_timestamp
-        filepath = os.path.join(IMAGES_DIR, filename)
+        filepath = _new_image_path(filename)
 
         camera_key = "camera_1" if reader_id == 1 else "camera_2"
         rtsp_url = RTSP_CAMERAS.get(camera_key)  # from your config.py  :contentReference[oaicite:5]{index=5}
@@ -688,26 +1220,85 @@ def capture_for_reader_async(reader_id: int, card_int: int):
             logging.error(f"No RTSP URL configured for {camera_key}")
             return
 
-        ok = _rtsp_capture_single(rtsp_url, filepath)
+        grabber = frame_grabbers.get(camera_key)
+        ok = grabber is not None and _save_ring_frames(grabber, scan_at, safe, reader_id, ts, filepath, status)
+        if not ok:
+            frame, _ = grabber.latest(max_age=FRAME_MAX_AGE) if grabber else (None, None)
+            if frame is not None:
+                data = image_encoder.encode(camera_key, frame)
+                ok = bool(data) and _save_encoded_image(filepath, data, status)
+            else:
+                # Stream not warm (or disabled at boot): fall back to a one-shot RTSP capture
+                ok = _rtsp_capture_single(rtsp_url, filepath, camera_key, status)
         if ok:
             logging.info(f"[CAPTURE] {camera_key}: saved {filepath}")
             # Do NOT upload here; queue or let the sync loop find it later.
-            # Optionally enqueue now to speed up online uploads:
-            image_queue.put(filepath)
+            # Optionally enqueue now to speed up online uploads (ahead of any backlog):
+            image_queue.put(filepath, PRIORITY_LIVE, ts)
         else:
             logging.error(f"[CAPTURE] {camera_key}: failed to capture image for card {card_str}")
     except Exception as e:
         logging.error(f"capture_for_reader_async error: {e}")
 
+# =========================
+# Scan event ring (pigpio callback -> decision worker)
+# =========================
+class ScanEventRing:
+    """
+    Preallocated ring of (reader, bits, value, tick) slots.
+    pigpio runs callbacks for both readers on one thread, so there is a single
+    producer; push() only stores four ints and never does I/O.
+    """
+    def __init__(self, capacity=64):
+        self.capacity = capacity
+        self._reader = [0] * capacity
+        self._bits = [0] * capacity
+        self._value = [0] * capacity
+        self._tick = [0] * capacity
+        self._head = 0  # next slot to write
+        self._tail = 0  # next slot to read
+        self._cond = threading.Condition(threading.Lock())
+        self.dropped = 0
+
+    def push(self, reader, bits, value, tick):
+        with self._cond:
+            if self._head - self._tail >= self.capacity:
+                self.dropped += 1
+                return False
+            i = self._head % self.capacity
+            self._reader[i] = reader
+            self._bits[i] = bits
+            self._value[i] = value
+            self._tick[i] = tick
+            self._head += 1
+            self._cond.notify()
+            return True
+
+    def pop(self, timeout=None):
+        """Block until an event is available; returns (reader, bits, value, tick) or None on timeout."""
+        with self._cond:
+            if self._head == self._tail and not self._cond.wait(timeout):
+                return None
+            i = self._tail % self.capacity
+            event = (self._reader[i], self._bits[i], self._value[i], self._tick[i])
+            self._tail += 1
+            return event
+
+    def depth(self):
+        return self._head - self._tail
+
+scan_ring = ScanEventRing(capacity=int(os.environ.get("SCAN_RING_CAPACITY", "64")))
+
 # =========================
 # Wiegand Decoder
 # =========================
 class WiegandDecoder:
-    def __init__(self, pi, d0, d1, callback, timeout_ms=25):
+    def __init__(self, pi, d0, d1, reader_id, ring, timeout_ms=25):
         self.pi = pi
         self.d0 = d0
         self.d1 = d1
-        self.callback = callback
+        self.reader_id = reader_id
+        self.ring = ring
         self.timeout_ms = timeout_ms
 
         self.value = 0
@@ -738,7 +1329,9 @@ class WiegandDecoder:
         self.last_tick = tick
 
         if self.bits == 26:
-            self.callback(self.bits, self.value)
+            # Only hand off raw data; decisions happen on access_decision_worker
+            if not self.ring.push(self.reader_id, self.bits, self.value, tick):
+                logging.error(f"Scan ring full, dropped read from reader {self.reader_id}")
             self.value = 0
             self.bits = 0
 
@@ -887,25 +1480,136 @@ def system_status():
                 "gpio": True,
                 "internet": is_internet_available()
             },
+            "connectivity": connectivity.status(),
             "files": {
                 "users_file": os.path.exists(USER_DATA_FILE),
                 "blocked_users_file": os.path.exists(BLOCKED_USERS_FILE),
-                "transaction_cache": os.path.exists(TRANSACTION_CACHE_FILE)
+                "transaction_cache": transaction_log.pending_count() > 0
             }
         }
-        if status["files"]["transaction_cache"]:
-            try:
-                cached_transactions = read_json_or_default(TRANSACTION_CACHE_FILE, [])
-                status["cached_transactions_count"] = len(cached_transactions)
-            except Exception:
-                status["cached_transactions_count"] = 0
-        else:
-            status["cached_transactions_count"] = 0
+        snapshot = access_store.snapshot
+        status["access_snapshot"] = {
+            "version": snapshot.version,
+            "epoch": ACCESS_EPOCH,
+            "allowed_count": snapshot.allowed_count,
+            "blocked_count": snapshot.blocked_count,
+            "journal_entries": access_journal.count
+        }
+        status["cached_transactions_count"] = transaction_log.pending_count()
 
         return jsonify(status)
     except Exception as e:
         return jsonify({"system": "error", "error": str(e), "timestamp": datetime.now().isoformat()}), 500
 
+@app.route("/camera_stats")
+def camera_stats():
+    """Per-camera grabber FPS, reconnect counts and latest frame age."""
+    try:
+        return jsonify({
+            "status": "success",
+            "cameras": frame_grabbers.stats(),
+            "encode": image_encoder.stats(),
+            "encoded_cache": encoded_images.stats(),
+            "thumbnails": thumbnails.stats()
+        })
+    except Exception as e:
+        logging.error(f"Error getting camera stats: {e}")
+        return jsonify({"status": "error", "message": f"Error getting camera stats: {str(e)}"}), 500
+
+def upload_drain_estimate():
+    """Backlog size and time to drain it at the observed upload rate (or the bandwidth cap if idle)."""
+    totals = image_catalog.totals()
+    pending_images = totals["pending"] - totals["dead"]
+    rate = image_uploader.throughput.bytes_per_sec() or upload_bandwidth.rate
+    if not pending_images:
+        eta = 0
+    elif rate:
+        eta = round(totals["pending_bytes"] / rate)
+    else:
+        eta = None  # nothing uploaded recently and no cap to estimate from
+    return {
+        "pending_images": pending_images,
+        "pending_bytes": totals["pending_bytes"],
+        "rate_bytes_per_sec": round(rate, 1) if rate else None,
+        "eta_seconds": eta
+    }
+
+@app.route("/upload_status")
+def upload_status():
+    """Image upload pipeline: worker count, throughput and queue depth."""
+    try:
+        return jsonify({
+            "status": "success",
+            "workers": max(1, UPLOAD_WORKERS),
+            "max_per_host": image_uploader.max_per_host,
+            "queue": image_queue.stats(),
+            "throughput": image_uploader.throughput.snapshot(),
+            "retries": upload_retries.stats(),
+            "bandwidth": upload_bandwidth.stats(),
+            "drain": upload_drain_estimate()
+        })
+    except Exception as e:
+        logging.error(f"Error getting upload status: {e}")
+        return jsonify({"status": "error", "message": f"Error getting upload status: {str(e)}"}), 500
+
+@app.route("/upload_dead_letters", methods=["GET"])
+def upload_dead_letters():
+    """Images that ran out of upload retries, plus those currently waiting for a retry."""
+    try:
+        limit = max(1, min(int(request.args.get("limit", IMAGE_PAGE_DEFAULT)), IMAGE_PAGE_MAX))
+        dead = []
+        for row in image_catalog.dead_letters(limit):
+            item = _image_json(row)
+            item["dead_at"] = row["dead_at"]
+            item["last_error"] = row["last_error"]
+            dead.append(item)
+        return jsonify({
+            "status": "success",
+            "dead_letters": dead,
+            "dead_total": image_catalog.totals()["dead"],
+            "retrying": upload_retries.waiting(limit)
+        })
+    except ValueError as e:
+        return jsonify({"status": "error", "message": f"Invalid parameter: {str(e)}"}), 400
+    except Exception as e:
+        logging.error(f"Error listing dead-lettered uploads: {e}")
+        return jsonify({"status": "error", "message": f"Error listing dead-lettered uploads: {str(e)}"}), 500
+
+@app.route("/requeue_dead_letters", methods=["POST"])
+@require_api_key
+def requeue_dead_letters():
+    """Give dead-lettered images a fresh retry budget. Body: {"filenames": [...]} (omit for all)."""
+    try:
+        data = request.get_json(silent=True) or {}
+        filenames = data.get("filenames")
+        if filenames is not None and not isinstance(filenames, list):
+            return jsonify({"status": "error", "message": "filenames must be a list"}), 400
+        rows = image_catalog.requeue_dead(filenames)
+        for row in rows:
+            _queue_backlog_image(row)
+        logging.info(f"[UPLOAD] Requeued {len(rows)} dead-lettered images")
+        return jsonify({"status": "success", "requeued": len(rows)})
+    except Exception as e:
+        logging.error(f"Error requeueing dead-lettered uploads: {e}")
+        return jsonify({"status": "error", "message": f"Error requeueing dead-lettered uploads: {str(e)}"}), 500
+
+@app.route("/access_latency")
+def access_latency():
+    """Callback-to-relay latency per reader, relay actuator state/jitter, plus scan ring health."""
+    try:
+        return jsonify({
+            "status": "success",
+            "latency": relay_latency.snapshot(),
+            "relays": relay_actuator.stats(),
+            "ring_depth": scan_ring.depth(),
+            "ring_capacity": scan_ring.capacity,
+            "ring_dropped": scan_ring.dropped,
+            "followup_backlog": access_followup_queue.qsize()
+        })
+    except Exception as e:
+        logging.error(f"Error getting access latency: {e}")
+        return jsonify({"status": "error", "message": f"Error getting access latency: {str(e)}"}), 500
+
 # --- Users ---
 @app.route("/add_user", methods=["GET"])
 @require_api_key
@@ -927,9 +1631,7 @@ def add_user():
             "card_number": card_number
         }
 
-        curr = load_local_users()
-        curr[card_number] = user_data
-        save_local_users(curr)  # updates dict + ALLOWED_SET
+        mutate_access("add_user", card_number, user_data)  # journal + O(1) snapshot update
 
         logging.info(f"User added locally: {name} (Card: {card_number})")
         return jsonify({"status": "success", "message": "User added successfully."})
@@ -944,11 +1646,10 @@ def delete_user():
         if not card_number:
             return jsonify({"status": "error", "message": "Missing card_number"}), 400
 
-        curr = load_local_users()
-        if card_number in curr:
-            user_name = curr[card_number].get("name", "Unknown")
-            del curr[card_number]
-            save_local_users(curr)  # updates dict + ALLOWED_SET
+        existing = access_store.get_user(card_number)
+        if existing is not None:
+            user_name = existing.get("name", "Unknown")
+            mutate_access("delete_user", card_number)  # journal + O(1) snapshot update
             logging.info(f"User deleted locally: {user_name} (Card: {card_number})")
             return jsonify({"status": "success", "message": "User deleted successfully."})
         else:
@@ -1010,19 +1711,23 @@ def get_transactions():
 
             for doc in docs:
                 tx = doc.to_dict() or {}
-                transactions.append({
+                item = {
                     "card_number": tx.get("card_number", "N/A"),
                     "name": tx.get("name", "Unknown"),
                     "status": tx.get("status", "Unknown"),
                     "timestamp": _ts_to_epoch(tx.get("timestamp", None)),
                     "reader": tx.get("reader", "Unknown")
-                })
+                }
+                for key in ("snapshot_version", "snapshot_epoch"):
+                    if key in tx:  # older transactions predate these fields
+                        item[key] = tx[key]
+                transactions.append(item)
 
             if transactions:
                 return jsonify(transactions)
 
         # Offline (or no DB): serve cached if available
-        cached = read_json_or_default(TRANSACTION_CACHE_FILE, [])
+        cached = transaction_log.tail(10)
         if cached:
             return jsonify(cached[-10:])
         return jsonify([{"message": "No recent transactions"}])
@@ -1030,94 +1735,70 @@ def get_transactions():
         return jsonify({"status": "error", "message": f"Error fetching transactions: {str(e)}"}), 500
 
 # --- Image Management ---
+IMAGE_PAGE_DEFAULT = 100
+IMAGE_PAGE_MAX = int(os.environ.get("IMAGE_PAGE_MAX", "500"))
+
+def _image_json(row):
+    return {
+        "filename": row["filename"],
+        "card_number": row["card"],
+        "timestamp": row["timestamp"],
+        "reader": row["reader"],
+        "uploaded": bool(row["uploaded"]),
+        "s3_location": row["s3_location"],
+        "file_size": row["size"]
+    }
+
+def _image_page_from_request():
+    """
+    Run one catalog page query from query-string args:
+    limit, cursor, card (prefix), reader, since/until (epoch seconds),
+    uploaded (true/false or uploaded/pending), order (newest/oldest).
+    Raises ValueError on bad arguments. Returns (images, next_cursor_token, limit).
+    """
+    args = request.args
+    limit = max(1, min(int(args.get("limit", IMAGE_PAGE_DEFAULT)), IMAGE_PAGE_MAX))
+    cursor = decode_cursor(args["cursor"]) if args.get("cursor") else None
+    reader = int(args["reader"]) if args.get("reader") else None
+    since = int(args["since"]) if args.get("since") else None
+    until = int(args["until"]) if args.get("until") else None
+    uploaded = None
+    if args.get("uploaded"):
+        value = args["uploaded"].lower()
+        if value in ("true", "1", "uploaded"):
+            uploaded = True
+        elif value in ("false", "0", "pending", "failed"):
+            uploaded = False
+        else:
+            raise ValueError("uploaded must be true/false")
+    order = args.get("order", "newest").lower()
+    if order not in ("newest", "oldest"):
+        raise ValueError("order must be newest or oldest")
+    rows, next_cursor = image_catalog.page(limit, cursor, newest_first=(order == "newest"),
+                                           card=args.get("card") or None, reader=reader,
+                                           since=since, until=until, uploaded=uploaded)
+    token = encode_cursor(next_cursor) if next_cursor else None
+    return [_image_json(r) for r in rows], token, limit
+
 @app.route("/get_images", methods=["GET"])
 def get_images():
-    """Get list of captured images with upload status (limited to 100 for display)."""
+    """Get one page of captured images with upload status (newest first, 100 per page by default)."""
     try:
-        images = []
-        uploaded_count = 0
-        pending_count = 0
-        failed_count = 0
-        
-        if not os.path.exists(IMAGES_DIR):
-            return jsonify({
-                "images": [],
-                "total": 0,
-                "uploaded": 0,
-                "pending": 0,
-                "failed": 0
-            })
-        
-        # Get all image files
-        image_files = []
-        for filename in os.listdir(IMAGES_DIR):
-            if filename.lower().endswith('.jpg') or filename.lower().endswith('.jpeg'):
-                filepath = os.path.join(IMAGES_DIR, filename)
-                if os.path.isfile(filepath):
-                    image_files.append((filename, filepath))
-        
-        # Sort by modification time (newest first)
-        image_files.sort(key=lambda x: os.path.getmtime(x[1]), reverse=True)
-        
-        # Limit to 100 for display
-        display_limit = 100
-        display_files = image_files[:display_limit]
-        
-        for filename, filepath in display_files:
-            # Extract card number and timestamp from filename
-            # Format: CARD_TIMESTAMP.jpg
-            try:
-                name_without_ext = os.path.splitext(filename)[0]
-                parts = name_without_ext.split('_')
-                if len(parts) >= 2:
-                    card_number = parts[0]
-                    timestamp = int(parts[-1])  # Last part should be timestamp
-                else:
-                    card_number = "unknown"
-                    timestamp = int(os.path.getmtime(filepath))
-            except (ValueError, IndexError):
-                card_number = "unknown"
-                timestamp = int(os.path.getmtime(filepath))
-            
-            # Check upload status
-            uploaded_sidecar = filepath + ".uploaded.json"
-            uploaded = None
-            s3_location = None
-            
-            if os.path.exists(uploaded_sidecar):
-                try:
-                    with open(uploaded_sidecar, 'r') as f:
-                        upload_data = json.load(f)
-                        uploaded = True
-                        s3_location = upload_data.get('s3_location', '')
-                        uploaded_count += 1
-                except Exception as e:
-                    logging.error(f"Error reading upload sidecar for {filename}: {e}")
-                    uploaded = False
-                    failed_count += 1
-            else:
-                uploaded = False
-                pending_count += 1
-            
-            images.append({
-                "filename": filename,
-                "card_number": card_number,
-                "timestamp": timestamp,
-                "uploaded": uploaded,
-                "s3_location": s3_location,
-                "file_size": os.path.getsize(filepath)
-            })
+        try:
+            images, next_cursor, limit = _image_page_from_request()
+        except ValueError as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
         
-        # Count total images (not just displayed ones)
-        total_images = len(image_files)
+        totals = image_catalog.totals()
         
         return jsonify({
             "images": images,
-            "total": total_images,
-            "uploaded": uploaded_count,
-            "pending": pending_count,
-            "failed": failed_count,
-            "display_limit": display_limit
+            "next_cursor": next_cursor,
+            "total": totals["count"],
+            "uploaded": totals["uploaded"],
+            "pending": totals["pending"],
+            "failed": 0,
+            "display_limit": limit
         })
         
     except Exception as e:
@@ -1138,20 +1819,76 @@ def serve_image(filename):
             logging.warning(f"Invalid filename with path traversal: {filename}")
             return "Invalid filename", 400
         
-        filepath = os.path.join(IMAGES_DIR, filename)
-        logging.info(f"Serving image: {filename} from {filepath}")
+        filepath = _resolve_image_path(filename)
+        logging.debug(f"Serving image: {filename} from {filepath}")
         
-        if not os.path.exists(filepath):
-            logging.warning(f"Image not found: {filepath}")
+        if filepath is None:
+            logging.warning(f"Image not found: {filename}")
             return "Image not found", 404
         
-        from flask import send_file
-        return send_file(filepath, mimetype='image/jpeg')
+        return _send_cached_image(filepath, filepath)
         
     except Exception as e:
         logging.error(f"Error serving image {filename}: {e}")
         return "Error serving image", 500
 
+def _send_cached_image(path, source_path, etag_suffix=""):
+    """
+    Send a JPEG with a strong ETag and Last-Modified taken from the source image,
+    answering 304 when the browser already has it. Captured images never change
+    in place, so they can be cached for IMAGE_CACHE_MAX_AGE.
+    """
+    st = os.stat(source_path)
+    etag = f"{st.st_mtime_ns:x}-{st.st_size:x}{etag_suffix}"
+    last_modified = int(st.st_mtime)
+    
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        ims = request.if_modified_since
+        not_modified = ims is not None and last_modified <= calendar.timegm(ims.utctimetuple())
+    
+    if not_modified:
+        resp = Response(status=304)
+    else:
+        with open(path, "rb") as f:
+            resp = Response(f.read(), mimetype="image/jpeg")
+    resp.set_etag(etag)
+    resp.last_modified = last_modified
+    resp.cache_control.public = True
+    resp.cache_control.max_age = IMAGE_CACHE_MAX_AGE
+    return resp
+
+@app.route("/thumbnail/<filename>")
+def serve_thumbnail(filename):
+    """Serve a cached gallery thumbnail, building it on first request."""
+    try:
+        if not (filename.lower().endswith('.jpg') or filename.lower().endswith('.jpeg')):
+            return "Invalid file type", 400
+        
+        if '..' in filename or '/' in filename or '\\' in filename:
+            logging.warning(f"Invalid filename with path traversal: {filename}")
+            return "Invalid filename", 400
+        
+        filepath = _resolve_image_path(filename)
+        if filepath is None:
+            return "Image not found", 404
+        
+        try:
+            thumb_path = thumbnails.get(filename, filepath)
+        except FutureTimeoutError:
+            # Thumbnail workers are backed up; the build keeps going for the next request
+            logging.warning(f"Thumbnail for {filename} not ready in time; serving the full image")
+            thumb_path = None
+        if thumb_path is None:
+            # Unreadable/partial source or slow build: fall back to the full image
+            return _send_cached_image(filepath, filepath)
+        return _send_cached_image(thumb_path, filepath, etag_suffix=f"-t{THUMBNAIL_SIZE}")
+        
+    except Exception as e:
+        logging.error(f"Error serving thumbnail {filename}: {e}")
+        return "Error serving thumbnail", 500
+
 @app.route("/static/<filename>")
 def serve_static(filename):
     """Serve static files from templates directory (for company images)."""
@@ -1192,17 +1929,13 @@ def delete_image(filename):
         if '..' in filename or '/' in filename or '\\' in filename:
             return jsonify({"status": "error", "message": "Invalid filename"}), 400
         
-        filepath = os.path.join(IMAGES_DIR, filename)
-        sidecar_path = filepath + ".uploaded.json"
+        filepath = _resolve_image_path(filename) or os.path.join(IMAGES_DIR, filename)
+        had_sidecar = os.path.exists(filepath + ".uploaded.json")
         
         deleted_files = []
-        
-        if os.path.exists(filepath):
-            os.remove(filepath)
+        if _remove_image(filepath):
             deleted_files.append(filename)
-        
-        if os.path.exists(sidecar_path):
-            os.remove(sidecar_path)
+        if had_sidecar:
             deleted_files.append(filename + ".uploaded.json")
         
         if deleted_files:
@@ -1263,7 +1996,8 @@ def get_config():
             "bind_ip": os.getenv("BIND_IP", "192.168.1.33"),
             "bind_port": int(os.getenv("BIND_PORT", "9000")),
             "api_key": os.getenv("API_KEY", "your-api-key-change-this"),
-            "scan_delay_seconds": int(os.getenv("SCAN_DELAY_SECONDS", "60"))
+            "scan_delay_seconds": int(os.getenv("SCAN_DELAY_SECONDS", "60")),
+            "upload_bandwidth_kbps": upload_bandwidth.rate * 8 / 1000
         }
         
         return jsonify(config)
@@ -1309,7 +2043,8 @@ def update_config():
             "bind_ip": "BIND_IP",
             "bind_port": "BIND_PORT",
             "api_key": "API_KEY",
-            "scan_delay_seconds": "SCAN_DELAY_SECONDS"
+            "scan_delay_seconds": "SCAN_DELAY_SECONDS",
+            "upload_bandwidth_kbps": "UPLOAD_BANDWIDTH_KBPS"
         }
         
         for key, env_key in config_mapping.items():
@@ -1320,6 +2055,11 @@ def update_config():
                     new_delay = int(config_data[key])
                     rate_limiter.delay = new_delay
                     logging.info(f"Rate limiter delay updated to {new_delay} seconds")
+                # Re-shape uploads immediately if the bandwidth cap is changed (0 = unlimited)
+                if key == "upload_bandwidth_kbps":
+                    kbps = float(config_data[key])
+                    upload_bandwidth.set_rate(kbps * 1000 / 8)
+                    logging.info(f"Upload bandwidth cap set to {kbps:g} kbps")
         
         # Write updated .env file
         with open(env_file, 'w') as f:
@@ -1343,33 +2083,28 @@ def get_storage_stats():
         # Get disk usage
         total, used, free = shutil.disk_usage(BASE_DIR)
         
-        # Calculate image storage
-        images_size = 0
-        total_images = 0
-        if os.path.exists(IMAGES_DIR):
-            for filename in os.listdir(IMAGES_DIR):
-                if filename.lower().endswith(('.jpg', '.jpeg')):
-                    filepath = os.path.join(IMAGES_DIR, filename)
-                    if os.path.isfile(filepath):
-                        images_size += os.path.getsize(filepath)
-                        total_images += 1
+        # Image storage from the running counters
+        usage = storage_counters.snapshot()
+        images_size = usage["images"]["bytes"] + usage["thumbnails"]["bytes"]
+        total_images = usage["images"]["files"]
         
         # Calculate system files size
         system_files_size = 0
         system_files = [
             USER_DATA_FILE,
             BLOCKED_USERS_FILE,
-            TRANSACTION_CACHE_FILE,
             DAILY_STATS_FILE,
+            ACCESS_JOURNAL_FILE,
             LOG_FILE
         ]
         
         for file_path in system_files:
             if os.path.exists(file_path):
                 system_files_size += os.path.getsize(file_path)
+        system_files_size += transaction_log.total_bytes()
         
         # Get daily statistics
-        daily_stats = get_daily_stats()
+        daily = get_daily_stats()
         
         return jsonify({
             "total_images": total_images,
@@ -1378,7 +2113,7 @@ def get_storage_stats():
             "free_space": free,
             "total_space": total,
             "used_space": used,
-            "daily_stats": daily_stats
+            "daily_stats": daily
         })
         
     except Exception as e:
@@ -1393,27 +2128,29 @@ def cleanup_old_images():
         data = request.get_json()
         days_to_keep = data.get('days_to_keep', 30)
         
-        if not os.path.exists(IMAGES_DIR):
-            return jsonify({"status": "success", "deleted_count": 0, "message": "No images directory found"})
-        
         cutoff_time = time.time() - (days_to_keep * 24 * 60 * 60)
         deleted_count = 0
         
-        for filename in os.listdir(IMAGES_DIR):
-            if filename.lower().endswith(('.jpg', '.jpeg')):
-                filepath = os.path.join(IMAGES_DIR, filename)
-                if os.path.isfile(filepath):
-                    file_mtime = os.path.getmtime(filepath)
-                    if file_mtime < cutoff_time:
-                        try:
-                            os.remove(filepath)
-                            # Also remove upload sidecar if exists
-                            sidecar_path = filepath + ".uploaded.json"
-                            if os.path.exists(sidecar_path):
-                                os.remove(sidecar_path)
-                            deleted_count += 1
-                        except Exception as e:
-                            logging.error(f"Error deleting {filepath}: {e}")
+        # Whole days before the cutoff date go in one step each
+        cutoff_day = datetime.fromtimestamp(cutoff_time).date()
+        for day, day_path in list(iter_day_dirs(IMAGES_DIR)):
+            if day >= cutoff_day:
+                break
+            remove_day_dir(day_path)
+            removed = image_catalog.remove_under(os.path.relpath(day_path, IMAGES_DIR))
+            for name, size in removed:
+                thumbnails.invalidate(name)
+            storage_counters.add("images", -sum(size for _, size in removed), -len(removed))
+            deleted_count += len(removed)
+        
+        # Remainder of the boundary day, plus any legacy flat files
+        for row in image_catalog.older_than(int(cutoff_time)):
+            filepath = _catalog_path(row)
+            try:
+                _remove_image(filepath)
+                deleted_count += 1
+            except Exception as e:
+                logging.error(f"Error deleting {filepath}: {e}")
         
         logging.info(f"Cleaned up {deleted_count} old images")
         return jsonify({
@@ -1431,18 +2168,8 @@ def cleanup_old_images():
 def cleanup_old_stats():
     """Clean up statistics older than 20 days."""
     try:
-        stats = read_json_or_default(DAILY_STATS_FILE, {})
-        cutoff_date = datetime.now() - timedelta(days=20)
-        cutoff_str = cutoff_date.strftime('%Y-%m-%d')
-        
-        old_dates = [date for date in stats.keys() if date < cutoff_str]
-        deleted_count = len(old_dates)
-        
-        for date in old_dates:
-            del stats[date]
-        
-        if old_dates:
-            atomic_write_json(DAILY_STATS_FILE, stats)
+        deleted_count = daily_stats.prune()
+        daily_stats.flush()
         
         logging.info(f"Cleaned up {deleted_count} old daily statistics")
         return jsonify({
@@ -1460,8 +2187,7 @@ def cleanup_old_stats():
 def clear_all_stats():
     """Clear all daily statistics."""
     try:
-        if os.path.exists(DAILY_STATS_FILE):
-            os.remove(DAILY_STATS_FILE)
+        daily_stats.clear()
         
         logging.info("Cleared all daily statistics")
         return jsonify({
@@ -1485,30 +2211,26 @@ def manual_sync_transactions():
         if db is None:
             return jsonify({"status": "error", "message": "Firebase not available"}), 400
         
-        # Check cache file status
-        if not os.path.exists(TRANSACTION_CACHE_FILE):
-            return jsonify({"status": "success", "message": "No cached transactions to sync"})
-        
-        cached_txns = read_json_or_default(TRANSACTION_CACHE_FILE, [])
-        if not cached_txns:
+        cached_count = transaction_log.pending_count()
+        if not cached_count:
             return jsonify({"status": "success", "message": "No cached transactions to sync"})
         
         # Trigger sync
         sync_transactions()
         
         # Check remaining transactions
-        remaining_txns = read_json_or_default(TRANSACTION_CACHE_FILE, [])
+        remaining_count = transaction_log.pending_count()
         
-        if remaining_txns:
+        if remaining_count:
             return jsonify({
                 "status": "partial", 
-                "message": f"Synced some transactions, {len(remaining_txns)} still pending",
-                "remaining_count": len(remaining_txns)
+                "message": f"Synced some transactions, {remaining_count} still pending",
+                "remaining_count": remaining_count
             })
         else:
             return jsonify({
                 "status": "success", 
-                "message": f"All {len(cached_txns)} transactions synced successfully"
+                "message": f"All {cached_count} transactions synced successfully"
             })
             
     except Exception as e:
@@ -1517,20 +2239,17 @@ def manual_sync_transactions():
 
 @app.route("/transaction_cache_status", methods=["GET"])
 def transaction_cache_status():
-    """Get status of cached transactions."""
+    """Get status of cached transactions (from segment metadata, O(1))."""
     try:
-        if not os.path.exists(TRANSACTION_CACHE_FILE):
-            return jsonify({
-                "status": "success",
-                "cached_count": 0,
-                "message": "No cached transactions"
-            })
-        
-        cached_txns = read_json_or_default(TRANSACTION_CACHE_FILE, [])
+        log_status = transaction_log.status()
+        cached_count = log_status["cached_count"]
         return jsonify({
             "status": "success",
-            "cached_count": len(cached_txns),
-            "message": f"{len(cached_txns)} transactions cached"
+            "message": f"{cached_count} transactions cached" if cached_count else "No cached transactions",
+            **log_status,
+            "upload_batches": transaction_batch_stats.snapshot(),
+            "replay": transaction_replayer.status(),
+            "upload_queue_depth": transaction_queue.qsize()
         })
         
     except Exception as e:
@@ -1540,78 +2259,25 @@ def transaction_cache_status():
 # --- Offline Images Management ---
 @app.route("/get_offline_images", methods=["GET"])
 def get_offline_images():
-    """Get all offline images with reader information."""
+    """Get one page of offline images with reader information (cursor-paginated, filterable)."""
     try:
-        images = []
-        
-        if not os.path.exists(IMAGES_DIR):
-            return jsonify({"images": []})
-        
-        for filename in os.listdir(IMAGES_DIR):
-            if filename.lower().endswith(('.jpg', '.jpeg')):
-                filepath = os.path.join(IMAGES_DIR, filename)
-                if os.path.isfile(filepath):
-                    try:
-                        # Extract card number, reader, and timestamp from filename
-                        name_without_ext = os.path.splitext(filename)[0]
-                        parts = name_without_ext.split('_')
-                        
-                        if len(parts) >= 3:
-                            # New format: card_reader_timestamp
-                            card_number = parts[0]
-                            reader_str = parts[1]
-                            timestamp = int(parts[2])
-                            
-                            # Extract reader number from "r1" or "r2"
-                            if reader_str.startswith('r'):
-                                reader = int(reader_str[1:])
-                            else:
-                                reader = 1  # fallback
-                        elif len(parts) >= 2:
-                            # Old format: card_timestamp (backward compatibility)
-                            card_number = parts[0]
-                            timestamp = int(parts[-1])
-                            reader = 1  # default to reader 1 for old format
-                        else:
-                            card_number = "unknown"
-                            timestamp = int(os.path.getmtime(filepath))
-                            reader = 1
-                        
-                        # Check upload status
-                        uploaded_sidecar = filepath + ".uploaded.json"
-                        uploaded = None
-                        s3_location = None
-                        
-                        if os.path.exists(uploaded_sidecar):
-                            try:
-                                with open(uploaded_sidecar, 'r') as f:
-                                    upload_data = json.load(f)
-                                    uploaded = True
-                                    s3_location = upload_data.get('s3_location', '')
-                            except Exception as e:
-                                logging.error(f"Error reading upload sidecar for {filename}: {e}")
-                                uploaded = False
-                        else:
-                            uploaded = False
-                        
-                        images.append({
-                            "filename": filename,
-                            "card_number": card_number,
-                            "timestamp": timestamp,
-                            "reader": reader,
-                            "uploaded": uploaded,
-                            "s3_location": s3_location,
-                            "file_size": os.path.getsize(filepath)
-                        })
-                        
-                    except Exception as e:
-                        logging.error(f"Error processing image {filename}: {e}")
-                        continue
-        
-        # Sort by timestamp (newest first)
-        images.sort(key=lambda x: x['timestamp'], reverse=True)
-        
-        return jsonify({"images": images})
+        try:
+            images, next_cursor, limit = _image_page_from_request()
+        except ValueError as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
+        
+        response = {"images": images, "next_cursor": next_cursor, "limit": limit}
+        if not request.args.get("cursor"):
+            # Archive-wide counters for the stats cards, only on the first page
+            totals = image_catalog.totals()
+            per_reader = image_catalog.reader_counts()
+            response["stats"] = {
+                "total": totals["count"],
+                "reader_1": per_reader.get(1, 0),
+                "reader_2": per_reader.get(2, 0),
+                "pending": totals["pending"]
+            }
+        return jsonify(response)
         
     except Exception as e:
         logging.error(f"Error fetching offline images: {e}")
@@ -1622,24 +2288,15 @@ def get_offline_images():
 def clear_all_offline_images():
     """Clear all offline images."""
     try:
-        if not os.path.exists(IMAGES_DIR):
-            return jsonify({"status": "success", "deleted_count": 0, "message": "No images directory found"})
-        
         deleted_count = 0
         
-        for filename in os.listdir(IMAGES_DIR):
-            if filename.lower().endswith(('.jpg', '.jpeg')):
-                filepath = os.path.join(IMAGES_DIR, filename)
-                if os.path.isfile(filepath):
-                    try:
-                        os.remove(filepath)
-                        # Also remove upload sidecar if exists
-                        sidecar_path = filepath + ".uploaded.json"
-                        if os.path.exists(sidecar_path):
-                            os.remove(sidecar_path)
-                        deleted_count += 1
-                    except Exception as e:
-                        logging.error(f"Error deleting {filepath}: {e}")
+        for path in image_catalog.all_paths():
+            filepath = os.path.join(IMAGES_DIR, path)
+            try:
+                _remove_image(filepath)
+                deleted_count += 1
+            except Exception as e:
+                logging.error(f"Error deleting {filepath}: {e}")
         
         logging.info(f"Cleared {deleted_count} offline images")
         return jsonify({
@@ -1652,6 +2309,17 @@ def clear_all_offline_images():
         logging.error(f"Error clearing offline images: {e}")
         return jsonify({"status": "error", "message": f"Error clearing images: {str(e)}"}), 500
 
+@app.route("/rebuild_image_catalog", methods=["POST"])
+@require_api_key
+def rebuild_image_catalog_route():
+    """Re-index the image catalog from the files on disk."""
+    try:
+        count = rebuild_image_catalog()
+        return jsonify({"status": "success", "indexed": count, "totals": image_catalog.totals()})
+    except Exception as e:
+        logging.error(f"Error rebuilding image catalog: {e}")
+        return jsonify({"status": "error", "message": f"Error rebuilding image catalog: {str(e)}"}), 500
+
 @app.route("/get_storage_info", methods=["GET"])
 def get_storage_info():
     """Get storage information for images."""
@@ -1684,7 +2352,9 @@ def get_storage_info():
             "disk_free_gb": round(disk_free_gb, 2),
             "disk_used_gb": round(disk_used_gb, 2),
             "allocation_percentage": 60,  # 60% of free space allocated to images
-            "cleanup_percentage": 30      # 30% of allocated space cleaned up
+            "cleanup_percentage": 30,     # 30% of allocated space cleaned up
+            "counters": storage_counters.snapshot(),
+            "eviction": dict(eviction_stats, evict_pending=EVICT_PENDING_IMAGES)
         })
         
     except Exception as e:
@@ -1696,7 +2366,7 @@ def get_storage_info():
 def trigger_storage_cleanup():
     """Manually trigger storage cleanup."""
     try:
-        cleanup_old_images()
+        enforce_storage_limits()
         current_usage = get_storage_usage()
         max_storage_gb, cleanup_threshold_gb = get_dynamic_storage_limits()
         
@@ -1787,7 +2457,7 @@ def health_check():
         health_status["internet"] = is_internet_available()
         
         # Check Firebase connection
-        health_status["firebase"] = db is not None and is_internet_available()
+        health_status["firebase"] = db is not None and health_status["internet"]
         
         # Check camera connectivity (only if enabled)
         camera_1_enabled = os.getenv("CAMERA_1_ENABLED", "true").lower() == "true"
@@ -1815,6 +2485,12 @@ def check_camera_health(camera_key):
         if not rtsp_url:
             return False
         
+        # A running grabber already knows; don't open a second stream to the camera
+        grabber = frame_grabbers.get(camera_key)
+        if grabber is not None:
+            frame, _ = grabber.latest(max_age=FRAME_MAX_AGE)
+            return frame is not None
+        
         # Try to open the camera stream
         cap = cv2.VideoCapture(rtsp_url)
         if cap.isOpened():
@@ -1838,9 +2514,7 @@ def block_user():
         if not card_number:
             return jsonify({"status": "error", "message": "Missing card_number"}), 400
 
-        curr = load_blocked_users()
-        curr[card_number] = True
-        save_blocked_users(curr)  # updates dict + BLOCKED_SET
+        mutate_access("block", card_number)  # journal + O(1) snapshot update
 
         logging.info(f"User blocked locally: Card {card_number}")
         return jsonify({"status": "success", "message": f"User {card_number} blocked successfully."})
@@ -1855,10 +2529,8 @@ def unblock_user():
         if not card_number:
             return jsonify({"status": "error", "message": "Missing card_number"}), 400
 
-        curr = load_blocked_users()
-        if card_number in curr:
-            curr.pop(card_number, None)
-            save_blocked_users(curr)  # updates dict + BLOCKED_SET
+        if access_store.has_blocked_entry(card_number):
+            mutate_access("unblock", card_number)  # journal + O(1) snapshot update
 
             logging.info(f"User unblocked locally: Card {card_number}")
             return jsonify({"status": "success", "message": f"User {card_number} unblocked successfully."})
@@ -1870,86 +2542,199 @@ def unblock_user():
 # =========================
 # Firestore listeners (attach once)
 # =========================
-_listeners = {"users": False, "blocked": False}
+_listeners = {"users": False}
+_users_watch = None
+
+# Delta resync: the listener only asks for users changed since the persisted watermark
+# (max USER_WATERMARK_FIELD seen), so boot/reconnect reads only the delta. Every writer of
+# `users` (admin tools, block/unblock included) must bump the field; a full read every
+# USER_FULL_RESYNC_INTERVAL catches deletions and documents without it.
+USER_WATERMARK_FIELD = os.environ.get("USER_WATERMARK_FIELD", "updated_at")
+USER_FULL_RESYNC_INTERVAL = int(os.environ.get("USER_FULL_RESYNC_INTERVAL", "86400"))
+REMOTE_USER_FLAG = "_firebase"  # marks user records that came from Firestore (vs. added locally)
+user_sync_state = read_json_or_default(USER_SYNC_STATE_FILE, {})  # watermark, watermark_kind, last_full_sync
+_user_sync_lock = threading.Lock()
+
+def _save_user_sync_state(watermark=None, **fields):
+    """Persist the users watermark (only ever moves forward) and other sync fields."""
+    with _user_sync_lock:
+        if watermark is not None and watermark[0] > user_sync_state.get("watermark", float("-inf")):
+            user_sync_state["watermark"], user_sync_state["watermark_kind"] = watermark
+        user_sync_state.update(fields)
+        try:
+            atomic_write_json(USER_SYNC_STATE_FILE, user_sync_state)
+        except Exception as e:
+            logging.error(f"Error saving user sync state: {e}")
+
+def _advance_user_watermark(watermark):
+    """Record the newest watermark seen; saved now if the changes are on disk, else by the next compaction."""
+    global _user_watermark_pending
+    if watermark is None:
+        return
+    with ACCESS_LOCK:
+        if _user_watermark_pending is None or watermark[0] > _user_watermark_pending[0]:
+            _user_watermark_pending = watermark
+        durable = not _access_unsaved.is_set()
+    if durable:
+        _save_user_sync_state(watermark)
+
+def _watermark_of(doc):
+    """(value, kind) of a document's USER_WATERMARK_FIELD, or None if absent/unusable."""
+    value = doc.get(USER_WATERMARK_FIELD)
+    if hasattr(value, "timestamp"):
+        return value.timestamp(), "timestamp"
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value, "number"
+    return None
+
+def _plain_user_doc(card_number, raw):
+    """JSON-safe copy of a Firestore user document (timestamps -> epoch seconds), tagged as remote."""
+    doc = {k: (round(v.timestamp(), 3) if hasattr(v, "timestamp") else v) for k, v in raw.items()}
+    doc.setdefault("card_number", card_number)
+    doc[REMOTE_USER_FLAG] = True
+    return doc
+
+def _user_doc_records(items):
+    """
+    Turn (doc_id, raw_doc) pairs, or (card_number, None) for removals, from the
+    `users` collection into access mutations, skipping ones that match the in-memory
+    store (e.g. the full ADDED replay when a listener attaches). One document
+    carries both the user record and its `blocked` flag. Returns (records, newest watermark).
+    """
+    now = int(time.time())
+    records = []
+    watermark = None
+    users, blocked = {}, {}  # state after earlier records in this batch
+
+    def current_user(card):
+        return users[card] if card in users else access_store.get_user(card)
+
+    for doc_id, raw in items:
+        if raw is None:
+            card_number = doc_id
+            if current_user(card_number) is not None:
+                users[card_number] = None
+                records.append({"op": "delete_user", "card": card_number, "ts": now})
+                logging.debug(f"User with Card {card_number} removed.")
+            continue
+
+        mark = _watermark_of(raw)
+        if mark is not None and (watermark is None or mark[0] > watermark[0]):
+            watermark = mark
+        doc = _plain_user_doc(doc_id, raw)
+        card_number = doc["card_number"]
+        if current_user(card_number) != doc:
+            users[card_number] = doc
+            records.append({"op": "add_user", "card": card_number, "ts": now, "user": doc})
+            logging.debug(f"User {doc.get('name', 'Unknown')} (Card: {card_number}) added/updated.")
+
+        if "blocked" in doc:
+            is_blocked = blocked.get(card_number, access_store.has_blocked_entry(card_number))
+            blocked[card_number] = bool(doc["blocked"])
+            if doc["blocked"] and not is_blocked:
+                records.append({"op": "block", "card": card_number, "ts": now})
+                logging.info(f"User {card_number} blocked via Firebase.")
+            elif not doc["blocked"] and is_blocked:
+                records.append({"op": "unblock", "card": card_number, "ts": now})
+                logging.info(f"User {card_number} unblocked via Firebase.")
+    return records, watermark
+
+def _users_query():
+    """The `users` collection, narrowed to documents changed since the saved watermark."""
+    users_ref = db.collection("users")
+    with _user_sync_lock:
+        watermark = user_sync_state.get("watermark")
+        kind = user_sync_state.get("watermark_kind")
+    if watermark is None:
+        return users_ref, None
+    if kind == "timestamp":
+        watermark = datetime.fromtimestamp(watermark, tz=timezone.utc)
+    # >= so documents sharing the watermark value are not skipped (re-applying them is a no-op)
+    return users_ref.where(USER_WATERMARK_FIELD, ">=", watermark), watermark
 
 def sync_users_from_firebase():
-    """Real-time Firebase updates -> keep users.json and in-memory users fresh."""
-    global _listeners
-    if db is None or _listeners["users"] or not is_internet_available():
+    """
+    Single real-time listener on `users`: applies each change to the in-memory
+    access store (users and blocked flags together) in O(changes). Attaches with
+    a watermark query so boot/reconnect only downloads what changed meanwhile,
+    and re-attaches if the watch has died. Documents edited without bumping
+    USER_WATERMARK_FIELD are picked up by reconcile_users_with_firebase().
+    """
+    global _listeners, _users_watch
+    if db is None or not is_internet_available():
         return
+    if _listeners["users"]:
+        if _users_watch is None or getattr(_users_watch, "is_active", True):
+            return
+        logging.warning("Firebase users listener is no longer active; re-attaching")
+        try:
+            _users_watch.unsubscribe()
+        except Exception:
+            pass
+        _listeners["users"] = False
     try:
-        users_ref = db.collection("users")
+        query, since = _users_query()
 
         def on_snapshot(col_snapshot, changes, read_time):
             try:
-                local = load_local_users()
-                changed = False
-                for change in changes:
-                    doc = change.document.to_dict() or {}
-                    if "card_number" not in doc:
-                        doc["card_number"] = change.document.id
-                    card_number = doc["card_number"]
-
-                    if change.type.name in ("ADDED", "MODIFIED"):
-                        local[card_number] = doc
-                        changed = True
-                        logging.info(f"User {doc.get('name', 'Unknown')} (Card: {card_number}) added/updated.")
-                    elif change.type.name == "REMOVED":
-                        if card_number in local:
-                            local.pop(card_number, None)
-                            changed = True
-                            logging.info(f"User with Card {card_number} removed.")
-
-                if changed:
-                    save_local_users(local)  # refresh ALLOWED_SET
+                items = []
+                for c in changes:
+                    raw = c.document.to_dict() or {}
+                    if c.type.name == "REMOVED":
+                        # Key removals by the card_number field like adds; the doc id may differ
+                        items.append((raw.get("card_number") or c.document.id, None))
+                    else:
+                        items.append((c.document.id, raw))
+                records, watermark = _user_doc_records(items)
+                if records:
+                    mutate_access_batch(records)  # publish one access snapshot
+                    logging.info(f"Applied {len(records)} user/blocklist changes from Firebase")
+                _advance_user_watermark(watermark)
             except Exception as e:
                 logging.error(f"Error in Firebase user snapshot callback: {str(e)}")
 
-        users_ref.on_snapshot(on_snapshot)
+        _users_watch = query.on_snapshot(on_snapshot)
         _listeners["users"] = True
-        logging.info("Listening for real-time Firebase user updates (attached once).")
+        if since is None:
+            # Unfiltered attach: the first snapshot is a full read, so it doubles as a reconciliation
+            _save_user_sync_state(last_full_sync=int(time.time()))
+            logging.info("Listening for real-time Firebase user updates (full collection).")
+        else:
+            logging.info(f"Listening for real-time Firebase user updates changed since {since}.")
     except google.api_core.exceptions.DeadlineExceeded:
         logging.warning("Firestore transaction timeout during user sync setup")
     except Exception as e:
         logging.error(f"Error setting up real-time Firebase sync: {str(e)}")
 
-def sync_blocked_users_from_firebase():
-    """Real-time Firebase updates to blocked flag -> update local blocked_users."""
-    global _listeners
-    if db is None or _listeners["blocked"] or not is_internet_available():
+def reconcile_users_with_firebase(force=False):
+    """
+    Low-frequency safety net for the delta listener: read the whole `users` collection,
+    apply any differences, and drop Firestore-sourced users that no longer exist there.
+    Locally added users and local blocks are left alone.
+    """
+    if db is None:
+        return
+    with _user_sync_lock:
+        last = user_sync_state.get("last_full_sync", 0)
+    if not force and time.time() - last < USER_FULL_RESYNC_INTERVAL:
         return
     try:
-        blocked_users_ref = db.collection("users")
-
-        def on_snapshot(col_snapshot, changes, read_time):
-            try:
-                local = load_blocked_users()
-                changed = False
-                for change in changes:
-                    doc = change.document.to_dict() or {}
-                    card_number = change.document.id
-                    if "blocked" in doc:
-                        if doc["blocked"]:
-                            if not local.get(card_number):
-                                local[card_number] = True
-                                changed = True
-                                logging.info(f"User {card_number} blocked via Firebase.")
-                        else:
-                            if local.pop(card_number, None) is not None:
-                                changed = True
-                                logging.info(f"User {card_number} unblocked via Firebase.")
-                if changed:
-                    save_blocked_users(local)  # refresh BLOCKED_SET
-            except Exception as e:
-                logging.error(f"Error in Firebase blocked snapshot callback: {str(e)}")
-
-        blocked_users_ref.on_snapshot(on_snapshot)
-        _listeners["blocked"] = True
-        logging.info("Listening for real-time Firebase blocked user updates (attached once).")
+        docs = {d.id: (d.to_dict() or {}) for d in db.collection("users").stream()}
+        items = list(docs.items())
+        present = {_plain_user_doc(doc_id, raw)["card_number"] for doc_id, raw in items}
+        for card_number, user in access_store.users().items():
+            if (user or {}).get(REMOTE_USER_FLAG) and card_number not in present:
+                items.append((card_number, None))
+        records, watermark = _user_doc_records(items)
+        if records:
+            mutate_access_batch(records)
+        _advance_user_watermark(watermark)
+        _save_user_sync_state(last_full_sync=int(time.time()))
+        logging.info(f"Full user reconciliation: {len(docs)} documents, {len(records)} changes applied")
     except google.api_core.exceptions.DeadlineExceeded:
-        logging.warning("Firestore transaction timeout during blocked user sync")
+        logging.warning("Firestore transaction timeout during full user reconciliation")
     except Exception as e:
-        logging.error(f"Error setting up Firebase blocked user sync: {str(e)}")
+        logging.error(f"Error during full user reconciliation: {str(e)}")
 
 # =========================
 # Access handling
@@ -1959,154 +2744,242 @@ wiegand1 = None
 wiegand2 = None
 
 def operate_relay(action, relay):
-    global relay_status
-    try:
-        if not hasattr(GPIO, 'output'):
-            logging.warning("GPIO not available. Relay operation skipped.")
-            return
+    """Remote/API relay action, applied in order by the relay actuator thread."""
+    relay_actuator.command(action, relay)
 
-        if action == "open_hold":
-            GPIO.output(relay, GPIO.LOW)
-            relay_status = 1   # OPEN HOLD
-            logging.info(f"Relay {relay} opened (hold)")
-        elif action == "close_hold":
-            GPIO.output(relay, GPIO.HIGH)
-            relay_status = 2   # CLOSE HOLD
-            logging.info(f"Relay {relay} closed (hold)")
-        elif action == "normal":
-            relay_status = 0
-            logging.info(f"Relay {relay} set to normal mode")
-        elif action == "normal_rfid":
-            relay_status = 0
-            GPIO.output(relay, GPIO.LOW)
-            time.sleep(1)  # NOTE: runs in separate thread (see below)
-            GPIO.output(relay, GPIO.HIGH)
-            logging.info(f"Relay {relay} pulsed (normal RFID)")
-        else:
-            logging.warning(f"Invalid relay action received: {action}")
-    except Exception as e:
-        logging.error(f"Error setting relay {relay}: {str(e)}")
+# =========================
+# Callback-to-relay latency (per reader)
+# =========================
+class RelayLatencyStats:
+    def __init__(self, window=256):
+        self._lock = threading.Lock()
+        self._window = window
+        self._samples = {}  # reader_id -> deque[int us]
+        self._totals = {}   # reader_id -> [count, sum_us, max_us]
 
-def handle_access(bits, value, reader_id):
-    """Handle Wiegand 26-bit read -> O(1) set lookups, immediate local decisions, async image capture."""
+    def record(self, reader_id, latency_us):
+        with self._lock:
+            samples = self._samples.get(reader_id)
+            if samples is None:
+                samples = self._samples[reader_id] = deque(maxlen=self._window)
+                self._totals[reader_id] = [0, 0, 0]
+            samples.append(latency_us)
+            t = self._totals[reader_id]
+            t[0] += 1
+            t[1] += latency_us
+            t[2] = max(t[2], latency_us)
+
+    def snapshot(self):
+        with self._lock:
+            out = {}
+            for reader_id, samples in self._samples.items():
+                count, total_us, max_us = self._totals[reader_id]
+                ordered = sorted(samples)
+                out[f"reader_{reader_id}"] = {
+                    "count": count,
+                    "last_us": samples[-1],
+                    "avg_us": round(total_us / count, 1),
+                    "max_us": max_us,
+                    "p50_us": ordered[len(ordered) // 2],
+                    "p95_us": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+                }
+            return out
+
+relay_latency = RelayLatencyStats()
+access_followup_queue = Queue()  # post-decision work: stats, camera, transactions
+
+def handle_access(bits, value, reader_id, tick=None):
+    """Decision stage: O(1) snapshot lookup and relay first; everything else is handed to access_followup_worker."""
     try:
-        global relay_status
         if bits != 26:
             logging.warning(f"Invalid Wiegand bits received: {bits} from reader {reader_id}")
             return
 
         # 26-bit with parity removal (bits 1..24) -> int
-        card_int = int(f"{value:026b}"[1:25], 2)
+        card_int = (value >> 1) & 0xFFFFFF
 
         if not rate_limiter.should_process(card_int):
-            logging.info(f"Duplicate scan ignored: {card_int}")
+            access_followup_queue.put(("duplicate", reader_id, card_int, None, None, None, None, None))
             return
 
-        print(f"Scanned Card from Reader {reader_id}: {card_int}")
-        timestamp = int(time.time())
         relay = RELAY_1 if reader_id == 1 else RELAY_2
 
-        # O(1) lookups using sets
-        with BLOCKED_SET_LOCK:
-            is_blocked = card_int in BLOCKED_SET
-        with ALLOWED_SET_LOCK:
-            is_allowed = card_int in ALLOWED_SET
-
-        if is_blocked:
-            status = "Blocked"
-            name = "Blocked User"
-        elif is_allowed:
-            with USERS_LOCK:
-                u = users.get(str(card_int))
-                name = u.get("name", "Unknown") if u else "Unknown"
-            status = "Access Granted"
-            if relay_status == 0:
-                # Offload relay pulse to avoid blocking pigpio callback thread
-                threading.Thread(target=operate_relay, args=("normal_rfid", relay), daemon=True).start()
-        else:
-            status = "Access Denied"
-            name = "Unknown"
+        # Lock-free decision: one pointer read, then O(1) lookups on an immutable snapshot
+        snapshot = access_store.snapshot
+        status, name = snapshot.decide(card_int)
 
-        # === NON-BLOCKING CAMERA CAPTURE ===
-        # Capture image in the background; name format: CARD_TIMESTAMP.jpg
-        camera_executor.submit(capture_for_reader_async, reader_id, card_int)
+        if status == "Access Granted":
+            # Ignored while this relay is held open/closed; overlapping grants extend one pulse
+            on_driven = None
+            if tick is not None and pi is not None:
+                on_driven = lambda: relay_latency.record(reader_id, pigpio.tickDiff(tick, pi.get_current_tick()))
+            relay_actuator.pulse(relay, on_driven)
 
-        transaction = {
-            "card_number": str(card_int),
-            "name": name,
-            "status": status,
-            "timestamp": timestamp,
-            "reader": reader_id
-        }
+        # Wall-clock time of the read itself (the ring may have queued it a little while);
+        # worked out after the pulse so the pigpio tick round trip stays off the grant path
+        scan_at = time.time()
+        if tick is not None and pi is not None:
+            scan_at -= pigpio.tickDiff(tick, pi.get_current_tick()) / 1e6
+        timestamp = int(scan_at)
 
-        # Update daily statistics
-        update_daily_stats(status)
+        access_followup_queue.put(("decided", reader_id, card_int, status, name, snapshot.version, timestamp, scan_at))
 
-        try:
-            transaction_queue.put(transaction)
-        except Exception as e:
-            logging.error(f"Queue error for card {card_int}: {str(e)}")
+    except Exception as e:
+        logging.error(f"Unexpected error in handle_access for reader {reader_id}: {str(e)}")
+
+def _complete_access(reader_id, card_int, status, name, snapshot_version, timestamp, scan_at=None):
+    """Follow-up stage: camera capture, statistics and transaction upload for a decided scan."""
+    print(f"Scanned Card from Reader {reader_id}: {card_int}")
+
+    # === NON-BLOCKING CAMERA CAPTURE ===
+    # Capture image in the background; name format: CARD_TIMESTAMP.jpg
+    camera_executor.submit(capture_for_reader_async, reader_id, card_int, scan_at, CAPTURE_STATUS.get(status))
+
+    transaction = {
+        "card_number": str(card_int),
+        "name": name,
+        "status": status,
+        "timestamp": timestamp,
+        "reader": reader_id,
+        "snapshot_version": snapshot_version,
+        "snapshot_epoch": ACCESS_EPOCH
+    }
 
-        recent_transactions.append(transaction)
-        if len(recent_transactions) > 10:
-            recent_transactions.pop(0)
+    # Update daily statistics
+    update_daily_stats(status)
 
+    try:
+        transaction_queue.put(transaction)
     except Exception as e:
-        logging.error(f"Unexpected error in handle_access for reader {reader_id}: {str(e)}")
+        logging.error(f"Queue error for card {card_int}: {str(e)}")
+
+    recent_transactions.append(transaction)
+    if len(recent_transactions) > 10:
+        recent_transactions.pop(0)
+
+def access_decision_worker():
+    """Drain the scan ring and make access decisions off the pigpio callback thread."""
+    while True:
+        event = scan_ring.pop()
+        if event is None:
+            continue
+        reader_id, bits, value, tick = event
+        handle_access(bits, value, reader_id, tick)
+
+def access_followup_worker():
+    """Background worker for everything that does not gate the relay."""
+    while True:
+        kind, reader_id, card_int, status, name, snapshot_version, timestamp, scan_at = access_followup_queue.get()
+        try:
+            if kind == "duplicate":
+                logging.info(f"Duplicate scan ignored: {card_int}")
+            else:
+                _complete_access(reader_id, card_int, status, name, snapshot_version, timestamp, scan_at)
+        except Exception as e:
+            logging.error(f"Error completing access for reader {reader_id}: {str(e)}")
+        finally:
+            access_followup_queue.task_done()
+
+def _drain_transaction_batch():
+    """Block for one transaction, then collect more until TXN_BATCH_MAX or the linger time."""
+    txns = [transaction_queue.get()]
+    deadline = time.monotonic() + TXN_BATCH_LINGER_MS / 1000.0
+    while len(txns) < TXN_BATCH_MAX:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            txns.append(transaction_queue.get(timeout=remaining))
+        except Empty:
+            break
+    return txns
 
 def transaction_uploader():
-    """Background worker to upload/cache transactions."""
+    """Background worker to upload/cache transactions in Firestore batch commits."""
     while True:
-        transaction = transaction_queue.get()
+        txns = _drain_transaction_batch()
         try:
             if is_internet_available() and db is not None:
                 try:
-                    db.collection("transactions").add(transaction)
-                    logging.info(f"Transaction uploaded: {transaction}")
+                    commit_transaction_batch(txns, transaction_batch_stats)
+                    logging.info(f"Uploaded {len(txns)} transaction(s) in one batch commit")
                 except Exception as e:
-                    logging.error(f"Error uploading transaction: {str(e)}")
-                    cache_transaction(transaction)
+                    logging.error(f"Error uploading transaction batch of {len(txns)}: {str(e)}")
+                    cache_transactions(txns)
+                    connectivity.probe_soon()
             else:
-                logging.warning("No internet/Firebase unavailable. Transaction cached.")
-                cache_transaction(transaction)
+                logging.warning(f"No internet/Firebase unavailable. {len(txns)} transaction(s) cached.")
+                cache_transactions(txns)
+        except Exception as e:
+            logging.error(f"Error caching transaction batch: {str(e)}")
         finally:
-            transaction_queue.task_done()
+            for _ in txns:
+                transaction_queue.task_done()
+
+# Shared upload bandwidth cap (UPLOAD_BANDWIDTH_KBPS, adjustable via /update_config)
+upload_bandwidth = TokenBucket(UPLOAD_BANDWIDTH_KBPS * 1000 / 8)
+
+# One pooled uploader shared by UPLOAD_WORKERS image_uploader_worker threads
+image_uploader = ImageUploader(bandwidth=upload_bandwidth)  # :contentReference[oaicite:6]{index=6}
+
+def _queue_backlog_image(row) -> bool:
+    """Queue a catalog row for upload in its backlog priority class."""
+    return image_queue.put(_catalog_path(row), backlog_priority(row["status"]), row["timestamp"])
+
+def _requeue_upload(filepath):
+    row = image_catalog.get(os.path.basename(filepath))
+    if row is not None:
+        _queue_backlog_image(row)
+
+def _dead_letter_image(filepath, attempts, error):
+    """Out of retry budget: mark it in the catalog so enqueue_pending_images skips it."""
+    encoded_images.discard(filepath)
+    image_catalog.mark_dead(os.path.basename(filepath), error, int(time.time()))
+
+# Failed uploads wait here (not in a worker) until their next attempt is due
+upload_retries = RetryScheduler(_requeue_upload, base_delay=UPLOAD_RETRY_BASE_DELAY,
+                                max_delay=UPLOAD_RETRY_MAX_DELAY, budget=UPLOAD_RETRY_BUDGET,
+                                on_dead=_dead_letter_image)
 
 def image_uploader_worker():
     """
     Background worker to upload images to S3 with NO impact on scan latency.
     Uses ImageUploader (your module). Writes *.uploaded.json sidecar on success.
+    Several of these run concurrently over the same keep-alive session.
     """
-    uploader = ImageUploader()  # :contentReference[oaicite:6]{index=6}
+    uploader = image_uploader
     while True:
         filepath = image_queue.get()
+        released = False
         try:
-            if not os.path.exists(filepath):
-                image_queue.task_done()
-                continue
-
-            if not is_internet_available():
-                # Requeue later by simply skipping; sync_loop will enqueue again when online
-                time.sleep(5)
-                image_queue.task_done()
+            if not os.path.exists(filepath) or _has_uploaded_sidecar(filepath):
+                # deleted or already uploaded
+                encoded_images.discard(filepath)
+                upload_retries.discard(filepath)
                 continue
 
-            if _has_uploaded_sidecar(filepath):
-                # already uploaded
-                image_queue.task_done()
-                continue
+            # Park here until the connectivity monitor reports "came online"
+            connectivity.wait_until_online()
 
-            location = uploader.upload(filepath)
+            location = uploader.upload(filepath, data=encoded_images.pop(filepath))
             if location:
                 _mark_uploaded(filepath, location)
+                upload_retries.succeeded(filepath)
                 logging.info(f"[UPLOAD] OK: {filepath} -> {location}")
             else:
-                logging.warning(f"[UPLOAD] Failed: {filepath} (will retry later)")
+                # Leave the in-flight set first so a quick retry can be re-queued;
+                # failures while the link is down don't spend the retry budget
+                image_queue.task_done(filepath)
+                released = True
+                upload_retries.failed(filepath, uploader.last_error, count=connectivity.is_online(),
+                                      permanent=uploader.last_permanent)
+                connectivity.probe_soon()
 
         except Exception as e:
             logging.error(f"[UPLOAD] Worker error: {e}")
         finally:
-            image_queue.task_done()
+            if not released:
+                image_queue.task_done(filepath)
 
 def enqueue_pending_images(limit=50):
     """
@@ -2115,75 +2988,166 @@ def enqueue_pending_images(limit=50):
     """
     try:
         count = 0
-        for name in os.listdir(IMAGES_DIR):
-            if not name.lower().endswith(".jpg"):
+        # Over-fetch so images already queued, uploading or parked on the retry queue
+        # don't crowd out the rest
+        skip = image_queue.qsize() + image_queue.inflight_count() + upload_retries.waiting_count()
+        for row in image_catalog.pending(limit + skip, newest_first=image_queue.newest_first):
+            if upload_retries.is_waiting(_catalog_path(row)) or not _queue_backlog_image(row):
                 continue
-            fp = os.path.join(IMAGES_DIR, name)
-            if not _has_uploaded_sidecar(fp):
-                image_queue.put(fp)
-                count += 1
-                if count >= limit:
-                    break
+            count += 1
+            if count >= limit:
+                break
         if count:
             logging.info(f"[UPLOAD] Enqueued {count} pending images for upload")
     except Exception as e:
         logging.error(f"enqueue_pending_images error: {e}")
 
+def _apply_relay_control(data):
+    """Apply a relay_control/status document: {"relay": "RELAY_1"|"RELAY_2", "action": ...}."""
+    action = data.get("action", "normal")
+    relay = data.get("relay", None)
+    if relay == "RELAY_1":
+        relay_gpio = RELAY_1
+    elif relay == "RELAY_2":
+        relay_gpio = RELAY_2
+    else:
+        logging.warning(f"Invalid relay identifier: {relay}")
+        return
+    if action in ["open_hold", "close_hold", "normal_rfid", "normal"]:
+        operate_relay(action, relay_gpio)
+
+def _apply_user_control(data):
+    """Apply a user_control/status document: "updated" asks for a user refresh, then resets the flag."""
+    if data.get("action", "normal") == "updated":
+        try:
+            sync_users_from_firebase()
+            db.collection("user_control").document("status").update({"action": "normal"})
+            logging.info("User data updated from Firebase")
+        except Exception as e:
+            logging.error(f"Error updating user data: {str(e)}")
+
 def check_relay_status():
-    """Monitor relay control from Firebase (polled)."""
+    """Poll relay control from Firebase (fallback while its listener is down)."""
     if db is None:
         return
     try:
         doc = db.collection("relay_control").document("status").get()
         if doc.exists:
-            data = doc.to_dict() or {}
-            action = data.get("action", "normal")
-            relay = data.get("relay", None)
-            if relay == "RELAY_1":
-                relay_gpio = RELAY_1
-            elif relay == "RELAY_2":
-                relay_gpio = RELAY_2
-            else:
-                logging.warning(f"Invalid relay identifier: {relay}")
-                return
-            if action in ["open_hold", "close_hold", "normal_rfid", "normal"]:
-                operate_relay(action, relay_gpio)
+            _apply_control("relay", _apply_relay_control, doc)
     except google.api_core.exceptions.DeadlineExceeded:
         logging.warning("Firestore transaction timeout during relay status check")
     except Exception as e:
         logging.error(f"Error fetching relay status from Firebase: {str(e)}")
 
 def check_user_status():
-    """Monitor user control from Firebase."""
+    """Poll user control from Firebase (fallback while its listener is down)."""
     if db is None:
         return
     try:
         doc = db.collection("user_control").document("status").get()
         if doc.exists:
-            action = doc.to_dict().get("action", "normal")
-            if action == "updated":
-                try:
-                    sync_users_from_firebase()
-                    db.collection("user_control").document("status").update({"action": "normal"})
-                    logging.info("User data updated from Firebase")
-                except Exception as e:
-                    logging.error(f"Error updating user data: {str(e)}")
+            _apply_control("user", _apply_user_control, doc)
     except google.api_core.exceptions.DeadlineExceeded:
         logging.warning("Firestore transaction timeout during user status check")
     except Exception as e:
         logging.error(f"Error checking user status: {str(e)}")
 
+# Remote control documents are pushed to us by on_snapshot; the polls above only run while
+# a listener is down. Commands run in order on one thread, off the Firestore watch thread.
+CONTROL_DOCUMENTS = {
+    "relay": ("relay_control", _apply_relay_control),
+    "user": ("user_control", _apply_user_control),
+}
+_control_watches = {}
+control_executor = ThreadPoolExecutor(max_workers=1)
+# normal_rfid is a one-shot pulse, but every listener attach (boot, reconnect) and every
+# fallback poll re-delivers the document. Remember the update_time of the last pulse applied
+# per document (persisted, so a reboot doesn't pulse the gate again) and skip older ones.
+_control_applied = read_json_or_default(CONTROL_STATE_FILE, {})
+_control_applied_lock = threading.Lock()
+
+def _control_listener_active(name):
+    watch = _control_watches.get(name)
+    return watch is not None and getattr(watch, "is_active", True)
+
+def _is_new_pulse(name, data, update_time):
+    """False if this normal_rfid document version was already applied."""
+    if data.get("action") != "normal_rfid" or update_time is None:
+        return True
+    stamp = update_time.timestamp()
+    with _control_applied_lock:
+        if stamp <= _control_applied.get(name, 0):
+            logging.debug(f"Skipping already applied {name} pulse from {update_time}")
+            return False
+        _control_applied[name] = stamp
+        try:
+            atomic_write_json(CONTROL_STATE_FILE, _control_applied)
+        except Exception as e:
+            logging.error(f"Error saving control state: {e}")
+    return True
+
+def _apply_control(name, handler, doc):
+    """Apply a control document snapshot unless it is a pulse that was already applied."""
+    data = doc.to_dict() or {}
+    if _is_new_pulse(name, data, getattr(doc, "update_time", None)):
+        handler(data)
+
+def _run_control(name, handler, doc):
+    try:
+        _apply_control(name, handler, doc)
+    except Exception as e:
+        logging.error(f"Error applying {name} control update: {str(e)}")
+
+def watch_control_documents():
+    """Attach (or re-attach) on_snapshot listeners to relay_control/status and user_control/status."""
+    if db is None:
+        return
+    for name, (collection, handler) in CONTROL_DOCUMENTS.items():
+        if _control_listener_active(name):
+            continue
+        stale = _control_watches.pop(name, None)
+        if stale is not None:
+            logging.warning(f"Firebase {collection} listener is no longer active; re-attaching")
+            try:
+                stale.unsubscribe()
+            except Exception:
+                pass
+        try:
+            def on_snapshot(doc_snapshot, changes, read_time, name=name, handler=handler):
+                for doc in doc_snapshot:
+                    if doc.exists:
+                        control_executor.submit(_run_control, name, handler, doc)
+
+            _control_watches[name] = db.collection(collection).document("status").on_snapshot(on_snapshot)
+            logging.info(f"Listening for real-time {collection}/status updates.")
+        except google.api_core.exceptions.DeadlineExceeded:
+            logging.warning(f"Firestore transaction timeout attaching {collection} listener")
+        except Exception as e:
+            logging.error(f"Error attaching {collection} listener: {str(e)}")
+
+_sync_wakeup = threading.Event()
+
+def _on_connectivity_change(online):
+    if online:
+        # Run the sync pass right away instead of waiting out SYNC_INTERVAL
+        _sync_wakeup.set()
+
+connectivity.subscribe(_on_connectivity_change)
+
 def sync_loop():
-    """Background loop: attach listeners once, poll controls, sync offline txns, and handle image uploads."""
-    # Attach listeners once when online
-    sync_users_from_firebase()
-    sync_blocked_users_from_firebase()
+    """Background loop: attach listeners (re-attach if dead), poll controls only while their listeners are down, sync offline txns, and handle image uploads."""
     while True:
         try:
             if is_internet_available():
                 try:
-                    check_relay_status()
-                    check_user_status()
+                    # Attach listeners once when online (no-op once attached)
+                    sync_users_from_firebase()
+                    reconcile_users_with_firebase()  # no-op until USER_FULL_RESYNC_INTERVAL elapses
+                    watch_control_documents()
+                    if not _control_listener_active("relay"):
+                        check_relay_status()  # fallback poll while the listener is down
+                    if not _control_listener_active("user"):
+                        check_user_status()
                     sync_transactions()
                     enqueue_pending_images(limit=50)  # opportunistic image uploads
                 except Exception as e:
@@ -2191,7 +3155,8 @@ def sync_loop():
             else:
                 logging.debug("No internet connection. Skipping Firebase & image upload sync.")
             sync_interval = int(os.environ.get('SYNC_INTERVAL', 60))
-            time.sleep(sync_interval)
+            _sync_wakeup.wait(sync_interval)
+            _sync_wakeup.clear()
         except Exception as e:
             logging.error(f"Error in sync loop: {str(e)}")
             time.sleep(5)
@@ -2220,6 +3185,38 @@ def cleanup():
             except Exception as e:
                 logging.error(f"Error stopping wiegand2: {str(e)}")
 
+        # Stop RTSP grabbers
+        try:
+            frame_grabbers.stop_all()
+        except Exception as e:
+            logging.error(f"Error stopping frame grabbers: {str(e)}")
+
+        # Persist in-memory daily statistics
+        try:
+            daily_stats.flush()
+        except Exception as e:
+            logging.error(f"Error flushing daily stats: {str(e)}")
+
+        # Flush buffered offline transactions
+        try:
+            transaction_log.close()
+        except Exception as e:
+            logging.error(f"Error closing transaction log: {str(e)}")
+
+        # Close the access journal (entries are replayed on next boot)
+        try:
+            if _access_unsaved.is_set():
+                compact_access_journal()
+            access_journal.close()
+        except Exception as e:
+            logging.error(f"Error closing access journal: {str(e)}")
+
+        # Close the image catalog
+        try:
+            image_catalog.close()
+        except Exception as e:
+            logging.error(f"Error closing image catalog: {str(e)}")
+
         # Cleanup pigpio
         if pi is not None:
             try:
@@ -2228,6 +3225,12 @@ def cleanup():
             except Exception as e:
                 logging.error(f"Error stopping pigpio: {str(e)}")
 
+        # Stop the relay actuator before releasing the pins
+        try:
+            relay_actuator.stop()
+        except Exception as e:
+            logging.error(f"Error stopping relay actuator: {str(e)}")
+
         # Cleanup GPIO
         try:
             GPIO.cleanup()
@@ -2245,11 +3248,8 @@ if pi is not None:
     try:
         print("Readers initialised successfully")
         print(pi)
-        wiegand1 = WiegandDecoder(pi, D0_PIN_1, D1_PIN_1, lambda b, v: handle_access(b, v, 1))
-        wiegand2 = WiegandDecoder(pi, D0_PIN_2, D1_PIN_2, lambda b, v: handle_access(b, v, 2))
-        # Initialize in-memory stores + sets at boot
-        load_local_users()
-        load_blocked_users()
+        wiegand1 = WiegandDecoder(pi, D0_PIN_1, D1_PIN_1, 1, scan_ring)
+        wiegand2 = WiegandDecoder(pi, D0_PIN_2, D1_PIN_2, 2, scan_ring)
         print("Readers initialised successfully")
         logging.info("RFID readers initialized successfully.")
     except Exception as e:
@@ -2260,12 +3260,21 @@ else:
     logging.warning("Pigpio not available. RFID readers will be disabled.")
 
 # Background threads
+threading.Thread(target=connectivity.run, daemon=True).start()
+threading.Thread(target=access_decision_worker, daemon=True).start()
+threading.Thread(target=access_followup_worker, daemon=True).start()
 threading.Thread(target=sync_loop, daemon=True).start()
 threading.Thread(target=transaction_uploader, daemon=True).start()
-threading.Thread(target=image_uploader_worker, daemon=True).start()
+threading.Thread(target=transaction_log.commit_worker, daemon=True).start()
+threading.Thread(target=upload_retries.run, daemon=True).start()
+for _ in range(max(1, UPLOAD_WORKERS)):
+    threading.Thread(target=image_uploader_worker, daemon=True).start()
 threading.Thread(target=session_cleanup_worker, daemon=True).start()
-threading.Thread(target=daily_stats_cleanup_worker, daemon=True).start()
+threading.Thread(target=access_journal_compactor, daemon=True).start()
+threading.Thread(target=daily_stats_flush_worker, daemon=True).start()
+threading.Thread(target=_start_storage_workers, daemon=True).start()
 threading.Thread(target=storage_monitor_worker, daemon=True).start()
+frame_grabbers.start_all()
 
 # Flask serve
 try:
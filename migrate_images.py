@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Image Layout Migration Script
+Moves flat IMAGES_DIR captures (CARD_rN_TS.jpg + .uploaded.json) into the
+YYYY/MM/DD[/rN]/ layout and re-indexes the image catalog.
+Stop the RFID service before running it.
+"""
+
+import os
+import sys
+import argparse
+import logging
+
+from image_catalog import ImageCatalog
+from image_layout import migrate_flat_images
+
+def main():
+    parser = argparse.ArgumentParser(description="Move flat images into the date-sharded layout")
+    parser.add_argument("--images-dir", default=os.environ.get("IMAGES_DIR", "images"))
+    parser.add_argument("--catalog", default=os.path.join(os.environ.get("BASE_DIR", "/home/maxpark"), "image_catalog.db"))
+    parser.add_argument("--by-reader", action="store_true",
+                        default=os.environ.get("IMAGE_SHARD_BY_READER", "false").lower() == "true",
+                        help="add an rN/ level under each day (IMAGE_SHARD_BY_READER)")
+    parser.add_argument("--dry-run", action="store_true", help="only print what would move")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    if not os.path.isdir(args.images_dir):
+        print(f"❌ Images directory not found: {args.images_dir}")
+        sys.exit(1)
+
+    print(f"📁 Migrating images in {args.images_dir}{' (dry run)' if args.dry_run else ''}")
+    moved = migrate_flat_images(args.images_dir, by_reader=args.by_reader, dry_run=args.dry_run)
+    print(f"✅ {'Would move' if args.dry_run else 'Moved'} {moved} image(s)")
+
+    if not args.dry_run:
+        thumbnails_dir = os.environ.get("THUMBNAIL_DIR", os.path.join(args.images_dir, ".thumbnails"))
+        catalog = ImageCatalog(args.catalog)
+        count = catalog.rebuild(args.images_dir, skip_dirs=[thumbnails_dir])
+        catalog.close()
+        print(f"📋 Image catalog re-indexed: {count} image(s)")
+
+if __name__ == "__main__":
+    main()
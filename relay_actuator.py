@@ -0,0 +1,245 @@
+import time
+import threading
+import logging
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+# Per-relay states
+NORMAL = "normal"          # idle (closed), RFID grants pulse it
+PULSING = "pulsing"        # open until the pulse timer fires
+OPEN_HOLD = "open_hold"    # held open, grants ignored
+CLOSE_HOLD = "close_hold"  # held closed, grants ignored
+
+COMMANDS = ("open_hold", "close_hold", "normal", "normal_rfid")
+
+
+class TimerWheel:
+    """
+    Hashed timing wheel: schedule/cancel are O(1) and each tick only looks at one
+    slot. Handles are [deadline, callback, cancelled]; entries more than one
+    revolution out stay in their slot until their deadline passes.
+    """
+
+    def __init__(self, tick: float = 0.005, slots: int = 256):
+        self.tick = tick
+        self._slots: List[list] = [[] for _ in range(slots)]
+        self._live: Dict[int, list] = {}
+        self._cursor = int(time.monotonic() / tick)
+
+    def schedule(self, deadline: float, callback: Callable[[float], None]) -> list:
+        handle = [deadline, callback, False]
+        self._slots[int(deadline / self.tick) % len(self._slots)].append(handle)
+        self._live[id(handle)] = handle
+        return handle
+
+    def cancel(self, handle: Optional[list]) -> None:
+        if handle is not None and not handle[2]:
+            handle[2] = True
+            self._live.pop(id(handle), None)
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    def next_deadline(self) -> Optional[float]:
+        return min((h[0] for h in self._live.values()), default=None)
+
+    def advance(self, now: float) -> List[list]:
+        """Pop every live handle whose deadline has passed, in deadline order."""
+        target = int(now / self.tick)
+        n = len(self._slots)
+        indexes = range(n) if target - self._cursor >= n else (i % n for i in range(self._cursor, target + 1))
+        due = []
+        for i in indexes:
+            keep = []
+            for h in self._slots[i]:
+                if h[2]:
+                    continue
+                if h[0] <= now:
+                    due.append(h)
+                    self._live.pop(id(h), None)
+                else:
+                    keep.append(h)
+            self._slots[i] = keep
+        self._cursor = target
+        due.sort(key=lambda h: h[0])
+        return due
+
+
+class JitterStats:
+    """Rolling lateness samples (seconds in, milliseconds out). Recorded on the actuator thread, read by the API."""
+
+    def __init__(self, window: int = 256):
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=window)
+        self.count = 0
+        self.max = 0.0
+
+    def record(self, late: float) -> None:
+        late = max(0.0, late)
+        with self._lock:
+            self._samples.append(late)
+            self.count += 1
+            self.max = max(self.max, late)
+
+    def snapshot(self) -> Optional[dict]:
+        with self._lock:
+            samples, count, worst = list(self._samples), self.count, self.max
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        return {
+            "count": count,
+            "avg_ms": round(sum(ordered) * 1000 / len(ordered), 3),
+            "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+            "max_ms": round(worst * 1000, 3)
+        }
+
+
+class RelayActuator:
+    """
+    One thread drives every relay. Each relay runs a small state machine
+    (normal, pulsing, open-hold, close-hold); pulse releases are timers on a
+    TimerWheel instead of a thread or sleep per pulse. A pulse that arrives while
+    the relay is already pulsing extends the open time rather than re-driving it.
+    `write(pin, is_open)` performs the GPIO output.
+    Jitter is reported as command latency (request to GPIO write) and release
+    lateness (timer deadline to GPIO write).
+    """
+
+    def __init__(self, relays: Dict[int, float], write: Callable[[int, bool], None], tick: float = 0.005):
+        self.logger = logging.getLogger(__name__)
+        self.write = write
+        self.pulse_width = dict(relays)  # pin -> seconds
+        self.state = {pin: NORMAL for pin in relays}
+        self._release = {pin: None for pin in relays}
+        self._wheel = TimerWheel(tick)
+        self._commands = deque()
+        self._cond = threading.Condition()
+        self._stop = False
+        self._thread = None
+        self.pulses = {pin: 0 for pin in relays}
+        self.coalesced = {pin: 0 for pin in relays}
+        self.command_latency = {pin: JitterStats() for pin in relays}
+        self.release_jitter = {pin: JitterStats() for pin in relays}
+
+    # ---------- callers (any thread) ----------
+    def pulse(self, pin: int, on_driven: Optional[Callable[[], None]] = None) -> bool:
+        """Grant pulse; returns False if the relay is held (open or closed) and the grant is ignored."""
+        if self.state.get(pin) in (OPEN_HOLD, CLOSE_HOLD):
+            return False
+        self._submit(("pulse", pin, time.monotonic(), on_driven))
+        return True
+
+    def command(self, action: str, pin: int) -> bool:
+        """Remote/API relay action: open_hold, close_hold, normal or normal_rfid."""
+        if action not in COMMANDS or pin not in self.state:
+            self.logger.warning(f"Invalid relay action received: {action}")
+            return False
+        self._submit((action, pin, time.monotonic(), None))
+        return True
+
+    def _submit(self, cmd) -> None:
+        with self._cond:
+            self._commands.append(cmd)
+            self._cond.notify()
+
+    # ---------- actuator thread ----------
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name="relay-actuator", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+
+    def run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._commands and not self._stop:
+                    deadline = self._wheel.next_deadline()
+                    timeout = None if deadline is None else deadline - time.monotonic()
+                    if timeout is not None and timeout <= 0:
+                        break
+                    self._cond.wait(timeout)
+                if self._stop:
+                    return
+                commands = list(self._commands)
+                self._commands.clear()
+            for cmd in commands:
+                try:
+                    self._apply(*cmd)
+                except Exception as e:
+                    self.logger.error(f"Relay command {cmd[0]} on {cmd[1]} failed: {e}")
+            for handle in self._wheel.advance(time.monotonic()):
+                try:
+                    handle[1](handle[0])
+                except Exception as e:
+                    self.logger.error(f"Relay timer error: {e}")
+
+    def _drive(self, pin: int, is_open: bool, requested_at: float) -> None:
+        self.write(pin, is_open)
+        self.command_latency[pin].record(time.monotonic() - requested_at)
+
+    def _apply(self, action: str, pin: int, requested_at: float, on_driven) -> None:
+        state = self.state[pin]
+        if action == "normal_rfid":
+            # Remote pulse: leave any hold, then pulse like a grant
+            if state in (OPEN_HOLD, CLOSE_HOLD):
+                self.state[pin] = state = NORMAL
+            action = "pulse"
+
+        if action == "pulse":
+            if state in (OPEN_HOLD, CLOSE_HOLD):
+                return
+            deadline = time.monotonic() + self.pulse_width[pin]
+            if state == PULSING:
+                # Already open: push the release out instead of re-driving the output
+                self._wheel.cancel(self._release[pin])
+                self.coalesced[pin] += 1
+            else:
+                self._drive(pin, True, requested_at)
+                self.state[pin] = PULSING
+                self.pulses[pin] += 1
+                if on_driven is not None:
+                    on_driven()
+            self._release[pin] = self._wheel.schedule(deadline, lambda due, pin=pin: self._end_pulse(pin, due))
+            return
+
+        self._wheel.cancel(self._release[pin])
+        self._release[pin] = None
+        if action == "open_hold":
+            self._drive(pin, True, requested_at)
+            self.state[pin] = OPEN_HOLD
+            self.logger.info(f"Relay {pin} opened (hold)")
+        elif action == "close_hold":
+            self._drive(pin, False, requested_at)
+            self.state[pin] = CLOSE_HOLD
+            self.logger.info(f"Relay {pin} closed (hold)")
+        elif action == "normal":
+            self._drive(pin, False, requested_at)
+            self.state[pin] = NORMAL
+            self.logger.info(f"Relay {pin} set to normal mode")
+
+    def _end_pulse(self, pin: int, due: float) -> None:
+        self._release[pin] = None
+        if self.state[pin] != PULSING:
+            return
+        self.write(pin, False)
+        self.release_jitter[pin].record(time.monotonic() - due)
+        self.state[pin] = NORMAL
+        self.logger.info(f"Relay {pin} pulsed (normal RFID)")
+
+    def stats(self) -> dict:
+        return {
+            str(pin): {
+                "state": self.state[pin],
+                "pulse_seconds": self.pulse_width[pin],
+                "pulses": self.pulses[pin],
+                "coalesced": self.coalesced[pin],
+                "command_latency": self.command_latency[pin].snapshot(),
+                "release_jitter": self.release_jitter[pin].snapshot()
+            }
+            for pin in self.state
+        }
@@ -0,0 +1,135 @@
+"""Unit tests for the immutable access snapshot store (run with pytest)."""
+
+import access_store
+from access_store import EMPTY_SNAPSHOT, AccessStore, MutationJournal
+
+
+def _store(users=None, blocked=None):
+    store = AccessStore()
+    store.replace_all(users or {}, blocked or {})
+    return store
+
+
+def test_empty_store_denies():
+    store = AccessStore()
+    assert store.snapshot is EMPTY_SNAPSHOT
+    assert store.snapshot.decide(1234) == ("Access Denied", "Unknown")
+
+
+def test_replace_all_builds_sets_and_counts():
+    store = _store({"1001": {"name": "Ann"}, "1002": {"name": "Bob"}, "bad": {"name": "X"}},
+                   {"1002": True, "1003": False})
+    snap = store.snapshot
+    assert snap.allowed == frozenset({1001, 1002})
+    assert snap.blocked == frozenset({1002})
+    assert (snap.allowed_count, snap.blocked_count) == (2, 1)
+    assert snap.decide(1001) == ("Access Granted", "Ann")
+    assert snap.decide(1002) == ("Blocked", "Blocked User")
+    assert snap.decide(1003) == ("Access Denied", "Unknown")
+
+
+def test_published_snapshot_is_never_mutated():
+    store = _store({"1001": {"name": "Ann"}})
+    before = store.snapshot
+    store.replace_all({"2002": {"name": "Cy"}}, {})
+    assert before.decide(1001) == ("Access Granted", "Ann")
+    assert store.snapshot.decide(1001) == ("Access Denied", "Unknown")
+    assert store.snapshot.version == before.version + 1
+
+
+# ---------- single-card mutations (overrides) ----------
+def test_apply_layers_override_and_updates_counts():
+    store = _store({"1001": {"name": "Ann"}})
+    base = store.snapshot
+    store.apply({"op": "add_user", "card": "1002", "user": {"name": "Bob"}})
+    store.apply({"op": "block", "card": "1001"})
+    snap = store.snapshot
+    assert snap.allowed is base.allowed  # base sets reused, change lives in the overlay
+    assert set(snap.overrides) == {1001, 1002}
+    assert (snap.allowed_count, snap.blocked_count) == (2, 1)
+    assert snap.decide(1002) == ("Access Granted", "Bob")
+    assert snap.decide(1001) == ("Blocked", "Blocked User")
+
+    store.apply({"op": "delete_user", "card": "1002"})
+    store.apply({"op": "unblock", "card": "1001"})
+    snap = store.snapshot
+    assert (snap.allowed_count, snap.blocked_count) == (1, 0)
+    assert snap.decide(1002) == ("Access Denied", "Unknown")
+    assert snap.decide(1001) == ("Access Granted", "Ann")
+
+
+def test_apply_without_effect_keeps_snapshot():
+    store = _store({"1001": {"name": "Ann"}})
+    snap = store.snapshot
+    assert store.apply({"op": "unblock", "card": "1001"}) is snap
+    assert store.apply({"op": "delete_user", "card": "9999"}) is snap
+
+
+def test_overlay_limit_folds_into_base_sets(monkeypatch):
+    monkeypatch.setattr(access_store, "OVERLAY_LIMIT", 3)
+    store = _store()
+    for i in range(3):
+        store.apply({"op": "add_user", "card": str(100 + i), "user": {"name": f"U{i}"}})
+    assert len(store.snapshot.overrides) == 3
+    store.apply({"op": "add_user", "card": "200", "user": {"name": "Z"}})
+    snap = store.snapshot
+    assert not snap.overrides
+    assert snap.allowed == frozenset({100, 101, 102, 200})
+    assert snap.allowed_count == 4
+
+
+def test_apply_batch_publishes_once():
+    store = _store({"1001": {"name": "Ann"}})
+    version = store.snapshot.version
+    store.apply_batch([
+        {"op": "add_user", "card": "1002", "user": {"name": "Bob"}},
+        {"op": "block", "card": "1002"},
+        {"op": "add_user", "card": "1003", "user": {"name": "Cy"}},
+        {"op": "delete_user", "card": "1001"},
+    ])
+    snap = store.snapshot
+    assert snap.version == version + 1
+    assert (snap.allowed_count, snap.blocked_count) == (2, 1)
+    assert snap.decide(1002) == ("Blocked", "Blocked User")
+    assert snap.decide(1003) == ("Access Granted", "Cy")
+    assert snap.decide(1001) == ("Access Denied", "Unknown")
+
+
+def test_apply_batch_without_changes_keeps_snapshot():
+    store = _store({"1001": {"name": "Ann"}})
+    snap = store.snapshot
+    assert store.apply_batch([{"op": "add_user", "card": "1001", "user": {"name": "Ann"}}]) is snap
+
+
+def test_large_apply_batch_rebuilds(monkeypatch):
+    monkeypatch.setattr(access_store, "OVERLAY_LIMIT", 4)
+    store = _store({"1": {"name": "A"}})
+    store.apply_batch([{"op": "add_user", "card": str(i), "user": {"name": str(i)}} for i in range(2, 7)]
+                      + [{"op": "block", "card": "1"}])
+    snap = store.snapshot
+    assert not snap.overrides
+    assert snap.allowed == frozenset(range(1, 7))
+    assert (snap.allowed_count, snap.blocked_count) == (6, 1)
+
+
+# ---------- journal ----------
+def test_journal_replay_and_compaction(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = MutationJournal(path)
+    journal.append({"op": "block", "card": "1"})
+    journal.extend([{"op": "add_user", "card": "2", "user": {}}, {"op": "unblock", "card": "1"}])
+    assert journal.count == 3
+
+    journal.rotate()
+    journal.append({"op": "delete_user", "card": "2"})
+    # A crash before finish_compaction() replays the rotated records first
+    ops = [r["op"] for r in MutationJournal(path).replay()]
+    assert ops == ["block", "add_user", "unblock", "delete_user"]
+
+    journal.finish_compaction()
+    journal.close()
+    with open(path, "a") as f:
+        f.write('{"op":"blo')  # torn tail
+    reopened = MutationJournal(path)
+    assert [r["op"] for r in reopened.replay()] == ["delete_user"]
+    assert reopened.count == 1
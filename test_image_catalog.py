@@ -0,0 +1,186 @@
+"""Unit tests for the SQLite image catalog (run with pytest)."""
+
+import pytest
+
+from image_catalog import ImageCatalog, decode_cursor, encode_cursor, parse_image_name
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    cat = ImageCatalog(str(tmp_path / "catalog.db"))
+    yield cat
+    cat.close()
+
+
+def _add(cat, card, reader, ts, uploaded=False, status=None, tag=""):
+    name = f"{card}_r{reader}_{ts}{tag}.jpg"
+    cat.add(name, name, 100, uploaded=uploaded, status=status)
+    return name
+
+
+def _all_pages(cat, limit, **filters):
+    names, cursor, pages = [], None, 0
+    while True:
+        rows, cursor = cat.page(limit, cursor, **filters)
+        names += [r["filename"] for r in rows]
+        pages += 1
+        if cursor is None:
+            return names, pages
+        # Cursors travel through the API as opaque tokens
+        cursor = decode_cursor(encode_cursor(cursor))
+
+
+def test_parse_image_name():
+    assert parse_image_name("1234_r2_1700000000.jpg") == ("1234", 2, 1700000000)
+    assert parse_image_name("1234_r1_1700000000_b1.jpg") == ("1234", 1, 1700000000)
+    assert parse_image_name("1234_1700000000.jpg") == ("1234", 1, 1700000000)
+    assert parse_image_name("garbage.jpg", 42) == ("unknown", 1, 42)
+
+
+def test_decode_cursor_rejects_garbage():
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+# ---------- keyset pagination ----------
+def test_cursor_continuation_visits_every_row_once(catalog):
+    # Several rows share a timestamp, so the filename tie-break matters
+    expected = [_add(catalog, 1000 + i, 1, 1700000000 + i // 3) for i in range(10)]
+
+    names, pages = _all_pages(catalog, 3)
+    assert pages == 4
+    assert len(names) == len(set(names)) == 10
+    assert names == sorted(expected, key=lambda n: (parse_image_name(n)[2], n), reverse=True)
+
+    oldest, _ = _all_pages(catalog, 4, newest_first=False)
+    assert oldest == list(reversed(names))
+
+
+def test_rows_added_between_pages_do_not_shift_the_cursor(catalog):
+    for i in range(4):
+        _add(catalog, 1000 + i, 1, 1700000000 + i)
+    rows, cursor = catalog.page(2)
+    _add(catalog, 9999, 1, 1800000000)  # newer than anything on page one
+    rest, cursor = catalog.page(2, cursor)
+    assert [r["card"] for r in rows + rest] == ["1003", "1002", "1001", "1000"]
+    assert cursor is None
+
+
+def test_last_page_has_no_cursor(catalog):
+    _add(catalog, 1, 1, 1)
+    rows, cursor = catalog.page(1)
+    assert len(rows) == 1 and cursor is None
+
+
+# ---------- filters ----------
+def test_card_filter_is_a_prefix_range(catalog):
+    for card in ("123", "1234", "1239", "124", "9123", "12"):
+        _add(catalog, card, 1, 1700000000)
+    rows, _ = catalog.page(10, card="123")
+    assert sorted(r["card"] for r in rows) == ["123", "1234", "1239"]
+    rows, _ = catalog.page(10, card="12")
+    assert sorted(r["card"] for r in rows) == ["12", "123", "1234", "1239", "124"]
+    rows, _ = catalog.page(10, card="9")
+    assert [r["card"] for r in rows] == ["9123"]
+
+
+def test_card_filter_uses_card_index(catalog):
+    plan = catalog._conn.execute("EXPLAIN QUERY PLAN SELECT * FROM images WHERE card >= ? AND card < ?",
+                                 ("12", "13")).fetchall()
+    assert any("images_card_ts" in row[3] for row in plan)
+
+
+def test_reader_time_and_upload_filters(catalog):
+    _add(catalog, 1, 1, 100, uploaded=True)
+    _add(catalog, 2, 2, 200)
+    _add(catalog, 3, 1, 300)
+    _add(catalog, 4, 2, 400, uploaded=True)
+
+    def cards(**filters):
+        return [r["card"] for r in catalog.page(10, **filters)[0]]
+
+    assert cards(reader=2) == ["4", "2"]
+    assert cards(since=200, until=400) == ["3", "2"]
+    assert cards(uploaded=True) == ["4", "1"]
+    assert cards(uploaded=False, reader=1) == ["3"]
+
+
+def test_pending_orders_by_status_and_skips_dead(catalog):
+    _add(catalog, 1, 1, 100, status=None)
+    _add(catalog, 2, 1, 200, status="denied")
+    _add(catalog, 3, 1, 300, status="granted")
+    _add(catalog, 4, 1, 400, status="granted")
+    _add(catalog, 5, 1, 500, status="blocked", uploaded=True)
+    dead = _add(catalog, 6, 1, 50, status="granted")
+    catalog.mark_dead(dead, "HTTP 413", 1)
+
+    assert [r["card"] for r in catalog.pending(10)] == ["3", "4", "2", "1"]
+    assert [r["card"] for r in catalog.pending(10, newest_first=True)] == ["4", "3", "2", "1"]
+    assert [r["card"] for r in catalog.pending(2)] == ["3", "4"]
+
+    assert [r["filename"] for r in catalog.requeue_dead([dead])] == [dead]
+    assert catalog.pending(1)[0]["filename"] == dead
+
+
+# ---------- rebuild from disk ----------
+def _touch(path, data=b"jpeg"):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return path
+
+
+def test_rebuild_indexes_disk_and_reads_sidecars(tmp_path):
+    images = tmp_path / "images"
+    _touch(images / "2023/11/14/1001_r1_1700000000.jpg")
+    uploaded = _touch(images / "2023/11/14/1002_r2_1700000100.jpg", b"x" * 10)
+    (images / "2023/11/14/1002_r2_1700000100.jpg.uploaded.json").write_text(
+        '{"uploaded_at": 1700000200, "s3_location": "s3://bucket/1002"}')
+    _touch(images / ".thumbs/1001_r1_1700000000.jpg")  # dot-dirs are skipped
+    _touch(images / "skip/1003_r1_1700000300.jpg")
+    cat = ImageCatalog(str(tmp_path / "catalog.db"))
+
+    assert cat.rebuild(str(images), skip_dirs=[str(images / "skip")]) == 2
+    row = cat.get(uploaded.name)
+    assert row["uploaded"] == 1 and row["s3_location"] == "s3://bucket/1002"
+    assert row["path"] == "2023/11/14/1002_r2_1700000100.jpg"
+    assert cat.totals() == {"count": 2, "bytes": 14, "uploaded": 1, "pending": 1, "dead": 0, "pending_bytes": 4}
+    cat.close()
+
+
+def test_rebuild_keeps_catalog_only_fields_and_concurrent_adds(tmp_path):
+    images = tmp_path / "images"
+    _touch(images / "1001_r1_1700000000.jpg")
+    gone = _touch(images / "1002_r1_1700000100.jpg")
+    cat = ImageCatalog(str(tmp_path / "catalog.db"))
+    cat.add("1001_r1_1700000000.jpg", "1001_r1_1700000000.jpg", 4, status="denied")
+    cat.mark_dead("1001_r1_1700000000.jpg", "HTTP 413", 5)
+    cat.rebuild(str(images))
+
+    # A capture the walk did not see (simulated with a skipped dir) must survive while its file exists
+    _touch(images / "late/1003_r1_1700000200.jpg")
+    cat.add("1003_r1_1700000200.jpg", "late/1003_r1_1700000200.jpg", 4, status="granted")
+    gone.unlink()
+    cat.rebuild(str(images), skip_dirs=[str(images / "late")])
+
+    kept = cat.get("1001_r1_1700000000.jpg")
+    assert (kept["status"], kept["dead_at"], kept["last_error"]) == ("denied", 5, "HTTP 413")
+    assert cat.get("1003_r1_1700000200.jpg")["status"] == "granted"
+    assert cat.get("1002_r1_1700000100.jpg") is None
+    cat.close()
+
+
+def test_remove_under_drops_a_day(catalog):
+    catalog.add("1_r1_1.jpg", "2023/11/14/1_r1_1.jpg", 10)
+    catalog.add("2_r1_2.jpg", "2023/11/15/2_r1_2.jpg", 20)
+    assert catalog.remove_under("2023/11/14") == [("1_r1_1.jpg", 10)]
+    assert catalog.totals()["count"] == 1
+
+
+def test_rebuild_skip_dirs_match_resolved_paths(tmp_path):
+    images = tmp_path / "images"
+    _touch(images / "1001_r1_1700000000.jpg")
+    _touch(images / "thumbs/1001_r1_1700000000.jpg")
+    cat = ImageCatalog(str(tmp_path / "catalog.db"))
+    # Trailing slash and a relative hop must still name the same directory
+    assert cat.rebuild(str(images), skip_dirs=[str(images / "x" / ".." / "thumbs") + "/"]) == 1
+    cat.close()
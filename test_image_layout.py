@@ -0,0 +1,81 @@
+"""Unit tests for the date-sharded image layout and flat-archive migration (run with pytest)."""
+
+import os
+import time
+from datetime import date
+
+from image_layout import image_relpath, iter_day_dirs, migrate_flat_images, remove_day_dir, resolve_image
+
+TS = 1700000000
+DAY = time.strftime("%Y/%m/%d", time.localtime(TS))
+
+
+def _touch(path, data=b"jpeg"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def test_image_relpath_uses_name_timestamp():
+    name = f"1234_r2_{TS}.jpg"
+    assert image_relpath(name) == os.path.join(DAY, name)
+    assert image_relpath(name, by_reader=True) == os.path.join(DAY, "r2", name)
+    # No timestamp in the name: the fallback decides the day
+    assert image_relpath("odd.jpg", fallback_ts=TS) == os.path.join(DAY, "odd.jpg")
+
+
+def test_resolve_image_tries_both_layouts_then_flat(tmp_path):
+    root = str(tmp_path)
+    sharded = f"1_r1_{TS}.jpg"
+    by_reader = f"2_r2_{TS}.jpg"
+    flat = f"3_r1_{TS}.jpg"
+    _touch(os.path.join(root, DAY, sharded))
+    _touch(os.path.join(root, DAY, "r2", by_reader))
+    _touch(os.path.join(root, flat))
+
+    assert resolve_image(root, sharded, by_reader=True) == os.path.join(root, DAY, sharded)
+    assert resolve_image(root, by_reader) == os.path.join(root, DAY, "r2", by_reader)
+    assert resolve_image(root, flat) == os.path.join(root, flat)
+    assert resolve_image(root, f"4_r1_{TS}.jpg") is None
+
+
+def test_migrate_flat_images_moves_images_with_sidecars(tmp_path):
+    root = str(tmp_path)
+    name = f"1_r2_{TS}.jpg"
+    _touch(os.path.join(root, name))
+    _touch(os.path.join(root, name + ".uploaded.json"), b"{}")
+    _touch(os.path.join(root, "notes.txt"))
+    _touch(os.path.join(root, DAY, f"5_r1_{TS}.jpg"))  # already sharded, left alone
+
+    assert migrate_flat_images(root, dry_run=True) == 1
+    assert os.path.exists(os.path.join(root, name))
+
+    assert migrate_flat_images(root, by_reader=True) == 1
+    dst = os.path.join(root, DAY, "r2", name)
+    assert os.path.isfile(dst) and os.path.isfile(dst + ".uploaded.json")
+    assert not os.path.exists(os.path.join(root, name))
+    assert os.path.exists(os.path.join(root, "notes.txt"))
+    assert migrate_flat_images(root) == 0  # idempotent
+
+
+def test_migrate_unparseable_name_uses_mtime(tmp_path):
+    root = str(tmp_path)
+    path = _touch(os.path.join(root, "legacy.jpg"))
+    os.utime(path, (TS, TS))
+    assert migrate_flat_images(root) == 1
+    assert os.path.isfile(os.path.join(root, DAY, "legacy.jpg"))
+
+
+def test_iter_day_dirs_oldest_first_and_remove(tmp_path):
+    root = str(tmp_path)
+    for day in ("2024/01/02", "2023/12/31", "2024/01/01", "2024/13/01"):
+        _touch(os.path.join(root, day, "x.jpg"))
+    os.makedirs(os.path.join(root, "thumbs"))
+
+    days = list(iter_day_dirs(root))
+    assert [d for d, _ in days] == [date(2023, 12, 31), date(2024, 1, 1), date(2024, 1, 2)]
+
+    remove_day_dir(days[0][1])
+    assert not os.path.exists(os.path.join(root, "2023"))  # empty month/year pruned
+    assert [d for d, _ in iter_day_dirs(root)] == [date(2024, 1, 1), date(2024, 1, 2)]
@@ -0,0 +1,174 @@
+"""Unit tests for the relay actuator state machine and timer wheel (run with pytest)."""
+
+import threading
+import time
+
+from relay_actuator import CLOSE_HOLD, NORMAL, OPEN_HOLD, PULSING, RelayActuator, TimerWheel
+
+PIN = 25
+
+
+def _actuator(width=0.05):
+    writes = []
+    act = RelayActuator({PIN: width}, lambda pin, is_open: writes.append((pin, is_open)))
+    return act, writes
+
+
+def _release_due(act, after):
+    """Fire the actuator's timers as if `after` seconds had passed."""
+    for handle in act._wheel.advance(time.monotonic() + after):
+        handle[1](handle[0])
+
+
+# ---------- state machine (driven synchronously) ----------
+def test_pulse_opens_then_releases():
+    act, writes = _actuator()
+    act._apply("pulse", PIN, time.monotonic(), None)
+    assert act.state[PIN] == PULSING
+    assert writes == [(PIN, True)]
+
+    _release_due(act, 1)
+    assert act.state[PIN] == NORMAL
+    assert writes == [(PIN, True), (PIN, False)]
+    assert act.stats()[str(PIN)]["pulses"] == 1
+
+
+def test_pulse_while_pulsing_is_coalesced():
+    act, writes = _actuator()
+    driven = []
+    act._apply("pulse", PIN, time.monotonic(), lambda: driven.append(1))
+    first_release = act._release[PIN]
+    act._apply("pulse", PIN, time.monotonic(), lambda: driven.append(2))
+
+    assert writes == [(PIN, True)]  # not re-driven
+    assert driven == [1]
+    assert first_release[2]  # old release cancelled, a later one scheduled
+    assert act._release[PIN] is not first_release
+    assert act.coalesced[PIN] == 1
+    assert len(act._wheel) == 1
+
+    _release_due(act, 1)
+    assert writes == [(PIN, True), (PIN, False)]
+
+
+def test_holds_ignore_grants():
+    act, writes = _actuator()
+    act._apply("open_hold", PIN, time.monotonic(), None)
+    assert act.state[PIN] == OPEN_HOLD
+    assert not act.pulse(PIN)
+
+    act._apply("close_hold", PIN, time.monotonic(), None)
+    assert act.state[PIN] == CLOSE_HOLD
+    assert not act.pulse(PIN)
+    assert writes == [(PIN, True), (PIN, False)]
+
+
+def test_hold_cancels_running_pulse():
+    act, writes = _actuator()
+    act._apply("pulse", PIN, time.monotonic(), None)
+    act._apply("open_hold", PIN, time.monotonic(), None)
+    _release_due(act, 1)
+    assert act.state[PIN] == OPEN_HOLD
+    assert writes == [(PIN, True), (PIN, True)]  # the pulse release never closes a hold
+
+
+def test_normal_rfid_leaves_hold_and_pulses():
+    act, writes = _actuator()
+    act._apply("close_hold", PIN, time.monotonic(), None)
+    act._apply("normal_rfid", PIN, time.monotonic(), None)
+    assert act.state[PIN] == PULSING
+    _release_due(act, 1)
+    assert act.state[PIN] == NORMAL
+    assert writes == [(PIN, False), (PIN, True), (PIN, False)]
+
+
+def test_normal_rfid_while_pulsing_extends_pulse():
+    act, writes = _actuator()
+    act._apply("pulse", PIN, time.monotonic(), None)
+    act._apply("normal_rfid", PIN, time.monotonic(), None)
+    assert writes == [(PIN, True)]
+    assert act.coalesced[PIN] == 1
+
+
+def test_normal_closes_and_returns_to_normal():
+    act, writes = _actuator()
+    act._apply("open_hold", PIN, time.monotonic(), None)
+    act._apply("normal", PIN, time.monotonic(), None)
+    assert act.state[PIN] == NORMAL
+    assert writes[-1] == (PIN, False)
+    assert act.pulse(PIN)
+
+
+def test_invalid_commands_are_rejected():
+    act, _ = _actuator()
+    assert not act.command("explode", PIN)
+    assert not act.command("open_hold", 99)
+    assert act.command("open_hold", PIN)
+
+
+# ---------- actuator thread ----------
+def test_thread_drives_pulse_end_to_end():
+    closed = threading.Event()
+    writes = []
+
+    def write(pin, is_open):
+        writes.append(is_open)
+        if not is_open:
+            closed.set()
+
+    act = RelayActuator({PIN: 0.02}, write)
+    act.start()
+    try:
+        assert act.pulse(PIN)
+        assert closed.wait(2)
+        assert writes == [True, False]
+        stats = act.stats()[str(PIN)]
+        assert stats["command_latency"]["count"] == 1
+        assert stats["release_jitter"]["count"] == 1
+    finally:
+        act.stop()
+
+
+def test_stats_while_actuator_is_pulsing():
+    act = RelayActuator({PIN: 0.001}, lambda pin, is_open: None)
+    act.start()
+    errors = []
+    stop = threading.Event()
+
+    def poll():
+        while not stop.is_set():
+            try:
+                act.stats()
+            except Exception as e:  # e.g. "deque mutated during iteration"
+                errors.append(e)
+
+    reader = threading.Thread(target=poll)
+    reader.start()
+    try:
+        for _ in range(2000):
+            act.pulse(PIN)
+        deadline = time.monotonic() + 2
+        while act.state[PIN] != NORMAL and time.monotonic() < deadline:
+            time.sleep(0.005)
+    finally:
+        stop.set()
+        reader.join()
+        act.stop()
+    assert not errors
+    assert act.stats()[str(PIN)]["command_latency"]["count"] >= 1
+
+
+# ---------- timer wheel ----------
+def test_timer_wheel_orders_and_cancels():
+    wheel = TimerWheel(tick=0.01, slots=8)
+    now = time.monotonic()
+    late = wheel.schedule(now + 0.5, lambda due: None)  # more than one revolution out
+    early = wheel.schedule(now + 0.02, lambda due: None)
+    cancelled = wheel.schedule(now + 0.03, lambda due: None)
+    wheel.cancel(cancelled)
+    assert len(wheel) == 2
+    assert wheel.next_deadline() == early[0]
+
+    assert wheel.advance(now + 0.1) == [early]
+    assert wheel.advance(now + 1) == [late]
+    assert len(wheel) == 0
@@ -0,0 +1,128 @@
+"""Unit tests for upload scheduling: priority queue, retry scheduler, token bucket (run with pytest)."""
+
+import threading
+import time
+
+from upload_queue import PRIORITY_LIVE, RetryScheduler, TokenBucket, UploadQueue, backlog_priority
+
+
+# ---------- UploadQueue ----------
+def test_put_dedupes_queued_and_inflight_paths():
+    q = UploadQueue()
+    assert q.put("a.jpg")
+    assert not q.put("a.jpg")
+    assert q.get() == "a.jpg"
+    assert "a.jpg" in q
+    assert not q.put("a.jpg")  # still in flight
+    q.task_done("a.jpg")
+    assert "a.jpg" not in q
+    assert q.put("a.jpg")
+    stats = q.stats()
+    assert stats["duplicates_skipped"] == 2
+    assert stats["enqueued"] == 2
+
+
+def test_priority_classes_then_capture_time():
+    q = UploadQueue(newest_first=True)
+    q.put("old_denied.jpg", backlog_priority("denied"), ts=100)
+    q.put("old_granted.jpg", backlog_priority("granted"), ts=100)
+    q.put("new_granted.jpg", backlog_priority("granted"), ts=200)
+    q.put("unknown.jpg", backlog_priority(None), ts=300)
+    q.put("live.jpg", PRIORITY_LIVE, ts=50)
+    order = [q.get() for _ in range(5)]
+    assert order == ["live.jpg", "new_granted.jpg", "old_granted.jpg", "old_denied.jpg", "unknown.jpg"]
+
+
+def test_oldest_first_order():
+    q = UploadQueue(newest_first=False)
+    q.put("b.jpg", 1, ts=2)
+    q.put("a.jpg", 1, ts=1)
+    assert [q.get(), q.get()] == ["a.jpg", "b.jpg"]
+
+
+def test_stats_count_by_class():
+    q = UploadQueue()
+    q.put("live.jpg")
+    q.put("blocked.jpg", backlog_priority("blocked"), ts=1)
+    by_class = q.stats()["by_class"]
+    assert by_class["live"] == 1 and by_class["blocked"] == 1 and by_class["granted"] == 0
+
+
+# ---------- RetryScheduler ----------
+def test_budget_dead_letters_with_last_error():
+    dead = []
+    rs = RetryScheduler(lambda path: None, base_delay=0.01, budget=3,
+                        on_dead=lambda path, attempts, error: dead.append((path, attempts, error)))
+    assert rs.failed("a.jpg", "timeout")
+    assert rs.failed("a.jpg")
+    assert rs.is_waiting("a.jpg")
+    assert not rs.failed("a.jpg")
+    assert dead == [("a.jpg", 3, "timeout")]
+    assert not rs.is_waiting("a.jpg")
+    assert rs.stats()["dead_lettered"] == 1
+
+
+def test_uncounted_failures_do_not_spend_budget():
+    dead = []
+    rs = RetryScheduler(lambda path: None, base_delay=0.01, budget=2,
+                        on_dead=lambda *args: dead.append(args))
+    for _ in range(5):
+        assert rs.failed("a.jpg", "offline", count=False)
+    assert not dead
+    assert rs.waiting()[0]["attempts"] == 0
+
+
+def test_permanent_failure_dead_letters_at_once():
+    dead = []
+    rs = RetryScheduler(lambda path: None, budget=8, on_dead=lambda *args: dead.append(args))
+    assert not rs.failed("big.jpg", "too large", permanent=True)
+    assert dead == [("big.jpg", 1, "too large")]
+
+
+def test_success_and_discard_forget_attempts():
+    rs = RetryScheduler(lambda path: None, base_delay=0.01, budget=2)
+    rs.failed("a.jpg")
+    rs.succeeded("a.jpg")
+    assert rs.waiting_count() == 0
+    assert rs.failed("a.jpg")  # budget starts over
+    rs.discard("a.jpg")
+    assert not rs.is_waiting("a.jpg")
+
+
+def test_backoff_is_capped():
+    rs = RetryScheduler(lambda path: None, base_delay=1, max_delay=2, budget=10)
+    for _ in range(6):
+        rs.failed("a.jpg")
+    assert rs.waiting()[0]["retry_in"] <= 2
+
+
+def test_run_requeues_due_items():
+    requeued = []
+    done = threading.Event()
+
+    def requeue(path):
+        requeued.append(path)
+        done.set()
+
+    rs = RetryScheduler(requeue, base_delay=0.01, budget=3)
+    threading.Thread(target=rs.run, daemon=True).start()
+    rs.failed("a.jpg")
+    assert done.wait(2)
+    assert requeued == ["a.jpg"]
+    assert not rs.is_waiting("a.jpg")
+
+
+# ---------- TokenBucket ----------
+def test_disabled_bucket_never_waits():
+    bucket = TokenBucket(0)
+    assert bucket.consume(10 ** 9) == 0.0
+    assert bucket.stats()["rate_bytes_per_sec"] is None
+
+
+def test_bucket_starts_full_then_throttles():
+    bucket = TokenBucket(rate=1000, burst=1000)
+    assert bucket.consume(1000) == 0.0
+    started = time.monotonic()
+    waited = bucket.consume(100)
+    assert 0.05 <= waited <= 0.2
+    assert time.monotonic() - started >= 0.05
@@ -0,0 +1,122 @@
+import os
+import threading
+import logging
+import cv2
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable, Dict, Optional
+
+
+class ThumbnailCache:
+    """
+    On-disk cache of small JPEG thumbnails for the dashboard gallery, one file per
+    image under cache_dir. Thumbnails are built on a small worker pool, either right
+    after capture (from the encoded bytes) or lazily on first request; concurrent
+    requests for the same image share one build. `on_change(delta_bytes, delta_files)`
+    is called whenever a thumbnail file is written or removed.
+    """
+
+    def __init__(self, cache_dir: str, max_size: int = 320, quality: int = 70, workers: int = 1,
+                 on_change: Optional[Callable[[int, int], None]] = None):
+        self.logger = logging.getLogger(__name__)
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.quality = quality
+        self.on_change = on_change
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumb")
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+        self.generated = 0
+        self.hits = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path_for(self, filename: str) -> str:
+        return os.path.join(self.cache_dir, filename)
+
+    def _fresh(self, thumb_path: str, source_path: str) -> bool:
+        try:
+            return os.path.getmtime(thumb_path) >= os.path.getmtime(source_path)
+        except OSError:
+            return False
+
+    def submit(self, filename: str, source_path: str, data: Optional[bytes] = None) -> Future:
+        """Queue a thumbnail build (deduplicated per filename)."""
+        with self._lock:
+            fut = self._inflight.get(filename)
+            if fut is None:
+                fut = self._pool.submit(self._build, filename, source_path, data)
+                self._inflight[filename] = fut
+            return fut
+
+    def get(self, filename: str, source_path: str, timeout: float = 10.0) -> Optional[str]:
+        """Path of an up-to-date thumbnail, building it if needed; None if the source is unreadable."""
+        thumb_path = self.path_for(filename)
+        if self._fresh(thumb_path, source_path):
+            self.hits += 1
+            return thumb_path
+        return self.submit(filename, source_path).result(timeout=timeout)
+
+    def _changed(self, delta_bytes: int, delta_files: int) -> None:
+        if self.on_change is not None:
+            self.on_change(delta_bytes, delta_files)
+
+    def invalidate(self, filename: str) -> None:
+        path = self.path_for(filename)
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            self._changed(-size, -1)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            self.logger.error(f"Error removing thumbnail for {filename}: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            inflight = len(self._inflight)
+        return {"generated": self.generated, "hits": self.hits, "inflight": inflight}
+
+    def _build(self, filename: str, source_path: str, data: Optional[bytes]) -> Optional[str]:
+        try:
+            thumb_path = self.path_for(filename)
+            if self._fresh(thumb_path, source_path):
+                return thumb_path
+            if data is None:
+                with open(source_path, "rb") as f:
+                    data = f.read()
+            # Let libjpeg decode at 1/4 scale; far cheaper than a full decode + resize
+            img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_REDUCED_COLOR_4)
+            if img is None:
+                self.logger.warning(f"Cannot decode {source_path} for thumbnail")
+                return None
+            h, w = img.shape[:2]
+            scale = self.max_size / max(h, w)
+            if scale < 1.0:
+                img = cv2.resize(img, (max(1, int(w * scale)), max(1, int(h * scale))),
+                                 interpolation=cv2.INTER_AREA)
+            ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+            if not ok:
+                return None
+            try:
+                old_size = os.path.getsize(thumb_path)  # stale thumbnail being replaced
+            except FileNotFoundError:
+                old_size = None
+            data = buf.tobytes()
+            tmp = thumb_path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, thumb_path)
+            self.generated += 1
+            if old_size is None:
+                self._changed(len(data), 1)
+            else:
+                self._changed(len(data) - old_size, 0)
+            return thumb_path
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            self.logger.error(f"Error building thumbnail for {filename}: {e}")
+            return None
+        finally:
+            with self._lock:
+                self._inflight.pop(filename, None)
@@ -0,0 +1,245 @@
+import os
+import json
+import time
+import threading
+import logging
+from typing import List, Optional, Tuple
+
+# Cursor into the log: (segment_id, byte_offset, records_consumed_since_last_commit)
+Cursor = Tuple[int, int, int]
+
+
+class SegmentedTxnLog:
+    """
+    Append-only JSONL log for offline transactions, split into numbered segments.
+    Appends are buffered and fsynced in groups by commit_worker(); readers advance
+    a committed (segment, offset) checkpoint so progress survives restarts without
+    rewriting the remaining backlog. Fully consumed segments are deleted.
+    """
+
+    def __init__(self, directory: str, segment_max_bytes: int = 1024 * 1024, commit_interval: float = 1.0):
+        self.logger = logging.getLogger(__name__)
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.commit_interval = commit_interval
+        self.checkpoint_path = os.path.join(directory, "checkpoint.json")
+
+        self._lock = threading.RLock()
+        self._fh = None
+        self._dirty = False
+        self._segments = {}       # segment_id -> bytes written
+        self._active = 1
+        self._read_segment = 1
+        self._read_offset = 0
+        self._pending = 0
+        self._appended_total = 0
+        self._committed_total = 0
+        self._last_commit_at = None
+
+        os.makedirs(directory, exist_ok=True)
+        self._recover()
+
+    # ---------- paths / recovery ----------
+    def _segment_path(self, segment_id: int) -> str:
+        return os.path.join(self.directory, f"seg-{segment_id:08d}.jsonl")
+
+    def _recover(self):
+        for name in os.listdir(self.directory):
+            if name.startswith("seg-") and name.endswith(".jsonl"):
+                try:
+                    seg_id = int(name[4:-6])
+                except ValueError:
+                    continue
+                self._segments[seg_id] = os.path.getsize(os.path.join(self.directory, name))
+
+        try:
+            with open(self.checkpoint_path, "r") as f:
+                cp = json.load(f)
+            self._read_segment = int(cp.get("segment", 1))
+            self._read_offset = int(cp.get("offset", 0))
+            self._committed_total = int(cp.get("committed_total", 0))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            self.logger.error(f"Error reading transaction log checkpoint: {e}")
+
+        if self._segments:
+            self._read_segment = max(self._read_segment, min(self._segments))
+            # Never append after a possibly torn tail; start a fresh segment each boot
+            self._active = max(self._segments) + 1
+        else:
+            self._active = max(self._read_segment, 1)
+
+        # One-time boot cost: count unread records after the checkpoint
+        pending = 0
+        for seg_id in sorted(self._segments):
+            if seg_id < self._read_segment:
+                continue
+            start = self._read_offset if seg_id == self._read_segment else 0
+            with open(self._segment_path(seg_id), "rb") as f:
+                f.seek(start)
+                for line in f:
+                    if line.endswith(b"\n"):
+                        pending += 1
+        self._pending = pending
+
+    # ---------- writers ----------
+    def append(self, record: dict) -> None:
+        self.append_many([record])
+
+    def append_many(self, records: List[dict], sync: bool = False) -> None:
+        """Buffer records at the log tail; commit_worker fsyncs them as a group."""
+        if not records:
+            return
+        data = "".join(json.dumps(r, separators=(",", ":")) + "\n" for r in records).encode()
+        with self._lock:
+            if self._fh is None:
+                self._fh = open(self._segment_path(self._active), "ab")
+            self._fh.write(data)
+            self._segments[self._active] = self._segments.get(self._active, 0) + len(data)
+            self._pending += len(records)
+            self._appended_total += len(records)
+            self._dirty = True
+            if self._segments[self._active] >= self.segment_max_bytes:
+                self._roll()
+            elif sync:
+                self._sync_locked()
+
+    def _roll(self):
+        self._sync_locked()
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+        self._active += 1
+        self._segments.setdefault(self._active, 0)
+
+    def _sync_locked(self):
+        if self._fh is not None and self._dirty:
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+        self._dirty = False
+
+    def sync(self) -> None:
+        with self._lock:
+            self._sync_locked()
+
+    def commit_worker(self):
+        """Background group-commit loop: one fsync covers every append since the last one."""
+        while True:
+            try:
+                time.sleep(self.commit_interval)
+                self.sync()
+            except Exception as e:
+                self.logger.error(f"Transaction log commit error: {e}")
+
+    def close(self) -> None:
+        with self._lock:
+            self._sync_locked()
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+    # ---------- readers ----------
+    def read_batch(self, max_records: int, start: Optional[Cursor] = None) -> Tuple[List[dict], Cursor]:
+        """Read up to max_records after the checkpoint (or `start`) without consuming them."""
+        with self._lock:
+            # Make buffered appends visible to the reader
+            if self._fh is not None:
+                self._fh.flush()
+            seg_id, offset, consumed = start if start is not None else (self._read_segment, self._read_offset, 0)
+            active = self._active
+        records = []
+        while len(records) < max_records and seg_id <= active:
+            path = self._segment_path(seg_id)
+            if not os.path.exists(path):
+                if seg_id == active:
+                    break
+                seg_id, offset = seg_id + 1, 0
+                continue
+            with open(path, "rb") as f:
+                f.seek(offset)
+                while len(records) < max_records:
+                    line = f.readline()
+                    if not line or not line.endswith(b"\n"):
+                        break  # EOF or a partially written tail
+                    offset += len(line)
+                    consumed += 1
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        self.logger.warning(f"Skipping corrupt transaction log line in {path}")
+            if len(records) >= max_records:
+                break
+            if seg_id < active:
+                # Sealed segment exhausted (a torn tail from a crash is skipped too)
+                seg_id, offset = seg_id + 1, 0
+            else:
+                break
+        return records, (seg_id, offset, consumed)
+
+    def commit(self, cursor: Cursor) -> None:
+        """Persist the read checkpoint and drop segments that are fully consumed."""
+        seg_id, offset, consumed = cursor
+        with self._lock:
+            self._read_segment = seg_id
+            self._read_offset = offset
+            self._pending = max(0, self._pending - consumed)
+            self._committed_total += consumed
+            self._last_commit_at = int(time.time())
+            tmp = self.checkpoint_path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump({"segment": seg_id, "offset": offset, "committed_total": self._committed_total}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.checkpoint_path)
+            for old in [s for s in self._segments if s < seg_id]:
+                try:
+                    os.remove(self._segment_path(old))
+                except FileNotFoundError:
+                    pass
+                del self._segments[old]
+
+    def tail(self, n: int) -> List[dict]:
+        """Last n unread records (for offline display); reads only the newest segments."""
+        with self._lock:
+            if self._fh is not None:
+                self._fh.flush()
+            segs = sorted(s for s in self._segments if s >= self._read_segment)
+            read_segment, read_offset = self._read_segment, self._read_offset
+        out = []
+        for seg_id in reversed(segs):
+            try:
+                with open(self._segment_path(seg_id), "rb") as f:
+                    if seg_id == read_segment:
+                        f.seek(read_offset)
+                    lines = [l for l in f.read().split(b"\n") if l]
+            except FileNotFoundError:
+                continue
+            for line in reversed(lines):
+                try:
+                    out.append(json.loads(line))
+                except ValueError:
+                    continue
+                if len(out) >= n:
+                    return list(reversed(out))
+        return list(reversed(out))
+
+    # ---------- metadata (O(1)) ----------
+    def pending_count(self) -> int:
+        return self._pending
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "cached_count": self._pending,
+                "segments": len(self._segments),
+                "log_bytes": sum(self._segments.values()),
+                "read_segment": self._read_segment,
+                "read_offset": self._read_offset,
+                "committed_total": self._committed_total,
+                "last_commit_at": self._last_commit_at
+            }
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(self._segments.values())
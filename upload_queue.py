@@ -0,0 +1,268 @@
+import time
+import heapq
+import random
+import threading
+import logging
+from typing import Callable, Dict, List, Optional
+
+# Upload priority classes, most urgent first: fresh captures, then backlog by scan outcome
+PRIORITY_CLASSES = ("live", "granted", "denied", "blocked", "unknown")
+PRIORITY_LIVE = 0
+
+
+def backlog_priority(status: Optional[str]) -> int:
+    """Priority class for a backlog image given its catalog status (granted/denied/blocked/None)."""
+    if status in ("granted", "denied", "blocked"):
+        return PRIORITY_CLASSES.index(status)
+    return PRIORITY_CLASSES.index("unknown")
+
+
+class TokenBucket:
+    """
+    Byte-rate limiter shared by all upload workers. consume(n) may overdraw the
+    bucket (a single image can be larger than the burst) and then sleeps until the
+    debt is repaid, so the long-run rate stays at `rate` bytes/s. rate <= 0 disables it.
+    """
+
+    def __init__(self, rate: float = 0, burst: Optional[float] = None):
+        self._lock = threading.Lock()
+        self.rate = 0.0
+        self.burst = 0.0
+        self._tokens = 0.0
+        self._stamp = time.monotonic()
+        self.throttled_seconds = 0.0
+        self.set_rate(rate, burst)
+        self._tokens = self.burst  # start full
+
+    def set_rate(self, rate: float, burst: Optional[float] = None) -> None:
+        with self._lock:
+            self._refill()
+            self.rate = max(0.0, float(rate))
+            self.burst = float(burst) if burst else max(self.rate * 2, 64 * 1024)
+            self._tokens = min(self._tokens, self.burst) if self.rate else self.burst
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        if self.rate:
+            self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def consume(self, nbytes: int) -> float:
+        """Take `nbytes`, sleeping as long as needed; returns the seconds slept."""
+        with self._lock:
+            if not self.rate:
+                return 0.0
+            self._refill()
+            self._tokens -= nbytes
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            self.throttled_seconds += wait
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "rate_bytes_per_sec": self.rate or None,
+                "burst_bytes": self.burst if self.rate else None,
+                "throttled_seconds": round(self.throttled_seconds, 1)
+            }
+
+
+class UploadQueue:
+    """
+    Priority queue of image paths to upload where each path is present at most
+    once: a put() of a path that is already queued or being uploaded is a no-op.
+    Lower priority classes are served first; within a class, by capture time
+    (newest or oldest first). get() moves a path to the in-flight set until
+    task_done(path).
+    """
+
+    def __init__(self, newest_first: bool = True):
+        self.newest_first = newest_first
+        self._heap = []  # (priority, order, seq, path)
+        self._seq = 0
+        self._queued: Dict[str, int] = {}  # path -> priority
+        self._inflight = set()
+        self._cond = threading.Condition()
+        self.enqueued = 0
+        self.duplicates = 0
+
+    def put(self, path: str, priority: int = PRIORITY_LIVE, ts: Optional[float] = None) -> bool:
+        """Queue `path`; returns False if it was already queued or in flight."""
+        with self._cond:
+            if path in self._queued or path in self._inflight:
+                self.duplicates += 1
+                return False
+            ts = time.time() if ts is None else ts
+            self._seq += 1
+            heapq.heappush(self._heap, (priority, -ts if self.newest_first else ts, self._seq, path))
+            self._queued[path] = priority
+            self.enqueued += 1
+            self._cond.notify()
+            return True
+
+    def get(self) -> str:
+        with self._cond:
+            while not self._heap:
+                self._cond.wait()
+            path = heapq.heappop(self._heap)[3]
+            del self._queued[path]
+            self._inflight.add(path)
+            return path
+
+    def task_done(self, path: str) -> None:
+        with self._cond:
+            self._inflight.discard(path)
+
+    def __contains__(self, path: str) -> bool:
+        with self._cond:
+            return path in self._queued or path in self._inflight
+
+    def qsize(self) -> int:
+        with self._cond:
+            return len(self._heap)
+
+    def inflight_count(self) -> int:
+        with self._cond:
+            return len(self._inflight)
+
+    def stats(self) -> dict:
+        with self._cond:
+            by_class = dict.fromkeys(PRIORITY_CLASSES, 0)
+            for priority in self._queued.values():
+                by_class[PRIORITY_CLASSES[priority]] += 1
+            return {
+                "depth": len(self._heap),
+                "by_class": by_class,
+                "order": "newest" if self.newest_first else "oldest",
+                "inflight": len(self._inflight),
+                "enqueued": self.enqueued,
+                "duplicates_skipped": self.duplicates
+            }
+
+
+class RetryScheduler:
+    """
+    Delay queue for failed uploads, ordered by next-attempt time. A failed item
+    waits base_delay * 2^(attempt-1) (capped at max_delay, with jitter) on a heap
+    instead of blocking an upload worker; one thread hands due items back via
+    `requeue(path)`. After `budget` counted failures the item is passed to
+    `on_dead(path, attempts, error)` instead.
+    """
+
+    def __init__(self, requeue: Callable[[str], None], base_delay: float = 5, max_delay: float = 600,
+                 budget: int = 8, on_dead: Optional[Callable[[str, int, Optional[str]], None]] = None):
+        self.logger = logging.getLogger(__name__)
+        self.requeue = requeue
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self.on_dead = on_dead
+        self._heap = []  # (due, seq, path)
+        self._due: Dict[str, float] = {}
+        self._attempts: Dict[str, int] = {}
+        self._errors: Dict[str, str] = {}
+        self._seq = 0
+        self._cond = threading.Condition()
+        self.scheduled = 0
+        self.dead_lettered = 0
+
+    def failed(self, path: str, error: Optional[str] = None, count: bool = True,
+               permanent: bool = False) -> bool:
+        """
+        Record a failed attempt. Returns True if a retry was scheduled, False if the
+        item was dead-lettered (budget spent, or `permanent`). `count=False` (e.g.
+        failed while offline) retries without spending budget.
+        """
+        with self._cond:
+            attempts = self._attempts.get(path, 0) + (1 if count else 0)
+            if error:
+                self._errors[path] = error
+            if permanent or attempts >= self.budget:
+                error = error or self._errors.get(path)
+                self._forget(path)
+                self.dead_lettered += 1
+                dead = True
+            else:
+                self._attempts[path] = attempts
+                delay = min(self.max_delay, self.base_delay * (2 ** max(attempts - 1, 0)))
+                due = time.time() + delay * random.uniform(0.5, 1.0)
+                self._due[path] = due
+                self._seq += 1
+                heapq.heappush(self._heap, (due, self._seq, path))
+                self.scheduled += 1
+                self._cond.notify()
+                dead = False
+        if dead:
+            self.logger.error(f"[UPLOAD] Dead-lettered {path} after {attempts} attempts")
+            if self.on_dead is not None:
+                self.on_dead(path, attempts, error)
+        else:
+            self.logger.info(f"[UPLOAD] Retry {attempts}/{self.budget} for {path} in {due - time.time():.1f}s")
+        return not dead
+
+    def succeeded(self, path: str) -> None:
+        with self._cond:
+            self._forget(path)
+
+    def discard(self, path: str) -> None:
+        """Drop a waiting item (e.g. its file was deleted)."""
+        with self._cond:
+            self._forget(path)
+
+    def _forget(self, path: str) -> None:
+        # Heap entries are skipped lazily once their path is no longer in _due
+        self._due.pop(path, None)
+        self._attempts.pop(path, None)
+        self._errors.pop(path, None)
+
+    def is_waiting(self, path: str) -> bool:
+        with self._cond:
+            return path in self._due
+
+    def waiting_count(self) -> int:
+        with self._cond:
+            return len(self._due)
+
+    def waiting(self, limit: int = 100) -> List[dict]:
+        """Items waiting for a retry, soonest first."""
+        now = time.time()
+        with self._cond:
+            items = sorted(self._due.items(), key=lambda kv: kv[1])[:limit]
+            return [{"path": path, "attempts": self._attempts.get(path, 0),
+                     "retry_in": round(max(0.0, due - now), 1), "last_error": self._errors.get(path)}
+                    for path, due in items]
+
+    def run(self) -> None:
+        """Hand due items back to the upload queue; run on a daemon thread."""
+        while True:
+            with self._cond:
+                while True:
+                    while self._heap and self._due.get(self._heap[0][2]) != self._heap[0][0]:
+                        heapq.heappop(self._heap)  # stale entry
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    wait = self._heap[0][0] - time.time()
+                    if wait <= 0:
+                        break
+                    self._cond.wait(wait)
+                _, _, path = heapq.heappop(self._heap)
+                del self._due[path]  # attempts are kept until success or dead-letter
+            try:
+                self.requeue(path)
+            except Exception as e:
+                self.logger.error(f"[UPLOAD] Error requeueing {path}: {e}")
+
+    def stats(self) -> dict:
+        now = time.time()
+        with self._cond:
+            next_due = min(self._due.values()) if self._due else None
+            return {
+                "waiting": len(self._due),
+                "next_retry_in": round(max(0.0, next_due - now), 1) if next_due is not None else None,
+                "retries_scheduled": self.scheduled,
+                "dead_lettered": self.dead_lettered,
+                "budget": self.budget
+            }
@@ -1,66 +1,175 @@
 import os
 import time
+import threading
 import requests
 import logging
-from typing import Optional
-from config import S3_API_URL, MAX_RETRIES, RETRY_DELAY
+from collections import deque
+from contextlib import contextmanager
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+from typing import Dict, Optional
+from config import S3_API_URL, UPLOAD_MAX_PER_HOST, UPLOAD_POOL_SIZE
+
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024  # 10MB, applied to files and in-memory bytes alike
+
+class UploadThroughput:
+    """Upload counters plus images/s and MB/s over a sliding window."""
+
+    def __init__(self, window: float = 60.0):
+        self.window = window
+        self._lock = threading.Lock()
+        self._recent = deque()  # (finished_at, bytes)
+        self.uploaded = 0
+        self.failed = 0
+        self.bytes = 0
+        self.total_seconds = 0.0
+
+    def record(self, nbytes: int, elapsed: float) -> None:
+        now = time.time()
+        with self._lock:
+            self._recent.append((now, nbytes))
+            self.uploaded += 1
+            self.bytes += nbytes
+            self.total_seconds += elapsed
+            self._trim(now)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failed += 1
+
+    def _trim(self, now: float) -> None:
+        while self._recent and now - self._recent[0][0] > self.window:
+            self._recent.popleft()
+
+    def bytes_per_sec(self) -> float:
+        with self._lock:
+            self._trim(time.time())
+            return sum(b for _, b in self._recent) / self.window
+
+    def snapshot(self) -> dict:
+        now = time.time()
+        with self._lock:
+            self._trim(now)
+            count = len(self._recent)
+            window_bytes = sum(b for _, b in self._recent)
+            return {
+                "images_per_sec": round(count / self.window, 3),
+                "mb_per_sec": round(window_bytes / self.window / (1024 * 1024), 3),
+                "window_seconds": self.window,
+                "uploaded": self.uploaded,
+                "failed": self.failed,
+                "bytes": self.bytes,
+                "avg_upload_ms": round(self.total_seconds * 1000 / self.uploaded, 1) if self.uploaded else None
+            }
 
 class ImageUploader:
-    def __init__(self):
+    """
+    Uploads images over one pooled keep-alive session (shared by all upload
+    workers), with at most `max_per_host` requests in flight per host and an
+    optional shared TokenBucket (`bandwidth`) capping the upload byte rate.
+    Each upload() is a single attempt; retries are scheduled by the caller.
+    last_error / last_permanent describe the calling thread's last failure.
+    """
+
+    def __init__(self, max_per_host: int = UPLOAD_MAX_PER_HOST, pool_size: int = UPLOAD_POOL_SIZE,
+                 bandwidth=None):
         self.logger = logging.getLogger(__name__)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.max_per_host = max_per_host
+        self._host_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._host_lock = threading.Lock()
+        self.throughput = UploadThroughput()
+        self.bandwidth = bandwidth
+        self._local = threading.local()
+
+    @property
+    def last_error(self) -> Optional[str]:
+        return getattr(self._local, "error", None)
+
+    @property
+    def last_permanent(self) -> bool:
+        """True if the last failure cannot succeed on retry (missing/oversized file)."""
+        return getattr(self._local, "permanent", False)
+
+    def _fail(self, message: str, permanent: bool = False) -> None:
+        self.logger.error(message)
+        self._local.error = message
+        self._local.permanent = permanent
+
+    @contextmanager
+    def _host_slot(self, url: str):
+        host = urlparse(url).netloc
+        with self._host_lock:
+            slot = self._host_slots.get(host)
+            if slot is None:
+                slot = self._host_slots[host] = threading.BoundedSemaphore(self.max_per_host)
+        with slot:
+            yield
+
+    def upload(self, filepath: str, data: Optional[bytes] = None) -> Optional[str]:
+        """Upload image file to S3-compatible API. `data` (already-encoded JPEG bytes) skips reading the file."""
+        self._local.error, self._local.permanent = None, False
+        if data is not None:
+            if len(data) > MAX_UPLOAD_BYTES:
+                self._fail(f"File too large: {filepath} ({len(data)} bytes)", permanent=True)
+                return None
+            return self._post(filepath, data)
 
-    def upload(self, filepath: str) -> Optional[str]:
-        """Upload image file to S3-compatible API."""
         if not os.path.exists(filepath):
-            self.logger.error(f"File does not exist: {filepath}")
+            self._fail(f"File does not exist: {filepath}", permanent=True)
             return None
             
         if not os.path.isfile(filepath):
-            self.logger.error(f"Path is not a file: {filepath}")
+            self._fail(f"Path is not a file: {filepath}", permanent=True)
             return None
             
-        # Check file size (limit to 10MB)
         file_size = os.path.getsize(filepath)
-        if file_size > 10 * 1024 * 1024:  # 10MB
-            self.logger.error(f"File too large: {filepath} ({file_size} bytes)")
+        if file_size > MAX_UPLOAD_BYTES:
+            self._fail(f"File too large: {filepath} ({file_size} bytes)", permanent=True)
             return None
-            
-        attempts = 0
-        while attempts < MAX_RETRIES:
-            try:
-                with open(filepath, "rb") as image_file:
-                    files = {
-                        "singleFile": (os.path.basename(filepath), image_file, "image/jpeg")
-                    }
-                    response = requests.post(S3_API_URL, files=files, timeout=30)
-
-                if response.status_code == 200:
-                    self.logger.info(f"Successfully uploaded: {filepath}")
-                    try:
-                        response_json = response.json()
-                        location = response_json.get("Location")
-                        if location:
-                            self.logger.info(f"S3 Response: {response_json}")
-                            # Don't remove file - keep for gallery display
-                            # os.remove(filepath)
-                            return location
-                        else:
-                            self.logger.error(f"No Location in response: {response_json}")
-                    except ValueError as e:
-                        self.logger.error(f"Invalid JSON response: {e}")
-                        self.logger.error(f"Response content: {response.text}")
-                else:
-                    self.logger.error(f"Upload failed {filepath}: {response.status_code} - {response.text}")
-
-            except requests.exceptions.RequestException as e:
-                self.logger.error(f"Upload error for {filepath}: {e}")
-            except Exception as e:
-                self.logger.error(f"Unexpected error during upload of {filepath}: {e}")
-
-            attempts += 1
-            if attempts < MAX_RETRIES:
-                self.logger.info(f"Retrying upload in {RETRY_DELAY} seconds... (attempt {attempts + 1}/{MAX_RETRIES})")
-                time.sleep(RETRY_DELAY)
-
-        self.logger.error(f"Giving up on {filepath} after {MAX_RETRIES} attempts.")
+
+        with open(filepath, "rb") as image_file:
+            data = image_file.read()
+        return self._post(filepath, data)
+
+    def _post(self, filepath: str, data: bytes) -> Optional[str]:
+        try:
+            files = {
+                "singleFile": (os.path.basename(filepath), data, "image/jpeg")
+            }
+            if self.bandwidth is not None:
+                self.bandwidth.consume(len(data))
+            started = time.time()
+            with self._host_slot(S3_API_URL):
+                response = self.session.post(S3_API_URL, files=files, timeout=30)
+            elapsed = time.time() - started
+
+            if response.status_code == 200:
+                self.logger.info(f"Successfully uploaded: {filepath}")
+                try:
+                    response_json = response.json()
+                    location = response_json.get("Location")
+                    if location:
+                        self.throughput.record(len(data), elapsed)
+                        self.logger.info(f"S3 Response: {response_json}")
+                        # Don't remove file - keep for gallery display
+                        # os.remove(filepath)
+                        return location
+                    else:
+                        self._fail(f"No Location in response: {response_json}")
+                except ValueError as e:
+                    self._fail(f"Invalid JSON response: {e}")
+                    self.logger.error(f"Response content: {response.text}")
+            else:
+                self._fail(f"Upload failed {filepath}: {response.status_code} - {response.text[:200]}")
+
+        except requests.exceptions.RequestException as e:
+            self._fail(f"Upload error for {filepath}: {e}")
+        except Exception as e:
+            self._fail(f"Unexpected error during upload of {filepath}: {e}")
+
+        self.throughput.record_failure()
         return None